@@ -28,6 +28,35 @@ class Settings:
     GROQ_API_KEY: str = os.getenv("GROQ_API_KEY", "")
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
     AI_MODEL: str = "llama-3.1-8b-instant"
+
+    # LLM concurrency: separate budgets so chat spikes can't starve classification
+    CHAT_MAX_CONCURRENCY: int = int(os.getenv("CHAT_MAX_CONCURRENCY", "8"))
+    CHAT_BUSY_RETRY_AFTER: int = int(os.getenv("CHAT_BUSY_RETRY_AFTER", "3"))  # seconds
+    CLASSIFICATION_MAX_CONCURRENCY: int = int(os.getenv("CLASSIFICATION_MAX_CONCURRENCY", "4"))
+    CLASSIFICATION_QUEUE_TIMEOUT: float = float(os.getenv("CLASSIFICATION_QUEUE_TIMEOUT", "5"))  # then keyword fallback
+
+    # Chat sessions
+    CHAT_SESSION_TTL: int = int(os.getenv("CHAT_SESSION_TTL", "7200"))  # seconds idle
+    CHAT_SESSION_MAX_ENTRIES: int = int(os.getenv("CHAT_SESSION_MAX_ENTRIES", "2000"))
+    CHAT_SESSION_PERSIST: bool = os.getenv("CHAT_SESSION_PERSIST", "False").lower() == "true"
+    CHAT_CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "1500"))  # history tokens per prompt
+    CHAT_SUMMARY_TOKEN_BUDGET: int = int(os.getenv("CHAT_SUMMARY_TOKEN_BUDGET", "300"))
+
+    # Chat answer cache (first-turn questions only)
+    CHAT_CACHE_ENABLED: bool = os.getenv("CHAT_CACHE_ENABLED", "True").lower() == "true"
+    CHAT_CACHE_TTL: int = int(os.getenv("CHAT_CACHE_TTL", "21600"))  # seconds
+    CHAT_CACHE_MAX_ENTRIES: int = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "1000"))
+    CHAT_CACHE_SIMILARITY: float = float(os.getenv("CHAT_CACHE_SIMILARITY", "0.8"))  # estimated Jaccard
+
+    # KB grounding for chat
+    CHAT_KB_ARTICLES: int = int(os.getenv("CHAT_KB_ARTICLES", "3"))
+    CHAT_KB_MIN_CONFIDENCE: float = float(os.getenv("CHAT_KB_MIN_CONFIDENCE", "0.3"))
+    CHAT_KB_SNIPPET_CHARS: int = int(os.getenv("CHAT_KB_SNIPPET_CHARS", "500"))
+
+    # Chat WebSocket
+    CHAT_WS_HEARTBEAT_INTERVAL: float = float(os.getenv("CHAT_WS_HEARTBEAT_INTERVAL", "20"))  # seconds between pings
+    CHAT_WS_IDLE_TIMEOUT: float = float(os.getenv("CHAT_WS_IDLE_TIMEOUT", "600"))  # seconds without a user message
+    CHAT_WS_MAX_CONNECTIONS: int = int(os.getenv("CHAT_WS_MAX_CONNECTIONS", "500"))
     
     # Email Configuration
     EMAIL_ENABLED: bool = os.getenv("EMAIL_ENABLED", "True").lower() == "true"
@@ -35,13 +64,24 @@ class Settings:
     EMAIL_PORT: int = int(os.getenv("EMAIL_PORT", "993"))
     EMAIL_USER: str = os.getenv("EMAIL_USER", "")
     EMAIL_PASSWORD: str = os.getenv("EMAIL_PASSWORD", "")
-    EMAIL_CHECK_INTERVAL: int = int(os.getenv("EMAIL_CHECK_INTERVAL", "60"))  # seconds
+    EMAIL_CHECK_INTERVAL: int = int(os.getenv("EMAIL_CHECK_INTERVAL", "60"))  # seconds, polling when IDLE is unsupported
+    EMAIL_USE_SSL: bool = os.getenv("EMAIL_USE_SSL", "True").lower() == "true"
+    EMAIL_MAILBOX: str = os.getenv("EMAIL_MAILBOX", "INBOX")
+    EMAIL_IDLE_TIMEOUT: float = float(os.getenv("EMAIL_IDLE_TIMEOUT", "1500"))  # seconds, IDLE re-issued before the 29 min limit
+    EMAIL_FETCH_BATCH: int = int(os.getenv("EMAIL_FETCH_BATCH", "20"))  # messages per UID FETCH
+    EMAIL_MAX_MESSAGE_BYTES: int = int(os.getenv("EMAIL_MAX_MESSAGE_BYTES", "5242880"))  # larger messages are truncated
+    EMAIL_MAX_INGEST_ATTEMPTS: int = int(os.getenv("EMAIL_MAX_INGEST_ATTEMPTS", "5"))  # then the message is skipped
     
     # SMTP for sending emails
     SMTP_HOST: str = os.getenv("SMTP_HOST", "smtp.gmail.com")
     SMTP_PORT: int = int(os.getenv("SMTP_PORT", "587"))
     SMTP_USER: str = os.getenv("SMTP_USER", EMAIL_USER)
     SMTP_PASSWORD: str = os.getenv("SMTP_PASSWORD", EMAIL_PASSWORD)
+    SMTP_POOL_SIZE: int = int(os.getenv("SMTP_POOL_SIZE", "4"))  # connections / sends in flight
+    SMTP_POOL_MAX_MESSAGES: int = int(os.getenv("SMTP_POOL_MAX_MESSAGES", "100"))  # per connection, then reconnect
+    SMTP_POOL_IDLE_TIMEOUT: float = float(os.getenv("SMTP_POOL_IDLE_TIMEOUT", "240"))  # seconds
+    SMTP_KEEPALIVE_INTERVAL: float = float(os.getenv("SMTP_KEEPALIVE_INTERVAL", "60"))  # seconds between NOOPs
+    SMTP_TIMEOUT: float = float(os.getenv("SMTP_TIMEOUT", "30"))  # seconds
     
     # SMS Configuration (Twilio)
     SMS_ENABLED: bool = os.getenv("SMS_ENABLED", "False").lower() == "true"
@@ -76,11 +116,46 @@ class Settings:
     SLA_HIGH: int = 480  # 8 hours
     SLA_MEDIUM: int = 1440  # 24 hours
     SLA_LOW: int = 2880  # 48 hours
+    SLA_SCHEDULER_RESYNC_INTERVAL: int = int(os.getenv("SLA_SCHEDULER_RESYNC_INTERVAL", "3600"))  # seconds
+    SLA_SCHEDULER_POLL_INTERVAL: float = float(os.getenv("SLA_SCHEDULER_POLL_INTERVAL", "5"))  # seconds, picks up other workers' tickets
+    SLA_BREACH_SWEEP_INTERVAL: int = int(os.getenv("SLA_BREACH_SWEEP_INTERVAL", "60"))  # seconds
+    SLA_BREACH_SWEEP_CHUNK: int = int(os.getenv("SLA_BREACH_SWEEP_CHUNK", "500"))  # tickets per UPDATE
+
+    # Notification outbox
+    OUTBOX_CONCURRENCY: int = int(os.getenv("OUTBOX_CONCURRENCY", "8"))  # deliveries in flight
+    OUTBOX_BATCH_SIZE: int = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+    OUTBOX_POLL_INTERVAL: float = float(os.getenv("OUTBOX_POLL_INTERVAL", "2"))  # seconds
+    OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))  # then dead-lettered
+    OUTBOX_BACKOFF_BASE: float = float(os.getenv("OUTBOX_BACKOFF_BASE", "30"))  # seconds, doubled per attempt
+    OUTBOX_BACKOFF_MAX: float = float(os.getenv("OUTBOX_BACKOFF_MAX", "3600"))
+    OUTBOX_CLAIM_TIMEOUT: int = int(os.getenv("OUTBOX_CLAIM_TIMEOUT", "300"))  # seconds before a stuck send is retried
+
+    # Leader election: one process runs the SLA scheduler, breach sweeper, digests and KB popularity refresh
+    LEADER_ELECTION_ENABLED: bool = os.getenv("LEADER_ELECTION_ENABLED", "True").lower() == "true"
+    LEADER_LEASE_TTL: int = int(os.getenv("LEADER_LEASE_TTL", "30"))  # seconds without a heartbeat before failover
+    LEADER_HEARTBEAT_INTERVAL: float = float(os.getenv("LEADER_HEARTBEAT_INTERVAL", "10"))  # seconds
+
+    # Team notification coalescing (critical tickets are never delayed)
+    NOTIFICATION_COALESCE_WINDOW: float = float(os.getenv("NOTIFICATION_COALESCE_WINDOW", "120"))  # seconds, 0 disables
+    NOTIFICATION_COALESCE_MAX_ITEMS: int = int(os.getenv("NOTIFICATION_COALESCE_MAX_ITEMS", "200"))
     
     # Auto-classification thresholds
     CLASSIFICATION_CONFIDENCE_THRESHOLD: float = 0.7
     SELF_SERVICE_CONFIDENCE_THRESHOLD: float = 0.8
     
+    # Knowledge Base
+    KB_COUNTER_FLUSH_INTERVAL: int = int(os.getenv("KB_COUNTER_FLUSH_INTERVAL", "30"))  # seconds
+    KB_CACHE_MAX_ENTRIES: int = int(os.getenv("KB_CACHE_MAX_ENTRIES", "512"))
+    KB_CACHE_TTL: int = int(os.getenv("KB_CACHE_TTL", "300"))  # seconds
+    KB_REVISION_CHECK_INTERVAL: float = float(os.getenv("KB_REVISION_CHECK_INTERVAL", "5"))  # seconds between checks for other workers' KB edits
+    KB_FUZZY_MIN_RESULTS: int = int(os.getenv("KB_FUZZY_MIN_RESULTS", "3"))  # below this, add typo-tolerant matches
+    KB_FUZZY_SIMILARITY: float = float(os.getenv("KB_FUZZY_SIMILARITY", "0.3"))  # trigram similarity, as pg_trgm
+    KB_POPULARITY_HALF_LIFE_DAYS: float = float(os.getenv("KB_POPULARITY_HALF_LIFE_DAYS", "14"))
+    KB_POPULARITY_PRIOR_WEIGHT: float = float(os.getenv("KB_POPULARITY_PRIOR_WEIGHT", "5"))  # pseudo-ratings
+    KB_POPULARITY_REFRESH_INTERVAL: int = int(os.getenv("KB_POPULARITY_REFRESH_INTERVAL", "900"))  # seconds
+    CLUSTERING_SYNC_INTERVAL: int = int(os.getenv("CLUSTERING_SYNC_INTERVAL", "30"))  # seconds, picks up new tickets from every worker
+    CLUSTERING_SUGGESTION_INTERVAL: int = int(os.getenv("CLUSTERING_SUGGESTION_INTERVAL", "900"))  # seconds, leader only
+    
     # Background Tasks
     CELERY_BROKER_URL: str = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
     CELERY_RESULT_BACKEND: str = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
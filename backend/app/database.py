@@ -1,7 +1,8 @@
 """
 Database configuration and session management
 """
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker
 from .models.ticket_models import Base
 import os
@@ -23,8 +24,67 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 def init_db():
     """Initialize database tables"""
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+    init_search_extensions()
     print("✅ Database initialized successfully")
 
+def add_missing_columns():
+    """
+    Add columns and indexes introduced after a table was first created
+
+    create_all() only creates missing tables, so existing databases would
+    otherwise never see new model columns. Columns are added as nullable,
+    with their server default so existing rows are filled in. Every worker
+    runs this at startup: on PostgreSQL they take turns under an advisory
+    lock, elsewhere a column another worker added first is skipped.
+    """
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            from .services.leader_service import advisory_lock_key
+
+            conn.execute(
+                text("SELECT pg_advisory_xact_lock(:key)"), {"key": advisory_lock_key("schema-migration")}
+            )
+
+        inspector = inspect(conn)
+        ddl = engine.dialect.ddl_compiler(engine.dialect, None)
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                default = ddl.get_column_default_string(column)
+                statement = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                if default is not None:
+                    statement += f" DEFAULT {default}"
+                try:
+                    conn.execute(text(statement))
+                except OperationalError as e:
+                    if "duplicate column" not in str(e).lower():
+                        raise
+                    continue
+                print(f"➕ Added column {table.name}.{column.name}")
+
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+def init_search_extensions():
+    """Enable pg_trgm and trigram indexes for typo-tolerant KB search (PostgreSQL only)"""
+    if engine.dialect.name != "postgresql":
+        return
+
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            for column in ("title", "summary"):
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS ix_knowledge_articles_{column}_trgm "
+                    f"ON knowledge_articles USING gin ({column} gin_trgm_ops)"
+                ))
+    except Exception as e:
+        print(f"⚠️ pg_trgm unavailable, KB fuzzy search will use the in-memory index: {e}")
+
 def get_db():
     """Dependency for getting DB session"""
     db = SessionLocal()
@@ -5,6 +5,7 @@ from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
 from datetime import datetime
+import asyncio
 import logging
 import os
 
@@ -59,10 +60,72 @@ async def startup_event():
     logger.info(f"🔌 GLPI integration: {'Enabled' if settings.GLPI_ENABLED else 'Disabled'}")
     logger.info(f"🔌 Solman integration: {'Enabled' if settings.SOLMAN_ENABLED else 'Disabled'}")
     
-    # Start notification service
+    # Singleton jobs run only in the process holding the leader lock / lease
+    from .services.leader_service import leader_election
     from .services.notification_service import notification_service
-    await notification_service.start_background_tasks()
-    logger.info("🔔 Notification service started")
+    from .services.kb_popularity_service import kb_popularity_service
+    leader_election.register(
+        "notifications", notification_service.start_background_tasks, notification_service.stop_background_tasks
+    )
+    # Refresh time-decayed KB popularity scores periodically
+    leader_election.register(
+        "kb_popularity", kb_popularity_service.start_background_tasks, kb_popularity_service.stop
+    )
+    # Record frequent near-duplicate ticket clusters as KB suggestions
+    from .services.clustering_service import ticket_clustering_service
+    leader_election.register(
+        "kb_suggestions", ticket_clustering_service.start_suggestion_sync, ticket_clustering_service.stop_suggestion_sync
+    )
+    # Turn new support mailbox messages into tickets (IMAP IDLE, polling fallback)
+    from .services.imap_ingestion_service import mailbox_ingestion_worker
+    leader_election.register(
+        "mailbox_ingestion", mailbox_ingestion_worker.start, mailbox_ingestion_worker.stop
+    )
+    await leader_election.start()
+    logger.info(f"🔔 Leader election started ({leader_election.holder})")
+
+    # Deliver queued emails and SMS
+    from .services.outbox_service import notification_outbox
+    await notification_outbox.start()
+
+    # Start KB counter write-behind flush
+    from .services.kb_counter_service import kb_counter_buffer
+    await kb_counter_buffer.start_background_tasks()
+
+    # Build near-duplicate ticket clusters without blocking startup, then follow new tickets
+    await ticket_clustering_service.start()
+
+    # Build the in-memory KB search index
+    from .services.kb_index_service import kb_search_index
+    asyncio.create_task(asyncio.to_thread(kb_search_index.warm_up))
+
+    # Build the KB typeahead trie
+    from .services.kb_autocomplete_service import kb_autocomplete_index
+    asyncio.create_task(asyncio.to_thread(kb_autocomplete_index.warm_up))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush buffered state before the process exits"""
+    from .services.kb_counter_service import kb_counter_buffer
+    await kb_counter_buffer.stop()
+    logger.info("📝 KB counters flushed")
+
+    from .services.chat_service import chat_service
+    await chat_service.close()
+
+    from .services.clustering_service import ticket_clustering_service
+    await ticket_clustering_service.stop()
+
+    # Stops the singleton jobs and releases leadership for another worker
+    from .services.leader_service import leader_election
+    await leader_election.stop()
+
+    # Undelivered messages stay in the outbox for the next start
+    from .services.outbox_service import notification_outbox
+    await notification_outbox.stop()
+
+    from .services.email_service import email_service
+    await email_service.close()
 
 # Include routers
 app.include_router(tickets.router, prefix="/api/tickets", tags=["Tickets"])
@@ -78,6 +141,10 @@ app.include_router(kb.router, prefix="/api/kb", tags=["Knowledge Base"])
 from .routes import webhooks
 app.include_router(webhooks.router, prefix="/api/webhooks", tags=["Webhooks"])
 
+# Include chat WebSocket router
+from .routes import chat_ws
+app.include_router(chat_ws.router, prefix="/api/chat", tags=["Chat"])
+
 @app.get("/api/debug")
 async def debug_endpoint():
     """Debug endpoint to test if routes are working"""
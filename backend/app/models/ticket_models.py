@@ -3,8 +3,8 @@ Extended database models for NullTicket unified ticketing system
 Integrates with existing NullChat models
 """
 from sqlalchemy import (
-    Column, Integer, String, Text, DateTime, Boolean, Float, 
-    ForeignKey, Enum, JSON
+    Column, Integer, BigInteger, String, Text, DateTime, Boolean, Float, 
+    ForeignKey, Enum, JSON, Index, text
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -221,7 +221,7 @@ class Ticket(Base):
     closed_at = Column(DateTime, nullable=True)
     
     # SLA Management
-    sla_deadline = Column(DateTime, nullable=True)
+    sla_deadline = Column(DateTime, nullable=True, index=True)
     sla_breached = Column(Boolean, default=False)
     
     # AI & Automation
@@ -253,6 +253,15 @@ class Ticket(Base):
     comments = relationship("TicketComment", back_populates="ticket", cascade="all, delete-orphan")
     attachments = relationship("TicketAttachment", back_populates="ticket", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Breach sweeper: unflagged tickets ordered by deadline
+        Index("ix_tickets_breached_deadline", "sla_breached", "sla_deadline"),
+        # Mailbox ingestion: skip emails already turned into tickets (by Message-ID)
+        Index("ix_tickets_source_reference", "source", "source_reference"),
+        # SLA scheduler change poll (tickets created / updated by other workers)
+        Index("ix_tickets_updated_at", "updated_at"),
+    )
+
 # ============================================================================
 # TICKET HISTORY & COMMENTS
 # ============================================================================
@@ -424,6 +433,12 @@ class KnowledgeArticle(Base):
     helpful_count = Column(Integer, default=0)
     not_helpful_count = Column(Integer, default=0)
     resolution_count = Column(Integer, default=0)  # Tickets auto-resolved using this
+
+    # Popularity, materialized by the periodic refresh in kb_popularity_service
+    popularity_score = Column(Float, default=0.0, server_default=text("0"))
+    decayed_views = Column(Float, default=0.0, server_default=text("0"))  # Views with exponential time decay applied
+    popularity_views_seen = Column(Integer, default=0, server_default=text("0"))  # view_count at the last refresh
+    popularity_updated_at = Column(DateTime, nullable=True)
     
     # Metadata
     created_by_id = Column(Integer, ForeignKey("users.id"))
@@ -437,6 +452,19 @@ class KnowledgeArticle(Base):
     # Relationships
     created_by = relationship("User")
 
+    __table_args__ = (
+        # Popular list is a range read of this index
+        Index("ix_knowledge_articles_active_popularity", "is_active", "popularity_score"),
+    )
+
+class KBRevision(Base):
+    """Single-row counter bumped by every knowledge base write, shared by all workers"""
+    __tablename__ = "kb_revisions"
+    
+    id = Column(Integer, primary_key=True)
+    revision = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class KBSuggestion(Base):
     """AI-generated suggestions for new KB articles"""
     __tablename__ = "kb_suggestions"
@@ -465,6 +493,93 @@ class KBSuggestion(Base):
     # Relationships
     reviewed_by = relationship("User")
 
+# ============================================================================
+# SLA ALERTS
+# ============================================================================
+
+class SLAAlert(Base):
+    """Ledger of the last SLA alert sent for a ticket, so each level is sent once"""
+    __tablename__ = "sla_alerts"
+    
+    ticket_id = Column(Integer, ForeignKey("tickets.id", ondelete="CASCADE"), primary_key=True)
+    level = Column(String, nullable=False)  # approaching, breached
+    sla_deadline = Column(DateTime, nullable=True)  # Deadline the alert was sent for
+    sent_at = Column(DateTime, default=datetime.utcnow)
+
+# ============================================================================
+# NOTIFICATION OUTBOX
+# ============================================================================
+
+class OutboxMessage(Base):
+    """Notification queued in the same transaction as the change that caused it"""
+    __tablename__ = "notification_outbox"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    channel = Column(String, nullable=False)  # email, sms
+    kind = Column(String, nullable=False)  # Sender method, e.g. send_ticket_created
+    payload = Column(JSON, default=dict)  # Keyword arguments for the sender
+    
+    status = Column(String, default="pending")  # pending, sending, sent, skipped, dead
+    attempts = Column(Integer, default=0)
+    # Due time while pending; claim expiry while sending
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    claim_token = Column(String, nullable=True)
+    last_error = Column(Text, nullable=True)
+    
+    # Coalesced team notifications: rows sharing a key are sent as one summary email
+    group_key = Column(String, nullable=True)  # Recipient
+    group_item = Column(JSON, nullable=True)  # Ticket line for the summary
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Workers claim due messages in next_attempt_at order
+        Index("ix_notification_outbox_status_due", "status", "next_attempt_at"),
+        Index("ix_notification_outbox_group", "group_key", "status"),
+    )
+
+# ============================================================================
+# BACKGROUND JOB LEADERSHIP
+# ============================================================================
+
+class LeaderLease(Base):
+    """Lease naming the process that runs singleton background jobs (non-PostgreSQL databases)"""
+    __tablename__ = "leader_leases"
+    
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)  # host:pid:nonce of the current leader
+    expires_at = Column(DateTime, nullable=False)
+    acquired_at = Column(DateTime, default=datetime.utcnow)
+    heartbeat_at = Column(DateTime, default=datetime.utcnow)
+
+class MailboxCursor(Base):
+    """Last IMAP UID turned into a ticket, per mailbox"""
+    __tablename__ = "mailbox_cursors"
+    
+    mailbox = Column(String, primary_key=True)  # user@host/folder
+    uid_validity = Column(BigInteger, nullable=False)  # UIDs are only comparable within one UIDVALIDITY
+    last_uid = Column(BigInteger, nullable=False, default=0)
+    failing_uid = Column(BigInteger, nullable=True)  # message after last_uid that failed to ingest
+    failed_attempts = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# ============================================================================
+# CHAT
+# ============================================================================
+
+class ChatSessionState(Base):
+    """Server-side chat session: recent turns plus a summary of older ones"""
+    __tablename__ = "chat_sessions"
+    
+    session_id = Column(String, primary_key=True)
+    messages = Column(JSON, default=list)  # [{"role": ..., "content": ...}]
+    summary = Column(Text, nullable=True)
+    turns = Column(Integer, default=0)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
 # ============================================================================
 # EXTERNAL SYSTEM INTEGRATION
 # ============================================================================
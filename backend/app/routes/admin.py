@@ -45,3 +45,18 @@ async def list_kb_articles(db: Session = Depends(get_db)):
     """List knowledge base articles"""
     articles = db.query(KnowledgeArticle).filter(KnowledgeArticle.is_active == True).all()
     return {"articles": articles}
+
+class OutboxRequeue(BaseModel):
+    message_ids: Optional[List[int]] = None  # None requeues every dead letter
+
+@router.get("/outbox/dead")
+async def list_dead_letters(limit: int = 50, db: Session = Depends(get_db)):
+    """List notifications that exhausted their delivery attempts"""
+    from ..services.outbox_service import notification_outbox
+    return {"messages": notification_outbox.dead_letters(db, limit)}
+
+@router.post("/outbox/requeue")
+async def requeue_dead_letters(request: OutboxRequeue, db: Session = Depends(get_db)):
+    """Retry dead-lettered notifications"""
+    from ..services.outbox_service import notification_outbox
+    return {"success": True, "requeued": notification_outbox.requeue(db, request.message_ids)}
@@ -265,3 +265,40 @@ async def get_satisfaction_stats(
         "distribution": distribution,
         "satisfaction_rate": round((sum(distribution[4] + distribution[5]) / len(rated_tickets)) * 100, 2)
     }
+
+@router.get("/self-service")
+async def get_self_service_stats():
+    """
+    Self-service deflection rate and LLM calls saved
+    """
+    from ..services.self_service import self_service
+    return self_service.stats()
+
+@router.get("/sla/monitor")
+async def get_sla_monitor_stats():
+    """
+    SLA alert scheduler and breach sweeper status
+    Only the leader process runs them; `leader` shows whether this one does
+    """
+    from ..services.sla_scheduler_service import sla_scheduler
+    from ..services.sla_breach_service import sla_breach_sweeper
+    from ..services.leader_service import leader_election
+    return {
+        "leader": leader_election.stats(),
+        "scheduler": sla_scheduler.stats(),
+        "breach_sweeper": sla_breach_sweeper.stats(),
+    }
+
+@router.get("/notifications/outbox")
+async def get_outbox_stats(db: Session = Depends(get_db)):
+    """
+    Notification outbox backlog, lag and delivery throughput, plus SMTP pool usage
+    """
+    from ..services.outbox_service import notification_outbox
+    from ..services.notification_coalescer import notification_coalescer
+    from ..services.email_service import email_service
+    return {
+        **notification_outbox.stats(db),
+        "coalescing": notification_coalescer.stats(db),
+        "smtp_pool": email_service.pool.stats(),
+    }
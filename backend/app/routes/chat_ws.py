@@ -0,0 +1,327 @@
+"""
+WebSocket chat: one persistent connection per chat session
+
+Client -> server messages:
+    {"type": "message", "content": "..."}      ask something
+    {"type": "cancel"}                         stop the answer being generated
+    {"type": "create_ticket"}                  ask for a ticket draft
+    {"type": "confirm_ticket", "requester_email": "...", "title"?: "...", "description"?: "..."}
+    {"type": "ping"} / {"type": "pong"}
+
+Server -> client messages:
+    session, kb_suggestions, token, done, busy, ticket_confirmation,
+    ticket_created, ping, pong, error, closing
+"""
+import asyncio
+import json
+import logging
+import re
+import time
+from typing import Dict, Optional
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, EmailStr, ValidationError, field_validator
+
+from ..config import settings
+from ..database import SessionLocal
+from ..routes.ingestion import _remember_turn, create_chat_ticket
+from ..services.chat_service import chat_service, ChatStreamError
+from ..services.chat_session_service import chat_session_store
+from ..services.concurrency_service import LLMBusyError, chat_limiter
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# The assistant offering to raise a ticket ("I'll create a support ticket")
+TICKET_OFFER = re.compile(r"\b(create|raise|open|log)\b[^.?!]{0,40}\bticket\b", re.IGNORECASE)
+
+# Close codes (RFC 6455): normal closure, try again later
+CLOSE_IDLE = 1000
+CLOSE_TRY_AGAIN_LATER = 1013
+
+_open_connections = 0
+
+
+class TicketConfirmation(BaseModel):
+    """A confirm_ticket message; fields left out fall back to the draft"""
+    requester_email: Optional[EmailStr] = None
+    title: Optional[str] = None
+    description: Optional[str] = None
+
+    @field_validator("requester_email", mode="before")
+    @classmethod
+    def blank_is_missing(cls, value):
+        return value or None
+
+
+class ChatConnection:
+    """
+    State and protocol for one chat WebSocket
+
+    The reader loop keeps receiving while an answer streams, so `cancel` and
+    heartbeats are handled mid-answer. A heartbeat task pings the client and
+    closes the socket when the client stops responding or the user has been
+    idle for CHAT_WS_IDLE_TIMEOUT.
+    """
+
+    def __init__(self, websocket: WebSocket, session_id: Optional[str]):
+        self.websocket = websocket
+        self.session_id = session_id or chat_session_store.new_session_id()
+        self._send_lock = asyncio.Lock()
+        self._answer_task: Optional[asyncio.Task] = None
+        self._ticket_draft: Optional[Dict] = None
+        now = time.monotonic()
+        self.last_seen = now       # any client frame, including pongs
+        self.last_activity = now   # user messages only
+        self.close_reason: Optional[str] = None
+
+    async def send(self, message_type: str, **data):
+        async with self._send_lock:
+            await self.websocket.send_json({"type": message_type, **data})
+
+    async def run(self):
+        await self.send("session", session_id=self.session_id)
+
+        reader = asyncio.create_task(self._read_loop())
+        heartbeat = asyncio.create_task(self._heartbeat_loop())
+        try:
+            await asyncio.wait({reader, heartbeat}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (reader, heartbeat, self._answer_task):
+                if task and not task.done():
+                    task.cancel()
+            if self.close_reason:
+                try:
+                    await self.send("closing", reason=self.close_reason)
+                    await self.websocket.close(code=CLOSE_IDLE)
+                except Exception:
+                    pass
+
+    async def _read_loop(self):
+        try:
+            while True:
+                frame = await self.websocket.receive()
+                if frame["type"] == "websocket.disconnect":
+                    return
+                self.last_seen = time.monotonic()
+                text = frame.get("text")
+                if text is None:
+                    await self.send("error", message="Messages must be sent as text frames")
+                    continue
+                try:
+                    message = json.loads(text)
+                except ValueError:
+                    await self.send("error", message="Messages must be JSON objects")
+                    continue
+                await self._dispatch(message)
+        except WebSocketDisconnect:
+            pass
+
+    async def _heartbeat_loop(self):
+        interval = settings.CHAT_WS_HEARTBEAT_INTERVAL
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            answering = self._answer_task is not None and not self._answer_task.done()
+            if not answering and now - self.last_activity > settings.CHAT_WS_IDLE_TIMEOUT:
+                self.close_reason = "idle"
+                return
+            if now - self.last_seen > 2 * interval:
+                self.close_reason = "heartbeat_timeout"
+                return
+            await self.send("ping")
+
+    async def _dispatch(self, message: Dict):
+        message_type = message.get("type") if isinstance(message, dict) else None
+
+        if message_type == "ping":
+            await self.send("pong")
+        elif message_type == "pong":
+            pass
+        elif message_type == "message":
+            self.last_activity = time.monotonic()
+            await self._start_answer(str(message.get("content") or "").strip())
+        elif message_type == "cancel":
+            if self._answer_task and not self._answer_task.done():
+                self._answer_task.cancel()
+        elif message_type == "create_ticket":
+            self.last_activity = time.monotonic()
+            await self._offer_ticket()
+        elif message_type == "confirm_ticket":
+            self.last_activity = time.monotonic()
+            await self._create_ticket(message)
+        else:
+            await self.send("error", message=f"Unknown message type: {message_type}")
+
+    # Answers -----------------------------------------------------------------
+
+    async def _start_answer(self, content: str):
+        if not content:
+            await self.send("error", message="Empty message")
+            return
+        if self._answer_task and not self._answer_task.done():
+            await self.send(
+                "busy",
+                reason="session_busy",
+                message="Still answering your previous message, please wait for it to finish.",
+                retry_after=1
+            )
+            return
+
+        try:
+            lease = chat_limiter.acquire(self.session_id)
+        except LLMBusyError as e:
+            await self.send("busy", reason=e.reason, message=str(e), retry_after=e.retry_after)
+            return
+
+        self._answer_task = asyncio.create_task(self._answer(content, lease))
+
+    async def _answer(self, content: str, lease):
+        started = time.perf_counter()
+        first_token_ms = None
+        chunks = []
+        completed = False
+        try:
+            summary, context = await asyncio.to_thread(chat_session_store.prompt_context, self.session_id)
+            articles, retrieval_ms = await asyncio.to_thread(chat_service.retrieve, content)
+            await self.send("kb_suggestions", articles=articles, retrieval_ms=retrieval_ms)
+
+            stream = chat_service.stream_chat(content, context, summary, articles)
+            try:
+                async for token in stream:
+                    if first_token_ms is None:
+                        first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+                    chunks.append(token)
+                    await self.send("token", content=token)
+                completed = True
+            finally:
+                await stream.aclose()
+        except ChatStreamError as e:
+            await self.send("error", message=e.message, partial=bool(chunks))
+        except Exception as e:
+            logger.error(f"Chat socket answer failed for session {self.session_id}: {e}")
+            await self.send("error", message="Something went wrong, please try again", partial=bool(chunks))
+        except asyncio.CancelledError:
+            try:
+                await self.send("done", success=False, cancelled=True)
+            except Exception:
+                pass
+            raise
+        finally:
+            lease.release()
+
+        response = "".join(chunks)
+        if completed:
+            await asyncio.to_thread(_remember_turn, self.session_id, content, response)
+
+        await self.send(
+            "done",
+            success=completed,
+            first_token_ms=first_token_ms,
+            total_ms=round((time.perf_counter() - started) * 1000, 1)
+        )
+
+        if completed and TICKET_OFFER.search(response):
+            await self._offer_ticket(content)
+
+    # Tickets -----------------------------------------------------------------
+
+    async def _offer_ticket(self, last_question: Optional[str] = None):
+        summary, messages = await asyncio.to_thread(chat_session_store.prompt_context, self.session_id)
+        if last_question is None:
+            last_question = next(
+                (message["content"] for message in reversed(messages) if message["role"] == "user"),
+                "Chat support request"
+            )
+
+        transcript = "\n".join(
+            ([f"Earlier:\n{summary}"] if summary else [])
+            + [f"{message['role'].capitalize()}: {message['content']}" for message in messages]
+        )
+        self._ticket_draft = {
+            "title": last_question[:100],
+            "description": f"Raised from chat session {self.session_id}.\n\n{transcript}".strip(),
+        }
+        await self.send("ticket_confirmation", draft=self._ticket_draft)
+
+    async def _create_ticket(self, message: Dict):
+        try:
+            confirmation = TicketConfirmation.model_validate(message)
+        except ValidationError as e:
+            error = e.errors(include_url=False, include_input=False)[0]
+            field = ".".join(str(part) for part in error["loc"])
+            await self.send("error", message=f"Invalid {field}: {error['msg']}")
+            return
+
+        draft = self._ticket_draft or {}
+        title = confirmation.title or draft.get("title")
+        description = confirmation.description or draft.get("description")
+        requester_email = confirmation.requester_email or "anonymous@system.com"
+        if not title or not description:
+            await self.send("error", message="Nothing to create a ticket from yet")
+            return
+
+        def create():
+            db = SessionLocal()
+            try:
+                ticket, team = create_chat_ticket(
+                    db,
+                    title=title,
+                    description=description,
+                    requester_email=requester_email,
+                    source_reference=self.session_id
+                )
+                return {
+                    "ticket_id": ticket.id,
+                    "ticket_number": ticket.ticket_number,
+                    "assigned_team": team.name if team else "Unassigned",
+                    "priority": ticket.priority.value,
+                    "category": ticket.category.value,
+                }
+            finally:
+                db.close()
+
+        try:
+            created = await asyncio.to_thread(create)
+        except Exception as e:
+            logger.error(f"Chat socket ticket creation failed: {e}")
+            await self.send("error", message="Could not create the ticket, please try again")
+            return
+
+        self._ticket_draft = None
+        await self.send("ticket_created", **created)
+
+
+@router.websocket("/ws")
+async def chat_websocket(websocket: WebSocket, session_id: Optional[str] = None):
+    """
+    Persistent chat connection; pass ?session_id= to resume a session
+    """
+    global _open_connections
+
+    await websocket.accept()
+    if _open_connections >= settings.CHAT_WS_MAX_CONNECTIONS:
+        await websocket.send_json({"type": "busy", "reason": "too_many_connections", "retry_after": settings.CHAT_BUSY_RETRY_AFTER})
+        await websocket.close(code=CLOSE_TRY_AGAIN_LATER)
+        return
+
+    _open_connections += 1
+    connection = ChatConnection(websocket, session_id)
+    try:
+        await connection.run()
+    finally:
+        _open_connections -= 1
+        logger.debug(f"Chat socket for session {connection.session_id} closed ({connection.close_reason or 'client'})")
+
+
+@router.get("/ws/stats")
+async def chat_websocket_stats():
+    """
+    Open chat sockets against the configured limit
+    """
+    return {
+        "open_connections": _open_connections,
+        "max_connections": settings.CHAT_WS_MAX_CONNECTIONS,
+        "heartbeat_interval_seconds": settings.CHAT_WS_HEARTBEAT_INTERVAL,
+        "idle_timeout_seconds": settings.CHAT_WS_IDLE_TIMEOUT,
+    }
@@ -1,21 +1,36 @@
 """
 Ticket ingestion endpoints from various sources
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List, Dict
 from datetime import datetime
+import asyncio
+import json
+import logging
+import time
 import uuid
 
 from ..database import get_db
-from ..models.ticket_models import Ticket, TicketSource
+from ..models.ticket_models import Ticket, TicketSource, TicketCategory, TicketPriority
 from ..services.classification_service import classification_service
 from ..services.routing_service import routing_service
-from ..services.chat_service import chat_service
+from ..services.chat_service import chat_service, ChatStreamError, FALLBACK_MESSAGES
+from ..services.chat_session_service import chat_session_store
+from ..services.chat_cache_service import chat_answer_cache
+from ..services.concurrency_service import LLMBusyError, chat_limiter, classification_budget
+from ..services.self_service import self_service
+from ..services.kb_service import kb_service
+from ..services.notification_service import notification_service
+from ..services.outbox_service import notification_outbox
+from ..services.sla_scheduler_service import sla_scheduler
 from ..config import settings
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # Request models
 class ChatbotTicketRequest(BaseModel):
@@ -23,6 +38,8 @@ class ChatbotTicketRequest(BaseModel):
     session_id: str
     requester_email: EmailStr = "anonymous@system.com"
     additional_context: Optional[str] = None
+    check_self_service: bool = False
+    declined_self_service: bool = False
 
 class EmailTicketRequest(BaseModel):
     subject: str
@@ -41,40 +58,68 @@ class ExternalTicketRequest(BaseModel):
 
 class ChatMessage(BaseModel):
     message: str
+    # Preferred: the server keeps the history. `context` is for older clients.
+    session_id: Optional[str] = None
     context: Optional[List[Dict]] = None
 
-@router.post("/chatbot")
-async def ingest_from_chatbot(
-    request: ChatbotTicketRequest,
-    db: Session = Depends(get_db)
+def _category_enum(value: Optional[str]) -> TicketCategory:
+    try:
+        return TicketCategory((value or "general").lower())
+    except ValueError:
+        return TicketCategory.GENERAL
+
+def _priority_enum(value: Optional[str]) -> TicketPriority:
+    try:
+        return TicketPriority((value or "medium").lower())
+    except ValueError:
+        return TicketPriority.MEDIUM
+
+def _index_new_ticket(db: Session, ticket: Ticket):
+    """Notify the assigned team, feed a saved ticket to the SLA scheduler and store its KB suggestions (clustering reads it from the DB)"""
+    if ticket.assigned_team_id:
+        notification_service.queue_ticket_assignment(db, ticket)
+        db.commit()
+        notification_outbox.wake()
+    sla_scheduler.track(ticket)
+    try:
+        kb_service.precompute_ticket_suggestions(db, ticket)
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"KB suggestion precompute failed for {ticket.ticket_number}: {e}")
+
+def create_chat_ticket(
+    db: Session,
+    title: str,
+    description: str,
+    requester_email: str,
+    source_reference: Optional[str] = None,
+    additional_context: Optional[str] = None
 ):
     """
-    Create ticket from NullChat chatbot conversation
+    Classify, route, set the SLA for and save a ticket raised from chat
+
+    Returns (ticket, assigned team or None).
     """
-    # Note: This assumes NullChat database is accessible
-    # In production, you'd either share the database or make an API call
-    
-    # For now, create ticket with provided info
     ticket_number = f"TKT-{datetime.utcnow().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
     
     ticket = Ticket(
         ticket_number=ticket_number,
-        title=f"Chat Query - Session {request.session_id[:8]}",
-        description=f"User requested support via chatbot.\nSession ID: {request.session_id}\nConversation ID: {request.conversation_id}",
+        title=title,
+        description=description,
         source=TicketSource.CHAT,
-        source_reference=str(request.conversation_id),
-        requester_email=request.requester_email
+        source_reference=source_reference,
+        requester_email=requester_email
     )
     
     # Classify
     classification = classification_service.classify_ticket(
         title=ticket.title,
-        description=ticket.description + (f"\n\nContext: {request.additional_context}" if request.additional_context else ""),
+        description=ticket.description + (f"\n\nContext: {additional_context}" if additional_context else ""),
         source="chat"
     )
     
-    ticket.category = classification.get("category", "general")
-    ticket.priority = classification.get("priority", "medium")
+    ticket.category = _category_enum(classification.get("category"))
+    ticket.priority = _priority_enum(classification.get("priority"))
     ticket.ai_classification_confidence = classification.get("confidence", 0.0)
     
     # Route
@@ -92,6 +137,41 @@ async def ingest_from_chatbot(
     db.add(ticket)
     db.commit()
     db.refresh(ticket)
+    _index_new_ticket(db, ticket)
+    return ticket, team
+
+@router.post("/chatbot")
+async def ingest_from_chatbot(
+    request: ChatbotTicketRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Create ticket from NullChat chatbot conversation
+    """
+    # Note: This assumes NullChat database is accessible
+    # In production, you'd either share the database or make an API call
+    
+    # Self-service fast path using what the user told the chatbot
+    if request.check_self_service and request.additional_context:
+        articles = self_service.find_articles(db, "", request.additional_context)
+        if articles:
+            return {
+                "success": True,
+                "deflected": True,
+                "articles": articles
+            }
+    elif request.declined_self_service:
+        self_service.record_declined()
+    
+    # For now, create ticket with provided info
+    ticket, team = create_chat_ticket(
+        db,
+        title=f"Chat Query - Session {request.session_id[:8]}",
+        description=f"User requested support via chatbot.\nSession ID: {request.session_id}\nConversation ID: {request.conversation_id}",
+        requester_email=request.requester_email,
+        source_reference=str(request.conversation_id),
+        additional_context=request.additional_context
+    )
     
     return {
         "success": True,
@@ -102,23 +182,30 @@ async def ingest_from_chatbot(
         "category": ticket.category.value
     }
 
-@router.post("/email")
-async def ingest_from_email(
-    request: EmailTicketRequest,
-    db: Session = Depends(get_db)
-):
+def create_email_ticket(
+    db: Session,
+    subject: str,
+    body: str,
+    from_email: str,
+    from_name: Optional[str] = None,
+    source_reference: Optional[str] = None
+) -> Ticket:
     """
-    Create ticket from email
+    Classify, route, set the SLA for and save a ticket raised by email
+
+    Used by the email endpoint and the mailbox ingestion worker;
+    `source_reference` holds the Message-ID when known.
     """
     ticket_number = f"TKT-{datetime.utcnow().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
     
     ticket = Ticket(
         ticket_number=ticket_number,
-        title=request.subject[:200],  # Limit title length
-        description=request.body,
+        title=subject[:200],  # Limit title length
+        description=body,
         source=TicketSource.EMAIL,
-        requester_email=request.from_email,
-        requester_name=request.from_name
+        source_reference=source_reference,
+        requester_email=from_email,
+        requester_name=from_name
     )
     
     # Classify
@@ -128,8 +215,8 @@ async def ingest_from_email(
         source="email"
     )
     
-    ticket.category = classification.get("category", "general")
-    ticket.priority = classification.get("priority", "medium")
+    ticket.category = _category_enum(classification.get("category"))
+    ticket.priority = _priority_enum(classification.get("priority"))
     ticket.ai_classification_confidence = classification.get("confidence", 0.0)
     
     # Route
@@ -147,6 +234,24 @@ async def ingest_from_email(
     db.add(ticket)
     db.commit()
     db.refresh(ticket)
+    _index_new_ticket(db, ticket)
+    return ticket
+
+@router.post("/email")
+async def ingest_from_email(
+    request: EmailTicketRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Create ticket from email
+    """
+    ticket = create_email_ticket(
+        db,
+        subject=request.subject,
+        body=request.body,
+        from_email=request.from_email,
+        from_name=request.from_name
+    )
     
     return {
         "success": True,
@@ -207,6 +312,7 @@ async def ingest_from_glpi(
     db.add(ticket)
     db.commit()
     db.refresh(ticket)
+    _index_new_ticket(db, ticket)
     
     return {"success": True, "ticket_number": ticket.ticket_number}
 
@@ -261,6 +367,7 @@ async def ingest_from_solman(
     db.add(ticket)
     db.commit()
     db.refresh(ticket)
+    _index_new_ticket(db, ticket)
     
     return {"success": True, "ticket_number": ticket.ticket_number}
 
@@ -268,9 +375,178 @@ async def ingest_from_solman(
 async def chat_with_ai(request: ChatMessage):
     """
     Chat with AI assistant for IT support
+
+    Send `session_id` from the previous response (or nothing, to start a
+    session) instead of the whole conversation. The answer is grounded on
+    the best matching KB articles, which are returned alongside it.
+    """
+    try:
+        lease = chat_limiter.acquire(request.session_id)
+    except LLMBusyError as e:
+        return _busy_response(e)
+
+    try:
+        session_id, context, summary = await asyncio.to_thread(_session_context, request)
+        # In-memory lookup, plus a DB read when the KB revision check is due
+        articles, retrieval_ms = await asyncio.to_thread(chat_service.retrieve, request.message)
+        # The Groq call is blocking; keep it off the event loop
+        response = await asyncio.to_thread(chat_service.chat, request.message, context, summary, articles)
+        await asyncio.to_thread(_remember_turn, session_id, request.message, response)
+    finally:
+        lease.release()
+
+    return {
+        "response": response,
+        "success": True,
+        "session_id": session_id,
+        "articles": articles,
+        "retrieval_ms": retrieval_ms,
+    }
+
+def _busy_response(error: LLMBusyError) -> JSONResponse:
+    """Immediate "try again" answer instead of queueing behind other completions"""
+    return JSONResponse(
+        status_code=429 if error.reason == "session_busy" else 503,
+        headers={"Retry-After": str(error.retry_after)},
+        content={
+            "success": False,
+            "busy": True,
+            "reason": error.reason,
+            "response": str(error),
+            "error": str(error),
+            "retry_after": error.retry_after,
+        }
+    )
+
+def _session_context(request: ChatMessage):
+    """Resolve (session_id, context, summary) for a chat request"""
+    if request.session_id:
+        summary, context = chat_session_store.prompt_context(request.session_id)
+        return request.session_id, context, summary
+    if request.context:
+        # Stateless legacy client managing its own history
+        return None, request.context, None
+    return chat_session_store.new_session_id(), [], None
+
+def _remember_turn(session_id: Optional[str], message: str, response: str):
+    if session_id and response not in FALLBACK_MESSAGES:
+        chat_session_store.append_turn(session_id, message, response)
+
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/chat/stream")
+async def chat_with_ai_stream(request: ChatMessage, http_request: Request):
+    """
+    Chat with AI assistant, streaming the answer as server-sent events
+
+    Emits an `articles` event with the KB articles the answer is grounded
+    on, `token` events ({"content": ...}) as Groq produces them, then a
+    `done` event carrying the session_id. If the answer fails an `error`
+    event with the fallback text precedes a `done` with success false, and
+    the turn is not kept. If the client disconnects the upstream request is
+    closed.
+    """
+    try:
+        lease = chat_limiter.acquire(request.session_id)
+    except LLMBusyError as e:
+        return _busy_response(e)
+
+    try:
+        session_id, context, summary = await asyncio.to_thread(_session_context, request)
+        articles, retrieval_ms = await asyncio.to_thread(chat_service.retrieve, request.message)
+    except Exception:
+        lease.release()
+        raise
+
+    async def events():
+        started = time.perf_counter()
+        first_token_ms = None
+        chunks = []
+        stream = chat_service.stream_chat(request.message, context, summary, articles)
+        try:
+            yield _sse("articles", {"articles": articles, "retrieval_ms": retrieval_ms})
+            async for token in stream:
+                if await http_request.is_disconnected():
+                    logger.info("Chat stream client disconnected, cancelling upstream request")
+                    break
+                if first_token_ms is None:
+                    first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+                chunks.append(token)
+                yield _sse("token", {"content": token})
+            else:
+                # Only completed answers become part of the session history
+                await asyncio.to_thread(_remember_turn, session_id, request.message, "".join(chunks))
+                yield _sse("done", {
+                    "success": True,
+                    "session_id": session_id,
+                    "first_token_ms": first_token_ms,
+                    "total_ms": round((time.perf_counter() - started) * 1000, 1),
+                })
+        except ChatStreamError as e:
+            yield _sse("error", {"error": e.message, "partial": bool(chunks)})
+            yield _sse("done", {
+                "success": False,
+                "session_id": session_id,
+                "first_token_ms": first_token_ms,
+                "total_ms": round((time.perf_counter() - started) * 1000, 1),
+            })
+        finally:
+            # Closes the upstream HTTP stream on disconnect or cancellation
+            await stream.aclose()
+            lease.release()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Covers a client that disconnects before the generator ever starts
+        background=BackgroundTask(lease.release)
+    )
+
+@router.get("/chat/cache/stats")
+async def get_chat_cache_stats():
+    """
+    Answer cache hit metrics and the most recently cached questions
+    """
+    return {**chat_answer_cache.stats(), "recent": chat_answer_cache.entries(limit=20)}
+
+@router.delete("/chat/cache")
+async def purge_chat_cache(question: Optional[str] = None):
+    """
+    Purge cached chat answers: all of them, or the entry for one question
+    """
+    return {"success": True, "purged": chat_answer_cache.purge(question)}
+
+@router.get("/chat/capacity")
+async def get_chat_capacity():
+    """
+    In-flight completions and rejections for the chat and classification budgets
+    """
+    return {"chat": chat_limiter.stats(), "classification": classification_budget.stats()}
+
+@router.get("/chat/sessions/stats")
+async def get_chat_session_stats():
+    """
+    Chat session store size, hit rate and compaction counts
+    """
+    return chat_session_store.stats()
+
+@router.delete("/chat/sessions/{session_id}")
+async def end_chat_session(session_id: str):
+    """
+    Forget a chat session (e.g. the user closed the widget)
+    """
+    await asyncio.to_thread(chat_session_store.delete, session_id)
+    return {"success": True}
+
+@router.get("/email/mailbox")
+async def get_mailbox_ingestion_status():
+    """
+    Mailbox ingestion worker status (runs in the leader process only)
     """
-    response = chat_service.chat(request.message, request.context)
-    return {"response": response, "success": True}
+    from ..services.imap_ingestion_service import mailbox_ingestion_worker
+    return mailbox_ingestion_worker.stats()
 
 @router.get("/sync/status")
 async def get_sync_status(db: Session = Depends(get_db)):
@@ -1,13 +1,17 @@
 """
 Knowledge Base API endpoints
 """
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from pydantic import BaseModel
 
 from ..database import get_db
 from ..services.kb_service import kb_service
+from ..services.kb_cache_service import kb_response_cache
+from ..services import kb_bulk_service
+from ..services.kb_autocomplete_service import kb_autocomplete_index
 
 router = APIRouter()
 
@@ -20,7 +24,9 @@ class ArticleResponse(BaseModel):
     tags: List[str]
     view_count: int
     helpful_count: int
+    popularity_score: float = 0.0
     created_at: str
+    match_type: Optional[str] = None  # "fuzzy" for typo-tolerant matches
 
 class FullArticleResponse(BaseModel):
     id: int
@@ -37,6 +43,13 @@ class FullArticleResponse(BaseModel):
     created_at: str
     updated_at: str
 
+class ArticleUpdateRequest(BaseModel):
+    title: Optional[str] = None
+    content: Optional[str] = None
+    summary: Optional[str] = None
+    category: Optional[str] = None
+    tags: Optional[List[str]] = None
+
 class RatingRequest(BaseModel):
     helpful: bool
 
@@ -73,6 +86,48 @@ async def get_popular_articles(
     """
     return kb_service.get_popular_articles(db, limit)
 
+@router.get("/autocomplete")
+async def autocomplete_articles(
+    q: str = Query(..., min_length=1, description="Partially typed query"),
+    category: Optional[str] = Query(None, description="Filter by category"),
+    limit: int = Query(8, ge=1, le=20),
+    db: Session = Depends(get_db)
+):
+    """
+    Typeahead suggestions from the in-memory title / tag / keyword trie
+    """
+    kb_autocomplete_index.ensure_loaded(db)
+    return {"suggestions": kb_autocomplete_index.complete(q, limit, category)}
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """
+    Hit-rate metrics for the popular / search response cache
+    """
+    return kb_response_cache.stats()
+
+@router.get("/export")
+async def export_articles():
+    """
+    Stream every article as NDJSON (one JSON object per line)
+    """
+    return StreamingResponse(
+        kb_bulk_service.export_lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=kb_articles.ndjson"}
+    )
+
+@router.post("/import")
+async def import_articles(request: Request, db: Session = Depends(get_db)):
+    """
+    Bulk import articles from an NDJSON request body
+
+    Lines are validated and inserted in batches as they arrive; invalid
+    lines are skipped and reported with their line numbers.
+    """
+    summary = await kb_bulk_service.import_stream(db, request.stream())
+    return {"success": summary["failed"] == 0, **summary}
+
 @router.get("/{article_id}", response_model=FullArticleResponse)
 async def get_article(article_id: int, db: Session = Depends(get_db)):
     """
@@ -83,6 +138,40 @@ async def get_article(article_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Article not found")
     return article
 
+@router.put("/{article_id}")
+async def update_article(
+    article_id: int,
+    article: ArticleUpdateRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Edit a knowledge base article
+    """
+    success = kb_service.update_article(
+        db,
+        article_id,
+        article.title,
+        article.content,
+        article.summary,
+        article.category,
+        article.tags
+    )
+    if not success:
+        raise HTTPException(status_code=404, detail="Article not found")
+
+    return {"success": True, "message": "Article updated"}
+
+@router.delete("/{article_id}")
+async def deactivate_article(article_id: int, db: Session = Depends(get_db)):
+    """
+    Deactivate a knowledge base article
+    """
+    success = kb_service.deactivate_article(db, article_id)
+    if not success:
+        raise HTTPException(status_code=404, detail="Article not found")
+
+    return {"success": True, "message": "Article deactivated"}
+
 @router.post("/{article_id}/rate")
 async def rate_article(
     article_id: int,
@@ -109,12 +198,8 @@ async def suggest_articles_for_ticket(ticket_id: int, db: Session = Depends(get_
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket not found")
 
-    suggestions = kb_service.suggest_articles_for_ticket(
-        db,
-        ticket.title,
-        ticket.description,
-        ticket.category.value if ticket.category else None
-    )
+    # Precomputed at ingestion; only recomputed if the KB changed since
+    suggestions = kb_service.get_ticket_suggestions(db, ticket)
 
     return {"suggestions": suggestions}
 
@@ -1,16 +1,19 @@
 """
 Ticket management API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from typing import Optional
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
-import asyncio
 
+from ..config import settings
 from ..database import get_db
-from ..services.email_service import email_service
-from ..services.sms_service import sms_service
+from ..services.notification_service import notification_service
+from ..services.outbox_service import notification_outbox
+from ..services.self_service import self_service
+from ..services.kb_service import kb_service
+from ..services.sla_scheduler_service import sla_scheduler
 from ..models.ticket_models import (
     Ticket,
     TicketStatus,
@@ -32,6 +35,10 @@ class TicketCreate(BaseModel):
     requester_phone: Optional[str] = None
     category: Optional[str] = "general"
     priority: Optional[str] = "medium"
+    # Offer matching KB articles instead of creating the ticket
+    check_self_service: bool = False
+    # Set when the user was shown articles and still wants a ticket
+    declined_self_service: bool = False
 
 def serialize_ticket(ticket: Ticket) -> dict:
     """Convert Ticket model into JSON-serializable dict."""
@@ -61,6 +68,16 @@ def serialize_ticket(ticket: Ticket) -> dict:
     }
 
 
+def _set_sla_deadline(ticket: Ticket):
+    """SLA deadline for the ticket's current priority, counted from creation"""
+    sla_minutes = settings.get_sla_deadline_minutes(ticket.priority.value)
+    ticket.sla_deadline = (ticket.created_at or datetime.utcnow()) + timedelta(minutes=sla_minutes)
+
+def _mark_late_resolution(ticket: Ticket):
+    """Resolved after the deadline but before the breach sweeper saw it"""
+    if ticket.sla_deadline and ticket.resolved_at > ticket.sla_deadline:
+        ticket.sla_breached = True
+
 def _to_status_enum(value: str) -> TicketStatus:
     if value is None:
         raise ValueError("status value is None")
@@ -133,11 +150,24 @@ async def get_ticket(ticket_id: int, db: Session = Depends(get_db)):
     return serialize_ticket(ticket)
 
 @router.post("/", status_code=201)
-async def create_ticket(ticket_data: TicketCreate, db: Session = Depends(get_db)):
+async def create_ticket(ticket_data: TicketCreate, response: Response, db: Session = Depends(get_db)):
     """Create a new ticket manually"""
     try:
         logger.info(f"Starting ticket creation for: {ticket_data.title}")
 
+        # Self-service fast path: skip classification, routing and notifications
+        if ticket_data.check_self_service:
+            articles = self_service.find_articles(db, ticket_data.title, ticket_data.description)
+            if articles:
+                response.status_code = 200
+                return {
+                    "deflected": True,
+                    "articles": articles,
+                    "message": "These articles may solve your issue. Submit again with declined_self_service to create a ticket."
+                }
+        elif ticket_data.declined_self_service:
+            self_service.record_declined()
+
         # DEBUG: Log the exact input data
         logger.info(f"Input data: title={ticket_data.title}, desc={ticket_data.description[:50]}..., email={ticket_data.requester_email}, priority={ticket_data.priority}, category={ticket_data.category}")
 
@@ -226,31 +256,40 @@ async def create_ticket(ticket_data: TicketCreate, db: Session = Depends(get_db)
         except Exception as e:
             logger.warning(f"Routing service failed: {e}")
 
+        # Set SLA deadline
+        _set_sla_deadline(ticket)
+
         # Save
         try:
             logger.info("Saving ticket to database...")
             db.add(ticket)
+            # Confirmation email is committed with the ticket and sent by the outbox workers
+            notification_outbox.enqueue(
+                db, "email", "send_ticket_created",
+                ticket_id=ticket.ticket_number,
+                email=ticket.requester_email,
+                title=ticket.title
+            )
+            if ticket.assigned_team_id:
+                notification_service.queue_ticket_assignment(db, ticket)
             db.commit()
             db.refresh(ticket)
+            notification_outbox.wake()
             logger.info(f"Ticket saved successfully: {ticket.ticket_number}")
         except Exception as e:
             logger.error(f"Database save failed: {e}")
             db.rollback()
             raise HTTPException(status_code=500, detail=f"Failed to save ticket: {str(e)}")
 
-        # Send notification (non-blocking)
+        # Schedule SLA alerts
+        sla_scheduler.track(ticket)
+
+        # Store KB suggestions so agents opening the ticket don't trigger a search
         try:
-            logger.info("Sending notification...")
-            asyncio.create_task(
-                email_service.send_ticket_created(
-                    ticket.ticket_number,
-                    ticket.requester_email,
-                    ticket.title
-                )
-            )
-            logger.info("Notification sent")
+            kb_service.precompute_ticket_suggestions(db, ticket)
         except Exception as e:
-            logger.warning(f"Failed to send email notification: {e}")
+            db.rollback()
+            logger.warning(f"KB suggestion precompute failed: {e}")
 
         logger.info(f"Ticket creation completed, returning: {ticket.ticket_number}")
         result = serialize_ticket(ticket)
@@ -298,26 +337,25 @@ async def update_ticket_status(
     # Handle resolution
     if ticket.status == TicketStatus.RESOLVED:
         ticket.resolved_at = datetime.utcnow()
+        _mark_late_resolution(ticket)
         if resolution:
             ticket.resolution = resolution
     
-    db.commit()
-    
-    # Send notification for status update
-    asyncio.create_task(
-        email_service.send_ticket_updated(
-            ticket.ticket_number,
-            ticket.requester_email,
-            ticket.status.value
-        )
+    # Queue notification for status update
+    notification_outbox.enqueue(
+        db, "email", "send_ticket_updated",
+        ticket_id=ticket.ticket_number,
+        email=ticket.requester_email,
+        status=ticket.status.value
     )
     
-    # Send resolution notification if ticket was resolved with a message
+    # Queue resolution notification if ticket was resolved with a message
     if ticket.status == TicketStatus.RESOLVED and resolution:
-        from ..services.notification_service import notification_service
-        asyncio.create_task(
-            notification_service.notify_ticket_resolution(ticket, resolution)
-        )
+        notification_service.queue_ticket_resolution(db, ticket, resolution)
+    
+    db.commit()
+    sla_scheduler.track(ticket)
+    notification_outbox.wake()
     
     return {
         "success": True,
@@ -355,9 +393,20 @@ async def update_ticket(
             raise HTTPException(status_code=400, detail="Invalid category value")
     if priority is not None:
         try:
-            ticket.priority = _to_priority_enum(priority)
+            new_priority = _to_priority_enum(priority)
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid priority value")
+        if new_priority != ticket.priority:
+            old_priority = ticket.priority
+            ticket.priority = new_priority
+            _set_sla_deadline(ticket)
+            # A shorter SLA means the ticket became more urgent
+            if settings.get_sla_deadline_minutes(new_priority.value) < settings.get_sla_deadline_minutes(old_priority.value):
+                ticket.escalation_level = (ticket.escalation_level or 0) + 1
+                ticket.escalated_at = datetime.utcnow()
+                notification_service.queue_ticket_escalation(
+                    db, ticket, f"Priority raised from {old_priority.value} to {new_priority.value}"
+                )
     if status is not None:
         try:
             new_status_enum = _to_status_enum(status)
@@ -367,6 +416,7 @@ async def update_ticket(
             # Handle resolution
             if ticket.status == TicketStatus.RESOLVED:
                 ticket.resolved_at = datetime.utcnow()
+                _mark_late_resolution(ticket)
                 if resolution:
                     ticket.resolution = resolution
         except Exception:
@@ -375,14 +425,14 @@ async def update_ticket(
         ticket.resolution = resolution
 
     ticket.updated_at = datetime.utcnow()
-    db.commit()
     
-    # Send notifications if status changed to resolved
+    # Queue notifications if status changed to resolved
     if status == "resolved" and resolution:
-        from ..services.notification_service import notification_service
-        asyncio.create_task(
-            notification_service.notify_ticket_resolution(ticket, resolution)
-        )
+        notification_service.queue_ticket_resolution(db, ticket, resolution)
+    
+    db.commit()
+    sla_scheduler.track(ticket)
+    notification_outbox.wake()
     
     return serialize_ticket(ticket)
 
@@ -395,5 +445,6 @@ async def delete_ticket(ticket_id: int, db: Session = Depends(get_db)):
     
     db.delete(ticket)
     db.commit()
+    sla_scheduler.unschedule(ticket_id)
     
     return {"success": True, "message": "Ticket deleted"}
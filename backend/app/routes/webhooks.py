@@ -9,6 +9,8 @@ import logging
 from app.models.ticket_models import TicketCreate, Priority, Status
 from app.services.classification_service import classify_ticket
 from app.services.routing_service import routing_service
+from app.services.notification_service import notification_service
+from app.services.outbox_service import notification_outbox
 from app.database import get_db
 from sqlalchemy.orm import Session
 
@@ -107,8 +109,10 @@ async def glpi_webhook(
         assigned_team = routing_service.route_ticket(db, db_ticket, classification)
         if assigned_team:
             db_ticket.assigned_team_id = assigned_team.id
+            notification_service.queue_ticket_assignment(db, db_ticket)
             db.commit()
             db.refresh(db_ticket)
+            notification_outbox.wake()
 
         logger.info(f"GLPI ticket ingested: {db_ticket.id}")
         
@@ -182,8 +186,10 @@ async def solman_webhook(
         assigned_team = routing_service.route_ticket(db, db_ticket, classification)
         if assigned_team:
             db_ticket.assigned_team_id = assigned_team.id
+            notification_service.queue_ticket_assignment(db, db_ticket)
             db.commit()
             db.refresh(db_ticket)
+            notification_outbox.wake()
 
         logger.info(f"Solman ticket ingested: {db_ticket.id}")
         
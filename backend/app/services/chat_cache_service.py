@@ -0,0 +1,196 @@
+"""
+Answer cache for repeated first-turn chatbot questions
+Common questions (VPN setup, password reset, ...) are answered without a Groq call
+"""
+import logging
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from ..config import settings
+from ..services.clustering_service import BANDS, ROWS_PER_BAND, estimated_similarity, minhash_signature
+from ..services.kb_cache_service import LRUTTLCache
+from ..services.text_analysis import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Words that change how a question is phrased, not what it asks
+QUESTION_FILLER = {
+    "how", "why", "where", "who", "could", "should", "want", "need", "know", "tell",
+    "way", "anyone", "someone", "some", "possible", "kindly", "trying", "try",
+}
+
+# Interrogatives that ask something other than "how do I ..." (the default intent)
+QUESTION_WORDS = {"why", "what", "where", "when", "who", "which"}
+
+# Words that turn a how-to question into a troubleshooting one; several are tokenizer stopwords
+TROUBLE_WORDS = {
+    "not", "no", "never", "cannot", "cant", "unable", "without", "problem", "issue", "error",
+    "fail", "fails", "failed", "failing", "broken", "stuck", "wrong",
+}
+WORD_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+TROUBLE_MARKER = "!trouble"
+
+
+def question_terms(text: str) -> List[str]:
+    """
+    Sorted distinct content words plus intent markers
+
+    Word order and phrasing don't matter, but the interrogative ("?why")
+    and negations / trouble words ("!trouble") do: "How do I reset my
+    password?" and "Why can't I reset my password?" get different keys.
+    """
+    terms = {term for term in tokenize(text) if term not in QUESTION_FILLER}
+    if not terms:
+        return []
+
+    words = WORD_PATTERN.findall(text.lower())
+    markers = set()
+    interrogative = next((word for word in words if word in QUESTION_WORDS), None)
+    if interrogative:
+        markers.add(f"?{interrogative}")
+    if any(word in TROUBLE_WORDS or word.endswith("n't") for word in words):
+        markers.add(TROUBLE_MARKER)
+    return sorted(terms) + sorted(markers)
+
+
+def intent_markers(terms: List[str]) -> Tuple[str, ...]:
+    return tuple(term for term in terms if term[0] in "?!")
+
+
+class ChatAnswerCache:
+    """
+    TTL + LRU cache of answers to context-free questions
+
+    Lookups try the normalized question first ("How do I reset my password?"
+    and "password reset" share a key), then near-duplicates: MinHash
+    signatures are bucketed by LSH band and a candidate is accepted when its
+    estimated similarity reaches CHAT_CACHE_SIMILARITY and it asks with the
+    same intent (interrogative, troubleshooting or not).
+
+    Entries remember the KB index version their answer was grounded on and
+    are ignored once the KB has changed.
+    """
+
+    def __init__(self):
+        self._entries = LRUTTLCache(settings.CHAT_CACHE_MAX_ENTRIES, settings.CHAT_CACHE_TTL)
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], Set[str]] = {}
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    @staticmethod
+    def _bands(signature: Tuple[int, ...]):
+        for band in range(BANDS):
+            yield band, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+
+    def get(self, question: str, kb_version: Optional[int] = None) -> Optional[str]:
+        started = time.perf_counter()
+        terms = question_terms(question)
+        if not terms:
+            return None
+
+        key = " ".join(terms)
+        entry = self._entries.get(key)
+        if entry is not None and entry["kb_version"] == kb_version:
+            with self._lock:
+                self.exact_hits += 1
+            logger.debug(f"Chat cache exact hit for '{key}' in {(time.perf_counter() - started) * 1000:.2f} ms")
+            return entry["answer"]
+
+        signature = minhash_signature(terms)
+        markers = intent_markers(terms)
+        best_key, best_entry, best_similarity = None, None, 0.0
+        with self._lock:
+            candidates: Set[str] = set()
+            for band in self._bands(signature):
+                candidates.update(self._buckets.get(band, ()))
+
+        for candidate in candidates:
+            entry = self._entries.get(candidate)
+            if entry is None or entry["kb_version"] != kb_version:
+                continue
+            if intent_markers(entry["terms"]) != markers:
+                continue
+            similarity = estimated_similarity(signature, entry["signature"])
+            if similarity > best_similarity:
+                best_key, best_entry, best_similarity = candidate, entry, similarity
+
+        with self._lock:
+            if best_entry is not None and best_similarity >= settings.CHAT_CACHE_SIMILARITY:
+                self.near_hits += 1
+                logger.debug(f"Chat cache near hit '{key}' -> '{best_key}' ({best_similarity:.2f})")
+                return best_entry["answer"]
+            self.misses += 1
+        return None
+
+    def set(self, question: str, answer: str, kb_version: Optional[int] = None):
+        terms = question_terms(question)
+        if not terms:
+            return
+
+        key = " ".join(terms)
+        signature = minhash_signature(terms)
+        self._entries.set(key, {
+            "question": question,
+            "answer": answer,
+            "terms": terms,
+            "signature": signature,
+            "kb_version": kb_version,
+        })
+        with self._lock:
+            for band in self._bands(signature):
+                self._buckets.setdefault(band, set()).add(key)
+            self.stores += 1
+            # Evicted / expired keys linger in buckets; rebuild once they dominate
+            if len(self._buckets) > 4 * BANDS * settings.CHAT_CACHE_MAX_ENTRIES:
+                self._rebuild_buckets_locked()
+
+    def _rebuild_buckets_locked(self):
+        self._buckets = {}
+        for key, entry in self._entries.items():
+            for band in self._bands(entry["signature"]):
+                self._buckets.setdefault(band, set()).add(key)
+
+    def purge(self, question: Optional[str] = None) -> int:
+        """Drop every cached answer, or only the one a given question maps to"""
+        if question is None:
+            removed = self._entries.clear()
+            with self._lock:
+                self._buckets = {}
+            logger.info(f"Purged {removed} cached chat answers")
+            return removed
+
+        removed = self._entries.delete([" ".join(question_terms(question))])
+        with self._lock:
+            self._rebuild_buckets_locked()
+        return removed
+
+    def entries(self, limit: int = 50) -> List[Dict]:
+        return [
+            {"key": key, "question": entry["question"], "answer": entry["answer"]}
+            for key, entry in self._entries.items()[-limit:]
+        ]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            hits = self.exact_hits + self.near_hits
+            lookups = hits + self.misses
+            return {
+                "entries": self._entries.stats()["entries"],
+                "exact_hits": self.exact_hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "llm_calls_saved": hits,
+                "stores": self.stores,
+                "ttl_seconds": settings.CHAT_CACHE_TTL,
+                "similarity_threshold": settings.CHAT_CACHE_SIMILARITY,
+            }
+
+
+# Global instance
+chat_answer_cache = ChatAnswerCache()
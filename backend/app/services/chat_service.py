@@ -2,13 +2,38 @@
 AI-powered chat service for conversational support
 """
 import os
+import json
+import time
 import requests
+import httpx
 import logging
-from typing import Dict, Optional, List
+from typing import AsyncIterator, Dict, Optional, List, Tuple
 from ..config import settings
+from ..services.chat_session_service import fit_to_budget
+from ..services.chat_cache_service import chat_answer_cache
+from ..services.kb_index_service import kb_search_index
 
 logger = logging.getLogger(__name__)
 
+NOT_CONFIGURED_MESSAGE = "I'm sorry, but the AI chat service is not configured. Please contact IT support."
+API_ERROR_MESSAGE = "I'm experiencing technical difficulties. Please try again or create a support ticket."
+CONNECTION_ERROR_MESSAGE = "I'm having trouble connecting to the AI service. Please try again or create a support ticket."
+
+SPEAKER_PREFIXES = ("NullTicket:", "AI Assistant:")
+# Returned instead of a model answer; never worth keeping in a session's history
+FALLBACK_MESSAGES = {NOT_CONFIGURED_MESSAGE, API_ERROR_MESSAGE, CONNECTION_ERROR_MESSAGE}
+
+
+class ChatStreamError(Exception):
+    """A streamed answer failed; `message` is the fallback text to show the user"""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+# Longer than any speaker prefix, so a streamed one can be stripped
+PREFIX_HOLD_CHARS = 16
+
 class ChatService:
     """
     Conversational AI chat service using LLaMA 3.1 via Groq
@@ -22,14 +47,15 @@ class ChatService:
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        self._async_client: Optional[httpx.AsyncClient] = None
 
-    def chat(self, message: str, context: Optional[List[Dict]] = None) -> str:
-        """
-        Generate a conversational response to user message
-        """
-        if not self.api_key:
-            return "I'm sorry, but the AI chat service is not configured. Please contact IT support."
-
+    def _build_messages(
+        self,
+        message: str,
+        context: Optional[List[Dict]] = None,
+        summary: Optional[str] = None,
+        kb_articles: Optional[List[Dict]] = None
+    ) -> List[Dict]:
         # Build conversation context
         messages = [
             {
@@ -61,24 +87,121 @@ Remember: You're an AI assistant, not a replacement for human IT support staff."
             }
         ]
 
-        # Add conversation history if provided
+        if kb_articles:
+            messages.append({
+                "role": "system",
+                "content": self._kb_prompt(kb_articles)
+            })
+
+        if summary:
+            messages.append({
+                "role": "system",
+                "content": f"Summary of the earlier conversation:\n{summary}"
+            })
+
+        # Add as much recent history as fits the token budget
         if context:
-            messages.extend(context[-10:])  # Keep last 10 messages for context
+            _, recent = fit_to_budget(context, settings.CHAT_CONTEXT_TOKEN_BUDGET)
+            messages.extend(recent)
 
         # Add current user message
         messages.append({
             "role": "user",
             "content": message
         })
+        return messages
+
+    def _payload(self, messages: List[Dict], stream: bool = False) -> Dict:
+        return {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": 500,
+            "temperature": 0.7,
+            "top_p": 0.9,
+            "stream": stream
+        }
+
+    def retrieve(self, message: str) -> Tuple[List[Dict], float]:
+        """
+        Top KB articles for a message from the in-memory index
+
+        Returns (articles with snippets, retrieval time in ms). The database
+        is only read for the periodic KB revision check (so run it off the
+        event loop); an index that is still warming up yields no articles.
+        """
+        started = time.perf_counter()
+        if kb_search_index.loaded:
+            # Picks up articles edited through other workers
+            kb_search_index.ensure_loaded()
+        articles = []
+        for result in kb_search_index.search(message, limit=settings.CHAT_KB_ARTICLES):
+            if result["confidence"] < settings.CHAT_KB_MIN_CONFIDENCE:
+                continue
+            document = kb_search_index.get_document(result["id"]) or {}
+            snippet = " ".join((result["summary"] or document.get("content") or "").split())
+            articles.append({
+                "id": result["id"],
+                "title": result["title"],
+                "category": result["category"],
+                "confidence": result["confidence"],
+                "snippet": snippet[:settings.CHAT_KB_SNIPPET_CHARS],
+            })
+        return articles, round((time.perf_counter() - started) * 1000, 2)
+
+    @staticmethod
+    def _kb_prompt(kb_articles: List[Dict]) -> str:
+        lines = [
+            "Relevant knowledge base articles. Base your answer on them when they apply "
+            "and mention the article title so the user can open it:"
+        ]
+        for number, article in enumerate(kb_articles, start=1):
+            lines.append(f"[{number}] {article['title']}: {article['snippet']}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _cacheable(context: Optional[List[Dict]], summary: Optional[str]) -> bool:
+        # Only first-turn questions: with history the same words can mean something else
+        return settings.CHAT_CACHE_ENABLED and not context and not summary
+
+    @staticmethod
+    def _clean_response(text: str) -> str:
+        for prefix in SPEAKER_PREFIXES:
+            text = text.replace(prefix, "").strip()
+        return text
+
+    @staticmethod
+    def _strip_leading_prefix(text: str) -> str:
+        # Unlike _clean_response, keeps trailing whitespace for the next chunk
+        text = text.lstrip()
+        for prefix in SPEAKER_PREFIXES:
+            if text.startswith(prefix):
+                text = text[len(prefix):].lstrip()
+        return text
+
+    def chat(
+        self,
+        message: str,
+        context: Optional[List[Dict]] = None,
+        summary: Optional[str] = None,
+        kb_articles: Optional[List[Dict]] = None
+    ) -> str:
+        """
+        Generate a conversational response to user message
+        """
+        if not self.api_key:
+            return NOT_CONFIGURED_MESSAGE
+
+        cacheable = self._cacheable(context, summary)
+        kb_version = kb_search_index.version
+        if cacheable:
+            cached = chat_answer_cache.get(message, kb_version)
+            if cached is not None:
+                return cached
+
+        messages = self._build_messages(message, context, summary, kb_articles)
 
         try:
-            payload = {
-                "model": self.model,
-                "messages": messages,
-                "max_tokens": 500,
-                "temperature": 0.7,
-                "top_p": 0.9
-            }
+            payload = self._payload(messages)
 
             response = requests.post(
                 self.base_url,
@@ -92,17 +215,112 @@ Remember: You're an AI assistant, not a replacement for human IT support staff."
                 ai_response = result["choices"][0]["message"]["content"].strip()
 
                 # Clean up response
-                ai_response = ai_response.replace("NullTicket:", "").strip()
-                ai_response = ai_response.replace("AI Assistant:", "").strip()
-
+                ai_response = self._clean_response(ai_response)
+                if cacheable and ai_response:
+                    chat_answer_cache.set(message, ai_response, kb_version)
                 return ai_response
             else:
                 logger.error(f"Groq API error: {response.status_code} - {response.text}")
-                return "I'm experiencing technical difficulties. Please try again or create a support ticket."
+                return API_ERROR_MESSAGE
 
         except Exception as e:
             logger.error(f"Chat service error: {e}")
-            return "I'm having trouble connecting to the AI service. Please try again or create a support ticket."
+            return CONNECTION_ERROR_MESSAGE
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        # One pooled client so streamed requests reuse TLS connections to Groq
+        if self._async_client is None or self._async_client.is_closed:
+            self._async_client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=httpx.Timeout(30.0, connect=5.0)
+            )
+        return self._async_client
+
+    async def stream_chat(
+        self,
+        message: str,
+        context: Optional[List[Dict]] = None,
+        summary: Optional[str] = None,
+        kb_articles: Optional[List[Dict]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Yield the response as Groq streams it, chunk by chunk
+
+        Failures, before or after the first chunk, raise ChatStreamError
+        carrying the same fallback text as chat(), so callers can tell a
+        truncated or fallback answer from a complete one. Closing the
+        generator (e.g. the client disconnected) closes the upstream
+        request, so Groq stops generating.
+        """
+        if not self.api_key:
+            raise ChatStreamError(NOT_CONFIGURED_MESSAGE)
+
+        cacheable = self._cacheable(context, summary)
+        kb_version = kb_search_index.version
+        if cacheable:
+            cached = chat_answer_cache.get(message, kb_version)
+            if cached is not None:
+                yield cached
+                return
+
+        messages = self._build_messages(message, context, summary, kb_articles)
+        started = False
+        chunks = []
+        # Hold back the first characters until a speaker prefix can be stripped
+        head = ""
+
+        try:
+            client = self._get_async_client()
+            async with client.stream("POST", self.base_url, json=self._payload(messages, stream=True)) as response:
+                if response.status_code != 200:
+                    body = await response.aread()
+                    logger.error(f"Groq API error: {response.status_code} - {body[:500]!r}")
+                    raise ChatStreamError(API_ERROR_MESSAGE)
+
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+
+                    # Some chunks (e.g. a trailing usage report) carry no choices
+                    choices = json.loads(data).get("choices")
+                    if not choices:
+                        continue
+                    delta = choices[0].get("delta", {}).get("content")
+                    if not delta:
+                        continue
+
+                    if not started:
+                        head += delta
+                        if len(head) < PREFIX_HOLD_CHARS:
+                            continue
+                        delta = self._strip_leading_prefix(head)
+                        started = True
+                        if not delta:
+                            continue
+                    chunks.append(delta)
+                    yield delta
+
+            if not started and head:
+                cleaned = self._clean_response(head)
+                if cleaned:
+                    chunks.append(cleaned)
+                    yield cleaned
+
+            answer = "".join(chunks).strip()
+            if cacheable and answer:
+                chat_answer_cache.set(message, answer, kb_version)
+
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            logger.error(f"Chat stream error: {e}")
+            raise ChatStreamError(CONNECTION_ERROR_MESSAGE) from e
+
+    async def close(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
 
 # Global instance
 chat_service = ChatService()
\ No newline at end of file
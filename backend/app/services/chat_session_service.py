@@ -0,0 +1,204 @@
+"""
+Server-side chat sessions with token-budgeted context
+Clients send only the new message; history is kept here and trimmed to a token budget
+"""
+import logging
+import re
+import threading
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.ticket_models import ChatSessionState
+from ..services.kb_cache_service import LRUTTLCache
+
+logger = logging.getLogger(__name__)
+
+# Rough token estimate for Llama-style tokenizers; no tokenizer dependency needed
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_LINE_CHARS = 160
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def message_tokens(message: Dict) -> int:
+    return estimate_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+
+def fit_to_budget(messages: List[Dict], budget: int) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Split messages into (older, recent) so the recent ones fit the token budget
+
+    Walks back from the newest message; the newest one is always kept.
+    """
+    used = 0
+    split = len(messages)
+    for index in range(len(messages) - 1, -1, -1):
+        used += message_tokens(messages[index])
+        if used > budget and index < len(messages) - 1:
+            break
+        split = index
+    return messages[:split], messages[split:]
+
+
+def summarize_turns(messages: List[Dict]) -> List[str]:
+    """
+    Extractive summary: the first sentence of each message
+
+    Cheap and deterministic, so trimming never costs an extra completion.
+    """
+    lines = []
+    for message in messages:
+        content = " ".join((message.get("content") or "").split())
+        if not content:
+            continue
+        first = SENTENCE_END.split(content, maxsplit=1)[0]
+        if len(first) > SUMMARY_LINE_CHARS:
+            first = first[:SUMMARY_LINE_CHARS - 3].rstrip() + "..."
+        role = "User" if message.get("role") == "user" else "Assistant"
+        lines.append(f"{role}: {first}")
+    return lines
+
+
+class ChatSession:
+    def __init__(
+        self,
+        session_id: str,
+        messages: Optional[List[Dict]] = None,
+        summary: Optional[str] = None,
+        turns: int = 0
+    ):
+        self.session_id = session_id
+        self.messages = messages or []
+        self.summary = summary
+        self.turns = turns
+
+
+class ChatSessionStore:
+    """
+    LRU + idle-TTL store of chat sessions, optionally written through to the DB
+
+    After each turn the history is compacted: messages that no longer fit
+    CHAT_CONTEXT_TOKEN_BUDGET are folded into a running summary capped at
+    CHAT_SUMMARY_TOKEN_BUDGET, so the prompt stays bounded however long the
+    conversation runs.
+    """
+
+    def __init__(self):
+        self._cache = LRUTTLCache(settings.CHAT_SESSION_MAX_ENTRIES, settings.CHAT_SESSION_TTL)
+        self._lock = threading.Lock()
+        self.persist = settings.CHAT_SESSION_PERSIST
+        self.compactions = 0
+
+    @staticmethod
+    def new_session_id() -> str:
+        return uuid.uuid4().hex
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        session = self._cache.get(session_id)
+        if session is None and self.persist:
+            session = self._load(session_id)
+            if session is not None:
+                self._cache.set(session_id, session)
+        return session
+
+    def prompt_context(self, session_id: str) -> Tuple[Optional[str], List[Dict]]:
+        """Summary of older turns and the recent messages to send with a prompt"""
+        with self._lock:
+            session = self.get(session_id)
+            if session is None:
+                return None, []
+            return session.summary, [dict(message) for message in session.messages]
+
+    def append_turn(self, session_id: str, user_message: str, assistant_message: str):
+        with self._lock:
+            session = self.get(session_id) or ChatSession(session_id)
+            session.messages.append({"role": "user", "content": user_message})
+            session.messages.append({"role": "assistant", "content": assistant_message})
+            session.turns += 1
+            self._compact(session)
+            # Re-setting refreshes the idle TTL
+            self._cache.set(session_id, session)
+
+        if self.persist:
+            self._save(session)
+
+    def _compact(self, session: ChatSession):
+        older, recent = fit_to_budget(session.messages, settings.CHAT_CONTEXT_TOKEN_BUDGET)
+        if not older:
+            return
+
+        lines = (session.summary.splitlines() if session.summary else []) + summarize_turns(older)
+        # Keep the most recent summary lines that fit
+        kept: List[str] = []
+        used = 0
+        for line in reversed(lines):
+            used += estimate_tokens(line)
+            if used > settings.CHAT_SUMMARY_TOKEN_BUDGET:
+                break
+            kept.append(line)
+
+        session.summary = "\n".join(reversed(kept)) or None
+        session.messages = recent
+        self.compactions += 1
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._cache.delete([session_id])
+
+        if self.persist:
+            db = SessionLocal()
+            try:
+                db.query(ChatSessionState).filter(ChatSessionState.session_id == session_id).delete()
+                db.commit()
+            finally:
+                db.close()
+
+    # Persistence -------------------------------------------------------------
+
+    def _load(self, session_id: str) -> Optional[ChatSession]:
+        db = SessionLocal()
+        try:
+            state = db.get(ChatSessionState, session_id)
+            if state is None:
+                return None
+            return ChatSession(state.session_id, list(state.messages or []), state.summary, state.turns or 0)
+        except Exception as e:
+            logger.error(f"Failed to load chat session {session_id}: {e}")
+            return None
+        finally:
+            db.close()
+
+    def _save(self, session: ChatSession):
+        db = SessionLocal()
+        try:
+            db.merge(ChatSessionState(
+                session_id=session.session_id,
+                messages=list(session.messages),
+                summary=session.summary,
+                turns=session.turns
+            ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to persist chat session {session.session_id}: {e}")
+        finally:
+            db.close()
+
+    def stats(self) -> Dict:
+        return {
+            **self._cache.stats(),
+            "persist": self.persist,
+            "compactions": self.compactions,
+            "context_token_budget": settings.CHAT_CONTEXT_TOKEN_BUDGET,
+        }
+
+
+# Global instance
+chat_session_store = ChatSessionStore()
@@ -7,6 +7,7 @@ import requests
 import logging
 from typing import Dict, Optional
 from ..config import settings
+from ..services.concurrency_service import LLMBusyError, classification_budget
 
 logger = logging.getLogger(__name__)
 
@@ -114,12 +115,13 @@ RESPOND ONLY IN THIS JSON FORMAT (no markdown, no extra text):
             }
             
             logger.info(f"Classifying ticket: '{title[:50]}...'")
-            response = requests.post(
-                self.base_url,
-                json=payload,
-                headers=self.headers,
-                timeout=10
-            )
+            with classification_budget.slot(timeout=settings.CLASSIFICATION_QUEUE_TIMEOUT):
+                response = requests.post(
+                    self.base_url,
+                    json=payload,
+                    headers=self.headers,
+                    timeout=10
+                )
             
             if response.status_code == 200:
                 data = response.json()
@@ -146,6 +148,9 @@ RESPOND ONLY IN THIS JSON FORMAT (no markdown, no extra text):
                 logger.error(f"Groq API error: {response.status_code} - {response.text}")
                 return self._fallback_classification(title, description)
                 
+        except LLMBusyError:
+            logger.warning("Classification budget exhausted, using keyword classification")
+            return self._fallback_classification(title, description)
         except Exception as e:
             logger.error(f"Classification error: {e}")
             return self._fallback_classification(title, description)
@@ -220,12 +225,13 @@ RESPOND ONLY IN THIS JSON FORMAT (no markdown, no extra text):
                 "max_tokens": 100
             }
             
-            response = requests.post(
-                self.base_url,
-                json=payload,
-                headers=self.headers,
-                timeout=5
-            )
+            with classification_budget.slot(timeout=settings.CLASSIFICATION_QUEUE_TIMEOUT):
+                response = requests.post(
+                    self.base_url,
+                    json=payload,
+                    headers=self.headers,
+                    timeout=5
+                )
             
             if response.status_code == 200:
                 data = response.json()
@@ -0,0 +1,441 @@
+"""
+Incremental near-duplicate ticket clustering using MinHash signatures and LSH
+Clusters feed KB article suggestions for recurring issues
+"""
+import asyncio
+import hashlib
+import heapq
+import logging
+import random
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.ticket_models import KBSuggestion, Ticket, TicketCategory
+from ..services.text_analysis import ticket_term_stats, tokenize
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+# Re-read this much before the last catch-up so commits that landed late are not missed
+CATCH_UP_OVERLAP = timedelta(seconds=30)
+
+# Deterministic permutations so signatures are stable across restarts
+_rng = random.Random(1729)
+_PERMUTATIONS = [
+    (_rng.randint(1, MERSENNE_PRIME - 1), _rng.randint(0, MERSENNE_PRIME - 1))
+    for _ in range(NUM_PERM)
+]
+
+
+def _shingles(tokens: List[str]) -> Set[str]:
+    shingles = set(tokens)
+    shingles.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    return shingles
+
+
+def _base_hash(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "little")
+
+
+def minhash_signature(tokens: List[str]) -> Optional[Tuple[int, ...]]:
+    """MinHash signature over unigram + bigram shingles, None for empty text"""
+    shingles = _shingles(tokens)
+    if not shingles:
+        return None
+
+    hashes = [_base_hash(shingle) for shingle in shingles]
+    return tuple(
+        min(((a * h + b) % MERSENNE_PRIME) & MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def estimated_similarity(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the underlying shingle sets"""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+class TicketCluster:
+    """A group of near-duplicate tickets inside the sliding window"""
+
+    def __init__(self, cluster_id: int):
+        self.id = cluster_id
+        self.members: Dict[int, datetime] = {}
+        self.titles: Dict[int, str] = {}
+        self.categories: Dict[int, str] = {}
+        self.terms: Counter = Counter()
+        self.suggestion_id: Optional[int] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.members)
+
+    def dominant_category(self) -> Optional[str]:
+        if not self.categories:
+            return None
+        return Counter(self.categories.values()).most_common(1)[0][0]
+
+    def representative_title(self) -> str:
+        # Most common normalized title, falling back to the most recent ticket
+        normalized = Counter(" ".join(title.lower().split()) for title in self.titles.values())
+        title, count = normalized.most_common(1)[0]
+        if count > 1:
+            return title.capitalize()
+        latest = max(self.members, key=self.members.get)
+        return self.titles[latest]
+
+    def sample_ticket_ids(self, limit: int = 10) -> List[int]:
+        return sorted(self.members, key=self.members.get, reverse=True)[:limit]
+
+
+class TicketClusteringService:
+    """
+    Maintains near-duplicate ticket clusters over a sliding time window
+
+    Each ticket is MinHash-signed once and bucketed by LSH bands, so adding
+    a ticket only compares it against bucket neighbours.
+
+    Every worker keeps its own index (it also feeds ticket_term_stats) and
+    follows the tickets table: `start` catches up on tickets created since
+    the last pass every CLUSTERING_SYNC_INTERVAL seconds, off the event loop,
+    whichever worker saved them. KBSuggestion rows are written only by the
+    leader (`start_suggestion_sync`), so workers never race to create the
+    same suggestion.
+    """
+
+    def __init__(
+        self,
+        window_days: int = 30,
+        similarity_threshold: float = 0.5,
+        min_cluster_size: int = 5,
+        max_candidates: int = 50
+    ):
+        self.window = timedelta(days=window_days)
+        self.similarity_threshold = similarity_threshold
+        self.min_cluster_size = min_cluster_size
+        self.max_candidates = max_candidates
+
+        self._lock = threading.RLock()
+        self._signatures: Dict[int, Tuple[int, ...]] = {}
+        self._tokens: Dict[int, List[str]] = {}
+        self._cluster_of: Dict[int, int] = {}
+        self._clusters: Dict[int, TicketCluster] = {}
+        self._buckets: List[Dict[Tuple[int, ...], Set[int]]] = [{} for _ in range(BANDS)]
+        self._expiry: List[Tuple[datetime, int]] = []
+        self._synced_at: Optional[datetime] = None
+        self.loaded = False
+        self.running = False
+        self._task = None
+        self._suggestion_task = None
+
+    # Indexing ----------------------------------------------------------------
+
+    def _bands(self, signature: Tuple[int, ...]):
+        for band in range(BANDS):
+            start = band * ROWS_PER_BAND
+            yield band, signature[start:start + ROWS_PER_BAND]
+
+    def add(
+        self,
+        ticket_id: int,
+        title: str,
+        description: str,
+        category: Optional[str],
+        created_at: datetime
+    ) -> Optional[int]:
+        """
+        Sign a ticket and place it in a cluster
+
+        Returns the cluster ID, or None if the ticket has no usable text or
+        is already outside the window.
+        """
+        now = datetime.utcnow()
+        if created_at < now - self.window:
+            return None
+
+        tokens = tokenize(f"{title} {description}")
+        signature = minhash_signature(tokens)
+        if signature is None:
+            return None
+
+        with self._lock:
+            if ticket_id in self._signatures:
+                return self._cluster_of.get(ticket_id)
+
+            self._expire(now)
+
+            candidates: Set[int] = set()
+            for band, key in self._bands(signature):
+                bucket = self._buckets[band].get(key)
+                if bucket:
+                    candidates.update(bucket)
+                    if len(candidates) >= self.max_candidates:
+                        break
+
+            best_id, best_score = None, 0.0
+            for candidate_id in candidates:
+                score = estimated_similarity(signature, self._signatures[candidate_id])
+                if score > best_score:
+                    best_id, best_score = candidate_id, score
+
+            if best_id is not None and best_score >= self.similarity_threshold:
+                cluster = self._clusters[self._cluster_of[best_id]]
+            else:
+                cluster = TicketCluster(ticket_id)
+                self._clusters[cluster.id] = cluster
+
+            cluster.members[ticket_id] = created_at
+            cluster.titles[ticket_id] = title
+            if category:
+                cluster.categories[ticket_id] = category
+            cluster.terms.update(set(tokens))
+
+            self._signatures[ticket_id] = signature
+            self._tokens[ticket_id] = tokens
+            ticket_term_stats.add_document(tokens)
+            self._cluster_of[ticket_id] = cluster.id
+            for band, key in self._bands(signature):
+                self._buckets[band].setdefault(key, set()).add(ticket_id)
+            heapq.heappush(self._expiry, (created_at, ticket_id))
+
+            return cluster.id
+
+    def _expire(self, now: datetime):
+        """Drop tickets that have slid out of the window"""
+        cutoff = now - self.window
+        while self._expiry and self._expiry[0][0] < cutoff:
+            _, ticket_id = heapq.heappop(self._expiry)
+            self._remove(ticket_id)
+
+    def _remove(self, ticket_id: int):
+        signature = self._signatures.pop(ticket_id, None)
+        tokens = self._tokens.pop(ticket_id, [])
+        cluster_id = self._cluster_of.pop(ticket_id, None)
+        if signature is None:
+            return
+
+        ticket_term_stats.remove_document(tokens)
+        for band, key in self._bands(signature):
+            bucket = self._buckets[band].get(key)
+            if bucket:
+                bucket.discard(ticket_id)
+                if not bucket:
+                    del self._buckets[band][key]
+
+        cluster = self._clusters.get(cluster_id)
+        if cluster:
+            cluster.members.pop(ticket_id, None)
+            cluster.titles.pop(ticket_id, None)
+            cluster.categories.pop(ticket_id, None)
+            cluster.terms.subtract(set(tokens))
+            cluster.terms += Counter()  # drop zero counts
+            if not cluster.members:
+                del self._clusters[cluster_id]
+
+    def load(self, db: Session, batch_size: int = 1000):
+        """Rebuild the index from tickets inside the window"""
+        started = datetime.utcnow()
+        count = self._add_created_since(db, started - self.window, batch_size)
+
+        with self._lock:
+            self._attach_existing_suggestions(db)
+            self._synced_at = started
+            self.loaded = True
+
+        logger.info(f"Clustered {count} tickets into {len(self._clusters)} clusters")
+
+    def catch_up(self, db: Session, batch_size: int = 1000) -> int:
+        """
+        Index tickets created since the last load or catch-up
+
+        Tickets already in the index are skipped by `add`. Returns the number
+        of tickets read.
+        """
+        if not self.loaded:
+            self.load(db, batch_size)
+            return len(self._signatures)
+
+        started = datetime.utcnow()
+        count = self._add_created_since(db, self._synced_at - CATCH_UP_OVERLAP, batch_size)
+        self._synced_at = started
+        return count
+
+    def _add_created_since(self, db: Session, since: datetime, batch_size: int) -> int:
+        rows = db.query(
+            Ticket.id, Ticket.title, Ticket.description, Ticket.category, Ticket.created_at
+        ).filter(
+            Ticket.created_at >= since
+        ).order_by(
+            Ticket.created_at.asc()
+        ).yield_per(batch_size)
+
+        count = 0
+        for ticket_id, title, description, category, created_at in rows:
+            self.add(
+                ticket_id,
+                title or "",
+                description or "",
+                category.value if category else None,
+                created_at
+            )
+            count += 1
+        return count
+
+    def run_catch_up(self) -> int:
+        """Catch up with a dedicated session (run off the event loop)"""
+        db = SessionLocal()
+        try:
+            return self.catch_up(db)
+        except Exception as e:
+            logger.error(f"Failed to update ticket clusters: {e}")
+            return 0
+        finally:
+            db.close()
+
+    def _attach_existing_suggestions(self, db: Session):
+        """Link pending suggestions, including ones written by an earlier leader, to their clusters"""
+        pending = db.query(KBSuggestion).filter(
+            KBSuggestion.status == "pending",
+            KBSuggestion.suggested_by == "system"
+        ).all()
+
+        for suggestion in pending:
+            cluster_ids = Counter(
+                self._cluster_of[ticket_id]
+                for ticket_id in (suggestion.sample_ticket_ids or [])
+                if ticket_id in self._cluster_of
+            )
+            if cluster_ids:
+                cluster = self._clusters[cluster_ids.most_common(1)[0][0]]
+                if cluster.suggestion_id is None:
+                    cluster.suggestion_id = suggestion.id
+
+    # Suggestions -------------------------------------------------------------
+
+    def frequent_clusters(self) -> List[TicketCluster]:
+        with self._lock:
+            self._expire(datetime.utcnow())
+            clusters = [
+                cluster for cluster in self._clusters.values()
+                if cluster.size >= self.min_cluster_size
+            ]
+        return sorted(clusters, key=lambda cluster: cluster.size, reverse=True)
+
+    def sync_suggestions(self, db: Session) -> List[KBSuggestion]:
+        """
+        Create or refresh a KBSuggestion row for every frequent cluster
+
+        Suggestions that an admin already reviewed are left untouched. Run
+        by the leader only; see `start_suggestion_sync`.
+        """
+        self.catch_up(db)
+        with self._lock:
+            self._attach_existing_suggestions(db)
+
+        suggestions = []
+        for cluster in self.frequent_clusters():
+            suggestion = None
+            if cluster.suggestion_id is not None:
+                suggestion = db.query(KBSuggestion).filter(
+                    KBSuggestion.id == cluster.suggestion_id
+                ).first()
+                if suggestion and suggestion.status != "pending":
+                    continue
+
+            if suggestion is None:
+                suggestion = KBSuggestion(suggested_by="system", status="pending")
+                db.add(suggestion)
+
+            category = cluster.dominant_category()
+            suggestion.suggested_title = cluster.representative_title()
+            keywords = ticket_term_stats.top_terms(cluster.terms, limit=10)
+            suggestion.ticket_pattern = " ".join(keywords[:8])
+            suggestion.frequency_count = cluster.size
+            suggestion.sample_ticket_ids = cluster.sample_ticket_ids()
+            suggestion.category = TicketCategory(category) if category else None
+            suggestion.keywords = keywords
+            suggestions.append((cluster, suggestion))
+
+        db.commit()
+        for cluster, suggestion in suggestions:
+            cluster.suggestion_id = suggestion.id
+
+        return [suggestion for _, suggestion in suggestions]
+
+    def run_sync_suggestions(self) -> int:
+        """Sync suggestions with a dedicated session (run off the event loop)"""
+        db = SessionLocal()
+        try:
+            return len(self.sync_suggestions(db))
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to sync KB suggestions: {e}")
+            return 0
+        finally:
+            db.close()
+
+    # Background tasks --------------------------------------------------------
+
+    async def start(self):
+        """Load the window, then catch up every CLUSTERING_SYNC_INTERVAL seconds"""
+        if self.running:
+            return
+
+        self.running = True
+        self._task = asyncio.create_task(self._catch_up_periodically())
+
+    async def _catch_up_periodically(self):
+        while self.running:
+            await asyncio.to_thread(self.run_catch_up)
+            await asyncio.sleep(settings.CLUSTERING_SYNC_INTERVAL)
+
+    async def stop(self):
+        self.running = False
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def start_suggestion_sync(self):
+        """Leader job: refresh KB suggestions every CLUSTERING_SUGGESTION_INTERVAL seconds"""
+        if self._suggestion_task:
+            return
+
+        self._suggestion_task = asyncio.create_task(self._sync_suggestions_periodically())
+
+    async def _sync_suggestions_periodically(self):
+        while True:
+            await asyncio.to_thread(self.run_sync_suggestions)
+            await asyncio.sleep(settings.CLUSTERING_SUGGESTION_INTERVAL)
+
+    async def stop_suggestion_sync(self):
+        if self._suggestion_task:
+            self._suggestion_task.cancel()
+            self._suggestion_task = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "tickets_indexed": len(self._signatures),
+                "clusters": len(self._clusters),
+                "frequent_clusters": sum(
+                    1 for cluster in self._clusters.values()
+                    if cluster.size >= self.min_cluster_size
+                ),
+                "window_days": self.window.days,
+                "synced_at": self._synced_at.isoformat() if self._synced_at else None,
+                "vocabulary": ticket_term_stats.stats(),
+            }
+
+
+# Global instance
+ticket_clustering_service = TicketClusteringService()
@@ -0,0 +1,153 @@
+"""
+Concurrency budgets for LLM calls
+Chat and classification draw from separate pools so a chat spike cannot starve ticket triage
+"""
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Set
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LLMBusyError(Exception):
+    """No capacity for another completion right now"""
+
+    def __init__(self, message: str, retry_after: int, reason: str = "busy"):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class ConcurrencyBudget:
+    """
+    Bounded number of in-flight completions for one kind of work
+
+    A semaphore rather than a queue: callers decide how long they are
+    willing to wait for a slot (chat: not at all, classification: briefly).
+    """
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def acquire(self, timeout: float = 0.0) -> bool:
+        acquired = self._semaphore.acquire(timeout=timeout) if timeout > 0 else self._semaphore.acquire(blocking=False)
+        with self._lock:
+            if acquired:
+                self.in_flight += 1
+                self.peak = max(self.peak, self.in_flight)
+                self.admitted += 1
+            else:
+                self.rejected += 1
+        return acquired
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+
+    @contextmanager
+    def slot(self, timeout: float = 0.0):
+        if not self.acquire(timeout):
+            raise LLMBusyError(f"{self.name} capacity exhausted", retry_after=settings.CHAT_BUSY_RETRY_AFTER)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "peak": self.peak,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+            }
+
+
+class Lease:
+    """Held capacity that is safe to release more than once"""
+
+    def __init__(self, release: Callable[[], None]):
+        self._release = release
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._release()
+
+
+class ChatConcurrencyLimiter:
+    """
+    Admits a chat completion only if the chat budget has a free slot and the
+    session has no other completion in flight
+
+    Never waits: a saturated pool is reported straight away so the client can
+    show "busy, try again" instead of hanging on a queue.
+    """
+
+    def __init__(self, budget: ConcurrencyBudget):
+        self.budget = budget
+        self._sessions: Set[str] = set()
+        self._lock = threading.Lock()
+        self.session_conflicts = 0
+
+    def acquire(self, session_id: Optional[str] = None) -> Lease:
+        if session_id:
+            with self._lock:
+                if session_id in self._sessions:
+                    self.session_conflicts += 1
+                    raise LLMBusyError(
+                        "Still answering your previous message, please wait for it to finish.",
+                        retry_after=1,
+                        reason="session_busy"
+                    )
+                self._sessions.add(session_id)
+
+        if not self.budget.acquire():
+            self._leave(session_id)
+            logger.warning(f"Chat pool saturated ({self.budget.limit} in flight), rejecting request")
+            raise LLMBusyError(
+                "The assistant is busy right now, please try again in a few seconds.",
+                retry_after=settings.CHAT_BUSY_RETRY_AFTER
+            )
+
+        def release():
+            self.budget.release()
+            self._leave(session_id)
+
+        return Lease(release)
+
+    def _leave(self, session_id: Optional[str]):
+        if session_id:
+            with self._lock:
+                self._sessions.discard(session_id)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            active_sessions = len(self._sessions)
+        return {
+            **self.budget.stats(),
+            "active_sessions": active_sessions,
+            "session_conflicts": self.session_conflicts,
+        }
+
+
+# Global instances
+chat_budget = ConcurrencyBudget("chat", settings.CHAT_MAX_CONCURRENCY)
+classification_budget = ConcurrencyBudget("classification", settings.CLASSIFICATION_MAX_CONCURRENCY)
+chat_limiter = ChatConcurrencyLimiter(chat_budget)
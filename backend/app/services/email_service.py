@@ -3,10 +3,12 @@ import os
 import asyncio
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import aiosmtplib
 from typing import List, Optional
 import logging
 
+from ..config import settings
+from .smtp_pool import SMTPConnectionPool
+
 logger = logging.getLogger(__name__)
 
 class EmailService:
@@ -16,7 +18,20 @@ class EmailService:
         self.smtp_user = os.getenv('SMTP_USER', '')
         self.smtp_password = os.getenv('SMTP_PASSWORD', '')
         self.from_email = os.getenv('FROM_EMAIL', self.smtp_user)
+        self.use_tls = os.getenv('SMTP_USE_TLS', 'True').lower() == 'true'  # False: plain / STARTTLS (port 587)
         self.enabled = bool(self.smtp_user and self.smtp_password)
+        self.pool = SMTPConnectionPool(
+            hostname=self.smtp_host,
+            port=self.smtp_port,
+            username=self.smtp_user,
+            password=self.smtp_password,
+            use_tls=self.use_tls,
+            size=settings.SMTP_POOL_SIZE,
+            max_messages=settings.SMTP_POOL_MAX_MESSAGES,
+            idle_timeout=settings.SMTP_POOL_IDLE_TIMEOUT,
+            keepalive_interval=settings.SMTP_KEEPALIVE_INTERVAL,
+            timeout=settings.SMTP_TIMEOUT,
+        )
 
     async def send_email(
         self,
@@ -41,15 +56,8 @@ class EmailService:
             if html_body:
                 message.attach(MIMEText(html_body, 'html'))
 
-            # Send email
-            await aiosmtplib.send(
-                message,
-                hostname=self.smtp_host,
-                port=self.smtp_port,
-                username=self.smtp_user,
-                password=self.smtp_password,
-                use_tls=True,  # Changed from start_tls to use_tls for SSL
-            )
+            # Send over a pooled, already authenticated connection
+            await self.pool.send_message(message)
             logger.info(f"Email sent successfully to {to_addresses}")
             return True
         except Exception as e:
@@ -84,7 +92,7 @@ NullTicket Support Team
 </body>
 </html>
 """
-        await self.send_email([email], subject, body, html_body)
+        return await self.send_email([email], subject, body, html_body)
 
     async def send_ticket_updated(self, ticket_id: str, email: str, status: str):
         """Send ticket update notification."""
@@ -111,7 +119,7 @@ NullTicket Support Team
 </body>
 </html>
 """
-        await self.send_email([email], subject, body, html_body)
+        return await self.send_email([email], subject, body, html_body)
 
     async def send_sla_alert(self, ticket_id: str, team_email: str):
         """Send SLA breach alert."""
@@ -139,7 +147,7 @@ NullTicket Alert System
 </body>
 </html>
 """
-        await self.send_email([team_email], subject, body, html_body)
+        return await self.send_email([team_email], subject, body, html_body)
 
     async def send_ticket_resolution(self, ticket_id: str, email: str, title: str, category: str, resolution_message: str):
         """Send ticket resolution notification."""
@@ -228,7 +236,11 @@ Thank you for using POWERGRID Helpdesk!
 </body>
 </html>
 """
-        await self.send_email([email], subject, body, html_body)
+        return await self.send_email([email], subject, body, html_body)
+
+    async def close(self):
+        """Close pooled SMTP connections (shutdown)"""
+        await self.pool.close()
 
 
 # Global instance
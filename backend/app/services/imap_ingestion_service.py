@@ -0,0 +1,485 @@
+"""
+Mailbox ingestion worker
+Turns new messages in the support mailbox into tickets, woken by IMAP IDLE or by polling
+"""
+import asyncio
+import logging
+import re
+import ssl
+from datetime import datetime
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesFeedParser
+from email.utils import parseaddr
+from typing import Dict, List, Optional, Tuple
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.ticket_models import MailboxCursor, Ticket, TicketSource
+
+logger = logging.getLogger(__name__)
+
+LITERAL_RE = re.compile(rb"\{(\d+)\}\r\n$")
+UID_RE = re.compile(rb"\bUID (\d+)")
+CODE_RE = re.compile(rb"\[(UIDVALIDITY|UIDNEXT) (\d+)\]")
+TAG_PREFIX = "NT"
+LITERAL_CHUNK = 64 * 1024
+HTML_TAG_RE = re.compile(r"<[^>]+>")
+
+
+class IMAPError(Exception):
+    """The server answered NO / BAD or said BYE"""
+
+
+class IMAPClient:
+    """
+    Minimal asyncio IMAP4rev1 client: LOGIN, SELECT, UID SEARCH / FETCH, IDLE
+
+    Message literals are read in chunks straight into an email FeedParser,
+    so a message is never held as one raw buffer on top of its parsed form.
+    """
+
+    def __init__(self, host: str, port: int, use_ssl: bool = True, timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.capabilities: set = set()
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._tag = 0
+
+    async def connect(self):
+        context = ssl.create_default_context() if self.use_ssl else None
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=context), self.timeout
+        )
+        greeting = await self._readline()
+        if not greeting.startswith(b"* OK") and not greeting.startswith(b"* PREAUTH"):
+            raise IMAPError(f"Unexpected greeting: {greeting!r}")
+
+    async def close(self):
+        if self._writer is None:
+            return
+        try:
+            await asyncio.wait_for(self._command("LOGOUT"), 5)
+        except Exception:
+            pass
+        self._writer.close()
+        self._writer = None
+
+    # Protocol ----------------------------------------------------------------
+
+    async def _readline(self, timeout: Optional[float] = None) -> bytes:
+        line = await asyncio.wait_for(self._reader.readline(), timeout or self.timeout)
+        if not line:
+            raise ConnectionError("IMAP server closed the connection")
+        return line
+
+    async def _read_literal(self, size: int, parser: Optional[BytesFeedParser]) -> bytes:
+        data = bytearray()
+        remaining = size
+        while remaining:
+            chunk = await asyncio.wait_for(self._reader.read(min(remaining, LITERAL_CHUNK)), self.timeout)
+            if not chunk:
+                raise ConnectionError("IMAP server closed the connection")
+            remaining -= len(chunk)
+            if parser is not None:
+                parser.feed(chunk)
+            else:
+                data.extend(chunk)
+        return bytes(data)
+
+    async def _command(self, command: str, parse_literals: bool = False) -> List[Tuple[bytes, list]]:
+        """
+        Send a command and collect its untagged responses
+
+        Returns (response line, literals) pairs, literals spliced out of the
+        line. With `parse_literals` each literal is fed to its own
+        BytesFeedParser and the parsed message is returned in its place.
+        """
+        self._tag += 1
+        tag = f"{TAG_PREFIX}{self._tag:04d}".encode()
+        self._writer.write(tag + b" " + command.encode() + b"\r\n")
+        await self._writer.drain()
+
+        responses = []
+        while True:
+            line = await self._readline()
+            literals = []
+            while True:
+                match = LITERAL_RE.search(line)
+                if not match:
+                    break
+                parser = BytesFeedParser(policy=policy.default) if parse_literals else None
+                data = await self._read_literal(int(match.group(1)), parser)
+                literals.append(parser.close() if parser is not None else data)
+                line = line[:match.start()] + await self._readline()
+
+            if line.startswith(tag + b" "):
+                status = line[len(tag) + 1:].split(b" ", 1)[0]
+                if status != b"OK":
+                    raise IMAPError(f"{command.split(' ', 1)[0]} failed: {line.decode(errors='replace').strip()}")
+                return responses
+            if line.startswith(b"* BYE"):
+                raise IMAPError(f"Server closed the session: {line.decode(errors='replace').strip()}")
+            responses.append((line, literals))
+
+    @staticmethod
+    def _quote(value: str) -> str:
+        return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+    # Commands ----------------------------------------------------------------
+
+    async def login(self, user: str, password: str):
+        await self._command(f"LOGIN {self._quote(user)} {self._quote(password)}")
+        for line, _ in await self._command("CAPABILITY"):
+            if line.startswith(b"* CAPABILITY"):
+                self.capabilities = set(line.decode().upper().split()[2:])
+
+    async def select(self, mailbox: str) -> Dict[str, int]:
+        """EXAMINE (read-only SELECT); returns UIDVALIDITY, UIDNEXT and EXISTS"""
+        info = {}
+        for line, _ in await self._command(f"EXAMINE {self._quote(mailbox)}"):
+            for name, value in CODE_RE.findall(line):
+                info[name.decode().lower()] = int(value)
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == b"EXISTS":
+                info["exists"] = int(parts[1])
+        return info
+
+    async def uid_search_after(self, last_uid: int) -> List[int]:
+        responses = await self._command(f"UID SEARCH UID {last_uid + 1}:*")
+        uids = []
+        for line, _ in responses:
+            if line.startswith(b"* SEARCH"):
+                uids.extend(int(uid) for uid in line.split()[2:])
+        # "n:*" always matches the newest message, even when its UID is below n
+        return sorted(uid for uid in uids if uid > last_uid)
+
+    async def uid_fetch(self, uids: List[int], max_bytes: int) -> List[Tuple[int, EmailMessage]]:
+        """Fetch (without setting \\Seen) and parse messages; only the first `max_bytes` of each are read"""
+        responses = await self._command(
+            f"UID FETCH {','.join(str(uid) for uid in uids)} (UID BODY.PEEK[]<0.{max_bytes}>)",
+            parse_literals=True
+        )
+        messages = []
+        for line, literals in responses:
+            match = UID_RE.search(line)
+            if b" FETCH " in line and match and literals:
+                messages.append((int(match.group(1)), literals[0]))
+        return sorted(messages, key=lambda item: item[0])
+
+    async def noop(self) -> bool:
+        """Returns whether the server reported new messages"""
+        return any(line.rstrip().endswith(b"EXISTS") for line, _ in await self._command("NOOP"))
+
+    async def idle(self, timeout: float) -> bool:
+        """
+        Wait in IDLE until the server reports new messages or `timeout` passes
+
+        Returns whether new messages were reported.
+        """
+        self._tag += 1
+        tag = f"{TAG_PREFIX}{self._tag:04d}".encode()
+        self._writer.write(tag + b" IDLE\r\n")
+        await self._writer.drain()
+
+        line = await self._readline()
+        if not line.startswith(b"+"):
+            raise IMAPError(f"IDLE refused: {line.decode(errors='replace').strip()}")
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        new_mail = False
+        while not new_mail:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                line = await self._readline(timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            if line.startswith(b"* BYE"):
+                raise IMAPError(f"Server closed the session: {line.decode(errors='replace').strip()}")
+            new_mail = line.rstrip().endswith(b"EXISTS")
+
+        self._writer.write(b"DONE\r\n")
+        await self._writer.drain()
+        while True:
+            line = await self._readline()
+            if line.startswith(tag + b" "):
+                return new_mail
+            new_mail = new_mail or line.rstrip().endswith(b"EXISTS")
+
+
+def email_to_ticket_fields(message: EmailMessage) -> Dict[str, Optional[str]]:
+    """Subject, sender, plain-text body and Message-ID of a parsed email"""
+    from_name, from_email = parseaddr(str(message.get("From", "")))
+
+    body = ""
+    part = message.get_body(preferencelist=("plain", "html"))
+    if part is not None:
+        try:
+            body = part.get_content()
+        except (LookupError, ValueError):
+            payload = part.get_payload(decode=True) or b""
+            body = payload.decode("utf-8", errors="replace")
+        if part.get_content_type() == "text/html":
+            body = HTML_TAG_RE.sub(" ", body)
+
+    return {
+        "subject": str(message.get("Subject", "")).strip() or "(no subject)",
+        "body": body.strip() or "(empty message)",
+        "from_email": from_email,
+        "from_name": from_name or None,
+        "message_id": (str(message.get("Message-ID", "")).strip() or None),
+    }
+
+
+class MailboxIngestionWorker:
+    """
+    Watches EMAIL_MAILBOX and creates a ticket for every new message
+
+    The highest UID ingested is stored per mailbox (MailboxCursor), so after
+    a restart only messages that arrived meanwhile are fetched; a first run,
+    or a UIDVALIDITY change, starts from the current end of the mailbox
+    instead of importing its history. Messages are fetched with BODY.PEEK,
+    leaving their \\Seen flag alone.
+
+    New mail is awaited with IDLE when the server supports it (re-issued
+    every EMAIL_IDLE_TIMEOUT, below the 29 minutes servers allow), otherwise
+    by a NOOP every EMAIL_CHECK_INTERVAL. Connection errors reconnect with
+    backoff. Each message becomes a ticket through the same pipeline as
+    POST /api/ingest/email; a ticket already created for a Message-ID is not
+    created again if the cursor update was lost. A message that fails to
+    ingest is retried after reconnecting; its attempts are counted in the
+    cursor and after EMAIL_MAX_INGEST_ATTEMPTS it is logged and skipped, so
+    one bad message doesn't stall the mailbox.
+    """
+
+    def __init__(self):
+        self.running = False
+        self._task = None
+        self.connected = False
+        self.idle_supported: Optional[bool] = None
+        self.last_uid: Optional[int] = None
+        self.uid_validity: Optional[int] = None
+        self.last_check: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self.ingested = 0
+        self.skipped = 0
+        self.failed = 0
+        self.dead_lettered = 0
+        self.reconnects = 0
+
+    @property
+    def mailbox_key(self) -> str:
+        return f"{settings.EMAIL_USER}@{settings.EMAIL_HOST}/{settings.EMAIL_MAILBOX}"
+
+    @property
+    def configured(self) -> bool:
+        return bool(settings.EMAIL_ENABLED and settings.EMAIL_HOST and settings.EMAIL_USER and settings.EMAIL_PASSWORD)
+
+    # Cursor ------------------------------------------------------------------
+
+    def _load_cursor(self, uid_validity: int, uid_next: int) -> int:
+        db = SessionLocal()
+        try:
+            cursor = db.get(MailboxCursor, self.mailbox_key)
+            if cursor is not None and cursor.uid_validity == uid_validity:
+                return cursor.last_uid
+
+            if cursor is not None:
+                logger.warning(f"UIDVALIDITY of {self.mailbox_key} changed; starting from the newest message")
+            else:
+                cursor = MailboxCursor(mailbox=self.mailbox_key)
+                db.add(cursor)
+            cursor.uid_validity = uid_validity
+            cursor.last_uid = max(uid_next - 1, 0)
+            db.commit()
+            return cursor.last_uid
+        finally:
+            db.close()
+
+    def _ingest(self, uid: int, message: EmailMessage) -> bool:
+        """Create the ticket for one message and advance the cursor; False if it was skipped"""
+        from ..routes.ingestion import create_email_ticket
+
+        fields = email_to_ticket_fields(message)
+        db = SessionLocal()
+        try:
+            created = False
+            duplicate = fields["message_id"] and db.query(Ticket.id).filter(
+                Ticket.source == TicketSource.EMAIL,
+                Ticket.source_reference == fields["message_id"]
+            ).first()
+            if fields["from_email"] and not duplicate:
+                create_email_ticket(
+                    db,
+                    subject=fields["subject"],
+                    body=fields["body"],
+                    from_email=fields["from_email"],
+                    from_name=fields["from_name"],
+                    source_reference=fields["message_id"]
+                )
+                created = True
+            elif not fields["from_email"]:
+                logger.warning(f"Skipping message UID {uid} without a sender address")
+
+            cursor = self._get_cursor(db, uid)
+            cursor.last_uid = max(cursor.last_uid, uid)
+            if cursor.failing_uid is not None and cursor.failing_uid <= uid:
+                cursor.failing_uid = None
+                cursor.failed_attempts = 0
+            db.commit()
+            return created
+        finally:
+            db.close()
+
+    def _get_cursor(self, db, uid: int) -> MailboxCursor:
+        """The mailbox cursor, recreated just behind `uid` if its row was deleted meanwhile"""
+        cursor = db.get(MailboxCursor, self.mailbox_key)
+        if cursor is None:
+            logger.warning(f"Cursor of {self.mailbox_key} is missing; recreating it at UID {uid - 1}")
+            cursor = MailboxCursor(mailbox=self.mailbox_key, uid_validity=self.uid_validity or 0, last_uid=uid - 1)
+            db.add(cursor)
+        return cursor
+
+    def _record_failure(self, uid: int, message: EmailMessage, error: Exception) -> bool:
+        """Count a failed attempt at a message; True once it is given up on and skipped"""
+        db = SessionLocal()
+        try:
+            cursor = self._get_cursor(db, uid)
+            if cursor.failing_uid == uid:
+                cursor.failed_attempts = (cursor.failed_attempts or 0) + 1
+            else:
+                cursor.failing_uid = uid
+                cursor.failed_attempts = 1
+
+            given_up = cursor.failed_attempts >= settings.EMAIL_MAX_INGEST_ATTEMPTS
+            if given_up:
+                logger.error(
+                    f"Giving up on message UID {uid} in {self.mailbox_key} after {cursor.failed_attempts} attempts "
+                    f"(Message-ID {message.get('Message-ID')}, from {message.get('From')}, "
+                    f"subject {message.get('Subject')!r}): {error}"
+                )
+                cursor.last_uid = max(cursor.last_uid, uid)
+                cursor.failing_uid = None
+                cursor.failed_attempts = 0
+            db.commit()
+            return given_up
+        finally:
+            db.close()
+
+    # Loop --------------------------------------------------------------------
+
+    async def start(self):
+        if self.running:
+            return
+        if not self.configured:
+            logger.info("Mailbox ingestion disabled (EMAIL_USER / EMAIL_PASSWORD not set)")
+            return
+
+        self.running = True
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        backoff = 1.0
+        while self.running:
+            client = IMAPClient(settings.EMAIL_HOST, settings.EMAIL_PORT, use_ssl=settings.EMAIL_USE_SSL)
+            try:
+                await client.connect()
+                await client.login(settings.EMAIL_USER, settings.EMAIL_PASSWORD)
+                self.connected = True
+                self.idle_supported = "IDLE" in client.capabilities
+                logger.info(
+                    f"📥 Watching {self.mailbox_key} ({'IMAP IDLE' if self.idle_supported else 'polling'})"
+                )
+                backoff = 1.0
+                await self._watch(client)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                self.reconnects += 1
+                logger.error(f"Mailbox ingestion error, reconnecting in {backoff:.0f}s: {self.last_error}")
+            finally:
+                self.connected = False
+                await client.close()
+
+            if self.running:
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, max(settings.EMAIL_CHECK_INTERVAL, 1))
+
+    async def _watch(self, client: IMAPClient):
+        info = await client.select(settings.EMAIL_MAILBOX)
+        self.uid_validity = info.get("uidvalidity", 0)
+        self.last_uid = await asyncio.to_thread(
+            self._load_cursor, self.uid_validity, info.get("uidnext", 1)
+        )
+
+        while self.running:
+            await self._fetch_new(client)
+            self.last_check = datetime.utcnow()
+
+            if self.idle_supported:
+                await client.idle(settings.EMAIL_IDLE_TIMEOUT)
+            else:
+                await asyncio.sleep(settings.EMAIL_CHECK_INTERVAL)
+                await client.noop()
+
+    async def _fetch_new(self, client: IMAPClient):
+        uids = await client.uid_search_after(self.last_uid)
+        for i in range(0, len(uids), settings.EMAIL_FETCH_BATCH):
+            batch = uids[i:i + settings.EMAIL_FETCH_BATCH]
+            for uid, message in await client.uid_fetch(batch, settings.EMAIL_MAX_MESSAGE_BYTES):
+                try:
+                    created = await asyncio.to_thread(self._ingest, uid, message)
+                except Exception as e:
+                    self.failed += 1
+                    if not await asyncio.to_thread(self._record_failure, uid, message, e):
+                        # Stop here so the message is retried after reconnecting
+                        raise IMAPError(f"Failed to ingest message UID {uid}: {e}") from e
+                    self.dead_lettered += 1
+                    self.last_uid = uid
+                    continue
+                if created:
+                    self.ingested += 1
+                else:
+                    self.skipped += 1
+                self.last_uid = uid
+        if uids:
+            logger.info(f"Ingested mail up to UID {self.last_uid} from {self.mailbox_key}")
+
+    async def stop(self):
+        self.running = False
+        if self._task:
+            self._task.cancel()
+            # Let the connection log out before the process moves on
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.configured,
+            "running": self.running,
+            "connected": self.connected,
+            "mode": None if self.idle_supported is None else ("idle" if self.idle_supported else "polling"),
+            "mailbox": self.mailbox_key if self.configured else None,
+            "last_uid": self.last_uid,
+            "last_check": self.last_check.isoformat() if self.last_check else None,
+            "ingested": self.ingested,
+            "skipped": self.skipped,  # already ingested or without a sender
+            "failed": self.failed,
+            "dead_lettered": self.dead_lettered,  # given up after EMAIL_MAX_INGEST_ATTEMPTS
+            "reconnects": self.reconnects,
+            "last_error": self.last_error,
+        }
+
+
+# Global instance
+mailbox_ingestion_worker = MailboxIngestionWorker()
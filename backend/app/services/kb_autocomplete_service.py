@@ -0,0 +1,202 @@
+"""
+In-memory prefix trie for knowledge base typeahead
+Serves /api/kb/autocomplete without touching the database per keystroke
+"""
+import heapq
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.ticket_models import KnowledgeArticle
+from ..services.text_analysis import TOKEN_PATTERN
+
+logger = logging.getLogger(__name__)
+
+
+class TrieNode:
+    __slots__ = ("children", "article_ids")
+
+    def __init__(self):
+        self.children: Dict[str, "TrieNode"] = {}
+        # Articles with at least one term under this prefix
+        self.article_ids: Set[int] = set()
+
+
+def _terms(article: KnowledgeArticle) -> Set[str]:
+    text = " ".join([article.title or ""] + list(article.tags or []) + list(article.keywords or []))
+    return {token for token in TOKEN_PATTERN.findall(text.lower()) if len(token) > 1}
+
+
+class KBAutocompleteIndex:
+    """
+    Prefix trie over article titles, tags and keywords
+
+    Each node keeps the set of articles reachable below it, so a lookup is a
+    walk of len(prefix) nodes plus ranking the candidates by helpfulness and
+    view count. Like the search index, it is rebuilt once another worker
+    has moved the DB KB revision on.
+    """
+
+    def __init__(self):
+        self._root = TrieNode()
+        self._lock = threading.RLock()
+        self._articles: Dict[int, Dict] = {}
+        self.loaded = False
+        self.revision: Optional[int] = None  # DB KB revision the trie was built from
+        self._revision_checked_at = 0.0
+
+    # Maintenance -------------------------------------------------------------
+
+    def upsert(self, article: KnowledgeArticle):
+        """Add or refresh an article; inactive articles are removed"""
+        with self._lock:
+            self._remove_locked(article.id)
+            if not article.is_active:
+                return
+
+            terms = _terms(article)
+            self._articles[article.id] = {
+                "id": article.id,
+                "title": article.title,
+                "category": article.category.value if article.category else None,
+                "helpful_count": article.helpful_count or 0,
+                "view_count": article.view_count or 0,
+                "terms": terms,
+            }
+            for term in terms:
+                node = self._root
+                for char in term:
+                    node = node.children.setdefault(char, TrieNode())
+                    node.article_ids.add(article.id)
+
+    def remove(self, article_id: int):
+        with self._lock:
+            self._remove_locked(article_id)
+
+    def _remove_locked(self, article_id: int):
+        entry = self._articles.pop(article_id, None)
+        if entry is None:
+            return
+
+        for term in entry["terms"]:
+            path = [self._root]
+            for char in term:
+                node = path[-1].children.get(char)
+                if node is None:
+                    break
+                node.article_ids.discard(article_id)
+                path.append(node)
+
+            # Prune nodes no article passes through any more
+            for depth in range(len(path) - 1, 0, -1):
+                if path[depth].article_ids:
+                    break
+                del path[depth - 1].children[term[depth - 1]]
+
+    def record_counts(self, article_id: int, views: int = 0, helpful: int = 0):
+        """Apply counter increments so ranking follows the KB counters"""
+        with self._lock:
+            entry = self._articles.get(article_id)
+            if entry:
+                entry["view_count"] += views
+                entry["helpful_count"] += helpful
+
+    def rebuild(self, db: Session, batch_size: int = 500):
+        from ..services.kb_service import get_kb_revision
+
+        revision = get_kb_revision(db)
+        articles = db.query(KnowledgeArticle).filter(
+            KnowledgeArticle.is_active == True
+        ).yield_per(batch_size)
+
+        with self._lock:
+            self._root = TrieNode()
+            self._articles.clear()
+            for article in articles:
+                self.upsert(article)
+            self.loaded = True
+            self.revision = revision
+
+        logger.info(f"KB autocomplete index built with {len(self._articles)} articles")
+
+    def warm_up(self):
+        """Build the trie with a dedicated session (run off the event loop)"""
+        db = SessionLocal()
+        try:
+            self.rebuild(db)
+        except Exception as e:
+            logger.error(f"Failed to build KB autocomplete index: {e}")
+        finally:
+            db.close()
+
+    def ensure_loaded(self, db: Session):
+        """Build the trie on first use, or rebuild it when the DB KB revision moved on"""
+        now = time.monotonic()
+        if self.loaded and now - self._revision_checked_at < settings.KB_REVISION_CHECK_INTERVAL:
+            return
+        self._revision_checked_at = now
+
+        from ..services.kb_service import get_kb_revision
+
+        if not self.loaded or get_kb_revision(db) != self.revision:
+            self.rebuild(db)
+
+    # Querying ----------------------------------------------------------------
+
+    def _find(self, prefix: str) -> Optional[TrieNode]:
+        node = self._root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def complete(self, query: str, limit: int = 8, category: Optional[str] = None) -> List[Dict]:
+        """
+        Suggest articles for a partially typed query
+
+        Every word is treated as a prefix ("pass res" finds "password reset")
+        and an article must match all of them.
+        """
+        words = TOKEN_PATTERN.findall(query.lower())
+        if not words:
+            return []
+
+        with self._lock:
+            candidates: Optional[Set[int]] = None
+            for word in words:
+                node = self._find(word)
+                if node is None:
+                    return []
+                candidates = set(node.article_ids) if candidates is None else candidates & node.article_ids
+                if not candidates:
+                    return []
+
+            entries = [self._articles[article_id] for article_id in candidates]
+            if category:
+                entries = [entry for entry in entries if entry["category"] == category]
+
+            top = heapq.nlargest(
+                limit,
+                entries,
+                key=lambda entry: (entry["helpful_count"], entry["view_count"], -entry["id"])
+            )
+            return [
+                {
+                    "id": entry["id"],
+                    "title": entry["title"],
+                    "category": entry["category"],
+                    "helpful_count": entry["helpful_count"],
+                    "view_count": entry["view_count"],
+                }
+                for entry in top
+            ]
+
+
+# Global instance
+kb_autocomplete_index = KBAutocompleteIndex()
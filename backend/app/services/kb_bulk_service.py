@@ -0,0 +1,188 @@
+"""
+Streaming NDJSON import and export for knowledge base articles
+"""
+import json
+import logging
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional
+
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..models.ticket_models import KnowledgeArticle, TicketCategory
+from ..services.kb_cache_service import kb_response_cache
+from ..services.kb_index_service import kb_search_index
+from ..services.kb_service import bump_kb_revision
+from ..services.kb_autocomplete_service import kb_autocomplete_index
+
+logger = logging.getLogger(__name__)
+
+EXPORT_COLUMNS = [
+    "id", "title", "content", "summary", "category", "tags", "keywords", "language",
+    "is_active", "view_count", "helpful_count", "not_helpful_count", "resolution_count",
+    "created_at", "updated_at",
+]
+
+MAX_REPORTED_ERRORS = 50
+
+
+class KBArticleRecord(BaseModel):
+    """One NDJSON line of an article import"""
+    title: str = Field(..., min_length=1)
+    content: str = Field(..., min_length=1)
+    summary: Optional[str] = None
+    category: Optional[str] = None
+    tags: List[str] = []
+    keywords: List[str] = []
+    language: str = "en"
+    is_active: bool = True
+    view_count: int = 0
+    helpful_count: int = 0
+    not_helpful_count: int = 0
+    resolution_count: int = 0
+    created_at: Optional[datetime] = None
+
+    @field_validator("category")
+    @classmethod
+    def known_category(cls, value: Optional[str]) -> Optional[str]:
+        if value is None:
+            return None
+        value = value.lower()
+        TicketCategory(value)  # raises ValueError for unknown categories
+        return value
+
+    def to_row(self) -> Dict:
+        row = self.model_dump()
+        row["category"] = TicketCategory(self.category) if self.category else None
+        # Every row of an executemany batch needs the same keys
+        row["created_at"] = self.created_at or datetime.utcnow()
+        return row
+
+
+class ArticleImporter:
+    """
+    Validates NDJSON lines and inserts them in executemany batches
+    """
+
+    def __init__(self, db: Session, batch_size: int = 500):
+        self.db = db
+        self.batch_size = batch_size
+        self._batch: List[Dict] = []
+        self.line_number = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[Dict] = []
+
+    def feed(self, line: str):
+        self.line_number += 1
+        line = line.strip()
+        if not line:
+            return
+
+        try:
+            record = KBArticleRecord.model_validate_json(line)
+        except ValidationError as e:
+            self._fail(e.errors(include_url=False, include_input=False)[0]["msg"])
+            return
+
+        self._batch.append(record.to_row())
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def _fail(self, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": self.line_number, "error": message})
+
+    def _flush(self):
+        if not self._batch:
+            return
+
+        try:
+            self.db.execute(KnowledgeArticle.__table__.insert(), self._batch)
+            bump_kb_revision(self.db)
+            self.db.commit()
+            self.imported += len(self._batch)
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"KB import batch ending at line {self.line_number} failed: {e}")
+            self.failed += len(self._batch)
+            if len(self.errors) < MAX_REPORTED_ERRORS:
+                self.errors.append({"line": self.line_number, "error": f"Batch insert failed: {e}"})
+        finally:
+            self._batch = []
+
+    def finish(self) -> Dict:
+        """Write the last batch and refresh derived KB state once"""
+        self._flush()
+
+        if self.imported:
+            kb_search_index.rebuild(self.db)
+            kb_autocomplete_index.rebuild(self.db)
+            kb_response_cache.clear()
+
+        logger.info(f"KB import finished: {self.imported} imported, {self.failed} failed")
+        return {
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+        }
+
+
+def import_lines(db: Session, lines: Iterable[str], batch_size: int = 500) -> Dict:
+    """Import articles from an iterable of NDJSON lines (e.g. an open file)"""
+    importer = ArticleImporter(db, batch_size)
+    for line in lines:
+        importer.feed(line)
+    return importer.finish()
+
+
+async def import_stream(db: Session, chunks: AsyncIterator[bytes], batch_size: int = 500) -> Dict:
+    """Import articles from a streamed request body without buffering it"""
+    importer = ArticleImporter(db, batch_size)
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            importer.feed(line.decode("utf-8", errors="replace"))
+
+    if pending:
+        importer.feed(pending.decode("utf-8", errors="replace"))
+    return importer.finish()
+
+
+def _serialize_row(row) -> str:
+    record = {}
+    for column in EXPORT_COLUMNS:
+        value = row[column]
+        if isinstance(value, TicketCategory):
+            value = value.value
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        record[column] = value
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def export_lines(db: Optional[Session] = None, batch_size: int = 500) -> Iterator[str]:
+    """
+    Yield every article as an NDJSON line using a server-side cursor
+
+    Opens its own session when none is given, so it can back a streaming
+    response that outlives the request's session.
+    """
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+
+    try:
+        table = KnowledgeArticle.__table__
+        statement = select(*[table.c[column] for column in EXPORT_COLUMNS]).order_by(table.c.id)
+        result = db.execute(statement.execution_options(stream_results=True, yield_per=batch_size))
+        for row in result.mappings():
+            yield _serialize_row(row)
+    finally:
+        if own_session:
+            db.close()
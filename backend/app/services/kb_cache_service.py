@@ -0,0 +1,224 @@
+"""
+Response cache for knowledge base popular lists and search results
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LRUTTLCache:
+    """
+    Size-bounded LRU cache whose entries also expire after a TTL
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def items(self) -> List[Tuple[Hashable, object]]:
+        with self._lock:
+            return [(key, value) for key, (_, value) in self._entries.items()]
+
+    def delete(self, keys: Iterable[Hashable]) -> int:
+        removed = 0
+        with self._lock:
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    removed += 1
+            self.invalidations += removed
+        return removed
+
+    def clear(self) -> int:
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+            self.invalidations += removed
+        return removed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a search query so equivalent queries share a cache entry"""
+    return " ".join(query.lower().split())
+
+
+class KBResponseCache:
+    """
+    Caches popular and search responses and invalidates only the entries an
+    article change can affect
+
+    Keys start with the DB KB revision, so entries cached before another
+    worker changed the KB are never served; the revision is read at most
+    every KB_REVISION_CHECK_INTERVAL seconds. Changes made in this process
+    are also invalidated right away.
+    """
+
+    def __init__(self):
+        self.popular = LRUTTLCache(settings.KB_CACHE_MAX_ENTRIES, settings.KB_CACHE_TTL)
+        self.search = LRUTTLCache(settings.KB_CACHE_MAX_ENTRIES, settings.KB_CACHE_TTL)
+        self._revision = 0
+        self._revision_checked_at: Optional[float] = None
+
+    def revision(self, db: Session) -> int:
+        """DB KB revision to key entries on, re-read once KB_REVISION_CHECK_INTERVAL has passed"""
+        from ..services.kb_service import get_kb_revision
+
+        now = time.monotonic()
+        checked_at = self._revision_checked_at
+        if checked_at is None or now - checked_at >= settings.KB_REVISION_CHECK_INTERVAL:
+            self._revision = get_kb_revision(db)
+            self._revision_checked_at = now
+        return self._revision
+
+    # Popular -----------------------------------------------------------------
+
+    def get_popular(self, revision: int, limit: int) -> Optional[List[Dict]]:
+        return _copy(self.popular.get((revision, limit)))
+
+    def set_popular(self, revision: int, limit: int, articles: List[Dict]):
+        self.popular.set((revision, limit), _copy(articles))
+
+    # Search ------------------------------------------------------------------
+
+    @staticmethod
+    def search_key(revision: int, query: str, category: Optional[str], limit: int) -> Tuple:
+        return (revision, normalize_query(query), category, limit)
+
+    def get_search(self, revision: int, query: str, category: Optional[str], limit: int) -> Optional[List[Dict]]:
+        return _copy(self.search.get(self.search_key(revision, query, category, limit)))
+
+    def set_search(self, revision: int, query: str, category: Optional[str], limit: int, articles: List[Dict]):
+        self.search.set(self.search_key(revision, query, category, limit), _copy(articles))
+
+    # Invalidation ------------------------------------------------------------
+
+    def invalidate_article(
+        self,
+        article_id: int,
+        searchable_text: Optional[str] = None,
+        rank: Optional[float] = None
+    ):
+        """
+        Invalidate after an article is created, edited or deactivated
+
+        Search entries are dropped if they contain the article, if their
+        query matches the article's new text, or if they went through the
+        typo-tolerant tier (which a new spelling can change). Popular lists
+        are dropped if they contain the article, are not full, or the
+        article's popularity score would place it inside them.
+        """
+        text = searchable_text.lower() if searchable_text else None
+        stale_searches = [
+            key for key, articles in self.search.items()
+            if _contains(articles, article_id)
+            or (text is not None and (key[1] in text or _used_fuzzy_tier(articles, key[3])))
+        ]
+        removed = self.search.delete(stale_searches)
+
+        stale_popular = [
+            key for key, articles in self.popular.items()
+            if _contains(articles, article_id)
+            or (rank is not None and (len(articles) < key[1] or rank >= _rank(articles[-1])))
+        ]
+        removed += self.popular.delete(stale_popular)
+
+        if removed:
+            logger.debug(f"Invalidated {removed} KB cache entries for article {article_id}")
+
+    def invalidate_ranking(self, article_ids: Iterable[int]):
+        """Invalidate after view / rating counters change article ordering"""
+        ids = set(article_ids)
+        if not ids:
+            return
+
+        self.popular.clear()
+        self.search.delete([
+            key for key, articles in self.search.items()
+            if any(article.get("id") in ids for article in articles)
+        ])
+
+    def clear(self):
+        self.popular.clear()
+        self.search.clear()
+
+    def stats(self) -> Dict:
+        return {
+            "popular": self.popular.stats(),
+            "search": self.search.stats(),
+        }
+
+
+def _used_fuzzy_tier(articles: List[Dict], limit: int) -> bool:
+    exact = sum(1 for article in articles if article.get("match_type") != "fuzzy")
+    return exact < min(limit, settings.KB_FUZZY_MIN_RESULTS)
+
+
+def _contains(articles: List[Dict], article_id: int) -> bool:
+    return any(article.get("id") == article_id for article in articles)
+
+
+def _rank(article: Dict) -> float:
+    return article.get("popularity_score") or 0.0
+
+
+def _copy(articles: Optional[List[Dict]]) -> Optional[List[Dict]]:
+    # Callers annotate results (e.g. relevance_score), so never hand out cached dicts
+    if articles is None:
+        return None
+    return [dict(article) for article in articles]
+
+
+# Global instance
+kb_response_cache = KBResponseCache()
@@ -0,0 +1,129 @@
+"""
+Write-behind buffer for knowledge base view and rating counters
+"""
+import asyncio
+import logging
+import threading
+from typing import Dict
+from sqlalchemy import text
+
+from ..config import settings
+from ..database import SessionLocal
+from ..services.kb_cache_service import kb_response_cache
+from ..services.kb_autocomplete_service import kb_autocomplete_index
+
+logger = logging.getLogger(__name__)
+
+COUNTER_FIELDS = ("view_count", "helpful_count", "not_helpful_count")
+
+FLUSH_STATEMENT = text("""
+    UPDATE knowledge_articles
+    SET view_count = COALESCE(view_count, 0) + :view_count,
+        helpful_count = COALESCE(helpful_count, 0) + :helpful_count,
+        not_helpful_count = COALESCE(not_helpful_count, 0) + :not_helpful_count
+    WHERE id = :article_id
+""")
+
+
+class KBCounterBuffer:
+    """
+    Aggregates article counter increments in memory and flushes them in batches
+    """
+
+    def __init__(self):
+        self._pending: Dict[int, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self.running = False
+        self._task = None
+
+    def _increment(self, article_id: int, field: str, amount: int = 1):
+        with self._lock:
+            counters = self._pending.setdefault(article_id, dict.fromkeys(COUNTER_FIELDS, 0))
+            counters[field] += amount
+
+    def record_view(self, article_id: int):
+        """Buffer a single article view"""
+        self._increment(article_id, "view_count")
+
+    def record_rating(self, article_id: int, helpful: bool):
+        """Buffer a helpful / not helpful rating"""
+        self._increment(article_id, "helpful_count" if helpful else "not_helpful_count")
+
+    def pending_for(self, article_id: int) -> Dict[str, int]:
+        """Get increments not yet written to the database for an article"""
+        with self._lock:
+            return dict(self._pending.get(article_id, dict.fromkeys(COUNTER_FIELDS, 0)))
+
+    def flush(self) -> int:
+        """
+        Write all buffered increments with a single batched UPDATE
+
+        Returns the number of articles updated.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        if not pending:
+            return 0
+
+        params = [
+            {"article_id": article_id, **counters}
+            for article_id, counters in pending.items()
+        ]
+
+        db = SessionLocal()
+        try:
+            db.execute(FLUSH_STATEMENT, params)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to flush KB counters, re-queueing: {e}")
+            # Put the increments back so they are retried on the next pass
+            with self._lock:
+                for article_id, counters in pending.items():
+                    current = self._pending.setdefault(article_id, dict.fromkeys(COUNTER_FIELDS, 0))
+                    for field, amount in counters.items():
+                        current[field] += amount
+            return 0
+        finally:
+            db.close()
+
+        # Counters drive popular / search / typeahead ordering
+        kb_response_cache.invalidate_ranking(pending.keys())
+        for article_id, counters in pending.items():
+            kb_autocomplete_index.record_counts(
+                article_id,
+                views=counters["view_count"],
+                helpful=counters["helpful_count"]
+            )
+
+        logger.debug(f"Flushed KB counters for {len(params)} articles")
+        return len(params)
+
+    async def start_background_tasks(self):
+        """Start the periodic flush loop"""
+        if self.running:
+            return
+
+        self.running = True
+        self._task = asyncio.create_task(self._flush_periodically())
+
+    async def _flush_periodically(self):
+        while self.running:
+            await asyncio.sleep(settings.KB_COUNTER_FLUSH_INTERVAL)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                logger.error(f"Error in KB counter flush: {e}")
+
+    async def stop(self):
+        """Stop the flush loop and write out anything still buffered"""
+        self.running = False
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        self.flush()
+
+
+# Global instance
+kb_counter_buffer = KBCounterBuffer()
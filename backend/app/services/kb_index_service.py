@@ -0,0 +1,293 @@
+"""
+In-memory search index over knowledge base articles
+Scores articles with BM25 so self-service and chat can query the KB without a DB hit
+"""
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from typing import Collection, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.ticket_models import KnowledgeArticle
+from ..services.text_analysis import TrigramVocabulary, ticket_term_stats, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Matches in short, curated fields say more than matches in the body
+FIELD_WEIGHTS = {
+    "title": 3.0,
+    "tags": 2.0,
+    "keywords": 2.0,
+    "summary": 1.5,
+    "content": 1.0,
+}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+class KBSearchIndex:
+    """
+    BM25 index over active articles, updated whenever an article changes
+
+    `version` increases on every change so callers can tell whether results
+    computed earlier are still current. It starts from the clock, so results
+    stored by an earlier process never look current after a restart.
+
+    Edits made in this process are applied as they happen; `ensure_loaded`
+    picks up edits made by other workers by rebuilding once the KB revision
+    in the DB differs from the one the index was built from.
+    """
+
+    def __init__(self, max_query_terms: int = 8):
+        self.max_query_terms = max_query_terms
+        self._lock = threading.RLock()
+        self._documents: Dict[int, Dict] = {}
+        self._postings: Dict[str, Dict[int, float]] = {}
+        # Trigrams of every indexed term, for typo-tolerant lookups
+        self._vocabulary = TrigramVocabulary(settings.KB_FUZZY_SIMILARITY)
+        self._total_length = 0.0
+        self.version = time.time_ns()
+        self.loaded = False
+        self.revision: Optional[int] = None  # DB KB revision the index was built from
+        self._revision_checked_at = 0.0
+
+    # Maintenance -------------------------------------------------------------
+
+    def _field_tokens(self, article: KnowledgeArticle) -> Dict[str, List[str]]:
+        return {
+            "title": tokenize(article.title or ""),
+            "tags": tokenize(" ".join(article.tags or [])),
+            "keywords": tokenize(" ".join(article.keywords or [])),
+            "summary": tokenize(article.summary or ""),
+            "content": tokenize(article.content or ""),
+        }
+
+    def upsert(self, article: KnowledgeArticle):
+        """Add or refresh an article; inactive articles are removed"""
+        if not article.is_active:
+            self.remove(article.id)
+            return
+
+        term_weights: Counter = Counter()
+        for field, tokens in self._field_tokens(article).items():
+            weight = FIELD_WEIGHTS[field]
+            for token in tokens:
+                term_weights[token] += weight
+
+        with self._lock:
+            self._remove_locked(article.id)
+            length = sum(term_weights.values())
+            self._documents[article.id] = {
+                "id": article.id,
+                "title": article.title,
+                "summary": article.summary,
+                "content": article.content,
+                "category": article.category.value if article.category else None,
+                "tags": article.tags or [],
+                "keywords": article.keywords or [],
+                "view_count": article.view_count or 0,
+                "helpful_count": article.helpful_count or 0,
+                "length": length,
+                "terms": term_weights,
+            }
+            for term, weight in term_weights.items():
+                if term not in self._postings:
+                    self._postings[term] = {}
+                    self._vocabulary.add(term)
+                self._postings[term][article.id] = weight
+            self._total_length += length
+            self.version += 1
+
+    def remove(self, article_id: int):
+        with self._lock:
+            if self._remove_locked(article_id):
+                self.version += 1
+
+    def _remove_locked(self, article_id: int) -> bool:
+        document = self._documents.pop(article_id, None)
+        if document is None:
+            return False
+
+        for term in document["terms"]:
+            postings = self._postings.get(term)
+            if postings:
+                postings.pop(article_id, None)
+                if not postings:
+                    del self._postings[term]
+                    self._vocabulary.discard(term)
+        self._total_length -= document["length"]
+        return True
+
+    def rebuild(self, db: Session, batch_size: int = 500):
+        """Rebuild the whole index from active articles"""
+        from ..services.kb_service import get_kb_revision
+
+        # Read first: an edit committed while loading leaves the index looking stale
+        revision = get_kb_revision(db)
+        articles = db.query(KnowledgeArticle).filter(
+            KnowledgeArticle.is_active == True
+        ).yield_per(batch_size)
+
+        with self._lock:
+            self._documents.clear()
+            self._postings.clear()
+            self._vocabulary.clear()
+            self._total_length = 0.0
+            for article in articles:
+                self.upsert(article)
+            self.loaded = True
+            self.revision = revision
+            self.version += 1
+
+        logger.info(f"KB search index built with {len(self._documents)} articles")
+
+    def warm_up(self):
+        """Build the index with a dedicated session (run off the event loop)"""
+        db = SessionLocal()
+        try:
+            self.rebuild(db)
+        except Exception as e:
+            logger.error(f"Failed to build KB search index: {e}")
+        finally:
+            db.close()
+
+    def ensure_loaded(self, db: Optional[Session] = None):
+        """
+        Build the index on first use, or rebuild it after another worker edited the KB
+
+        The DB revision is read at most every KB_REVISION_CHECK_INTERVAL
+        seconds; without `db` a session is opened only for that check.
+        """
+        now = time.monotonic()
+        if self.loaded and now - self._revision_checked_at < settings.KB_REVISION_CHECK_INTERVAL:
+            return
+        self._revision_checked_at = now
+
+        from ..services.kb_service import get_kb_revision
+
+        session = db or SessionLocal()
+        try:
+            if not self.loaded or get_kb_revision(session) != self.revision:
+                self.rebuild(session)
+        finally:
+            if db is None:
+                session.close()
+
+    # Querying ----------------------------------------------------------------
+
+    def _idf(self, term: str) -> float:
+        df = len(self._postings.get(term, ()))
+        n = len(self._documents)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(
+        self,
+        text: str,
+        limit: int = 5,
+        category: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Rank articles for free text
+
+        Each result carries `score` (BM25) and `confidence`, the share of the
+        query's most distinctive terms the article covers. Query terms are
+        weighted by how distinctive they are across tickets, so filler words
+        users always write ("need", "working") count for little.
+        """
+        with self._lock:
+            if not self._documents:
+                return []
+
+            query_terms = set(tokenize(text))
+            if not query_terms:
+                return []
+
+            # Long ticket descriptions are dominated by noise; keep the rarest terms
+            weights = {term: ticket_term_stats.idf(term) for term in query_terms}
+            ranked_terms = sorted(query_terms, key=lambda term: (-weights[term], term))[:self.max_query_terms]
+            idf = {term: self._idf(term) for term in ranked_terms}
+            total_weight = sum(weights[term] for term in ranked_terms) or 1.0
+            avg_length = self._total_length / len(self._documents)
+
+            scores: Dict[int, float] = {}
+            covered: Dict[int, float] = {}
+            for term in ranked_terms:
+                for article_id, tf in self._postings.get(term, {}).items():
+                    length = self._documents[article_id]["length"]
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                    scores[article_id] = scores.get(article_id, 0.0) + idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+                    covered[article_id] = covered.get(article_id, 0.0) + weights[term]
+
+            results = []
+            for article_id, score in scores.items():
+                document = self._documents[article_id]
+                if category and document["category"] != category:
+                    continue
+                results.append({
+                    "id": article_id,
+                    "title": document["title"],
+                    "summary": document["summary"],
+                    "category": document["category"],
+                    "tags": document["tags"],
+                    "view_count": document["view_count"],
+                    "helpful_count": document["helpful_count"],
+                    "score": round(score, 4),
+                    "confidence": round(min(1.0, covered[article_id] / total_weight), 4),
+                })
+
+        results.sort(key=lambda result: (result["score"], result["helpful_count"]), reverse=True)
+        return results[:limit]
+
+    def fuzzy_search(
+        self,
+        text: str,
+        limit: int = 5,
+        category: Optional[str] = None,
+        exclude: Collection[int] = ()
+    ) -> List[Dict]:
+        """
+        Rank articles for text that may be misspelled
+
+        Query terms missing from the index are replaced by their closest
+        indexed terms by trigram similarity ("pasword" -> "password"), then
+        ranked like `search`. Articles in `exclude` are skipped.
+        """
+        with self._lock:
+            terms = []
+            for term in set(tokenize(text)):
+                if term in self._postings:
+                    terms.append(term)
+                else:
+                    terms.extend(similar for similar, _ in self._vocabulary.similar(term, limit=2))
+
+        if not terms:
+            return []
+
+        results = self.search(" ".join(terms), limit + len(exclude), category)
+        return [result for result in results if result["id"] not in exclude][:limit]
+
+    def get_document(self, article_id: int) -> Optional[Dict]:
+        with self._lock:
+            document = self._documents.get(article_id)
+            return dict(document) if document else None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "articles": len(self._documents),
+                "terms": len(self._postings),
+                "trigrams": self._vocabulary.trigram_count,
+                "version": self.version,
+                "revision": self.revision,
+                "loaded": self.loaded,
+            }
+
+
+# Global instance
+kb_search_index = KBSearchIndex()
@@ -0,0 +1,177 @@
+"""
+Time-decayed popularity score for knowledge base articles
+Materialized on KnowledgeArticle by a periodic batch job so the popular list is an index read
+"""
+import asyncio
+import logging
+import math
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, func, select
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.ticket_models import KnowledgeArticle
+from ..services.kb_cache_service import kb_response_cache
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 86400
+
+
+class KBPopularityService:
+    """
+    Periodically recomputes KnowledgeArticle.popularity_score
+
+    score = decayed views x smoothed helpful ratio
+
+    Views decay exponentially with a half-life of KB_POPULARITY_HALF_LIFE_DAYS:
+    each refresh scales the running total by the decay since the previous
+    refresh and adds the views counted since then, so no view history is
+    needed. The helpful ratio is a Bayesian average pulled towards the
+    KB-wide ratio by KB_POPULARITY_PRIOR_WEIGHT pseudo-ratings, so one or two
+    votes cannot make or break an article.
+    """
+
+    def __init__(self, batch_size: int = 500):
+        self.batch_size = batch_size
+        self.running = False
+        self._task = None
+        self.last_refresh: Optional[datetime] = None
+        self.last_duration_ms = 0.0
+        self.last_updated = 0
+
+    def score(self, decayed_views: float, helpful: int, not_helpful: int, prior_mean: float) -> float:
+        weight = settings.KB_POPULARITY_PRIOR_WEIGHT
+        rating = (helpful + prior_mean * weight) / (helpful + not_helpful + weight)
+        return decayed_views * rating
+
+    def refresh(self, db: Session, now: Optional[datetime] = None) -> int:
+        """
+        Recompute every article's score in id-ordered batches
+
+        Returns the number of articles updated.
+        """
+        started = time.perf_counter()
+        now = now or datetime.utcnow()
+        table = KnowledgeArticle.__table__
+        decay_rate = math.log(2) / (settings.KB_POPULARITY_HALF_LIFE_DAYS * SECONDS_PER_DAY)
+
+        helpful_total, not_helpful_total = db.execute(select(
+            func.coalesce(func.sum(table.c.helpful_count), 0),
+            func.coalesce(func.sum(table.c.not_helpful_count), 0)
+        )).one()
+        votes = helpful_total + not_helpful_total
+        prior_mean = helpful_total / votes if votes else 0.5
+
+        statement = table.update().where(table.c.id == bindparam("article_id")).values(
+            popularity_score=bindparam("popularity_score"),
+            decayed_views=bindparam("decayed_views"),
+            popularity_views_seen=bindparam("popularity_views_seen"),
+            popularity_updated_at=bindparam("popularity_updated_at"),
+        )
+
+        updated = 0
+        last_id = 0
+        while True:
+            rows = db.execute(
+                select(
+                    table.c.id,
+                    table.c.view_count,
+                    table.c.helpful_count,
+                    table.c.not_helpful_count,
+                    table.c.decayed_views,
+                    table.c.popularity_views_seen,
+                    table.c.popularity_updated_at,
+                ).where(table.c.id > last_id).order_by(table.c.id).limit(self.batch_size)
+            ).all()
+            if not rows:
+                break
+
+            params = []
+            for row in rows:
+                views = row.view_count or 0
+                decayed = row.decayed_views or 0.0
+                if row.popularity_updated_at is not None:
+                    elapsed = max(0.0, (now - row.popularity_updated_at).total_seconds())
+                    decayed *= math.exp(-decay_rate * elapsed)
+                # Counters can go down on re-import; never add negative views
+                decayed += max(0, views - (row.popularity_views_seen or 0))
+
+                params.append({
+                    "article_id": row.id,
+                    "popularity_score": round(self.score(
+                        decayed, row.helpful_count or 0, row.not_helpful_count or 0, prior_mean
+                    ), 6),
+                    "decayed_views": decayed,
+                    "popularity_views_seen": views,
+                    "popularity_updated_at": now,
+                })
+
+            db.execute(statement, params)
+            db.commit()
+            updated += len(params)
+            last_id = rows[-1].id
+
+        # Ordering of popular and search responses may have changed, here and in other workers
+        from ..services.kb_service import bump_kb_revision
+
+        bump_kb_revision(db)
+        db.commit()
+        kb_response_cache.clear()
+
+        self.last_refresh = now
+        self.last_duration_ms = round((time.perf_counter() - started) * 1000, 1)
+        self.last_updated = updated
+        logger.info(f"Refreshed KB popularity for {updated} articles in {self.last_duration_ms} ms")
+        return updated
+
+    def run_refresh(self) -> int:
+        """Refresh with a dedicated session (run off the event loop)"""
+        db = SessionLocal()
+        try:
+            return self.refresh(db)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"KB popularity refresh failed: {e}")
+            return 0
+        finally:
+            db.close()
+
+    async def start_background_tasks(self):
+        """Refresh now, then every KB_POPULARITY_REFRESH_INTERVAL seconds (leader job, see main.py)"""
+        if self.running:
+            return
+
+        self.running = True
+        self._task = asyncio.create_task(self._refresh_periodically())
+
+    async def _refresh_periodically(self):
+        while self.running:
+            try:
+                await asyncio.to_thread(self.run_refresh)
+            except Exception as e:
+                logger.error(f"Error in KB popularity refresh: {e}")
+            await asyncio.sleep(settings.KB_POPULARITY_REFRESH_INTERVAL)
+
+    async def stop(self):
+        self.running = False
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            "last_refresh": self.last_refresh.isoformat() if self.last_refresh else None,
+            "last_duration_ms": self.last_duration_ms,
+            "articles_updated": self.last_updated,
+            "half_life_days": settings.KB_POPULARITY_HALF_LIFE_DAYS,
+            "refresh_interval_seconds": settings.KB_POPULARITY_REFRESH_INTERVAL,
+        }
+
+
+# Global instance
+kb_popularity_service = KBPopularityService()
@@ -2,14 +2,49 @@
 Knowledge Base service for self-service articles and AI suggestions
 """
 import logging
+from datetime import datetime
 from typing import List, Dict, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, or_
-from ..models.ticket_models import KnowledgeArticle, KBSuggestion, Ticket, TicketCategory
+from sqlalchemy import func, desc, or_, literal, text, update
+from sqlalchemy.exc import IntegrityError
+from ..config import settings
+from ..models.ticket_models import KnowledgeArticle, KBRevision, KBSuggestion, Ticket, TicketCategory
 from ..services.classification_service import classification_service
+from ..services.kb_counter_service import kb_counter_buffer
+from ..services.kb_cache_service import kb_response_cache
+from ..services.kb_index_service import kb_search_index
+from ..services.kb_autocomplete_service import kb_autocomplete_index
+from ..services.text_analysis import ticket_term_stats
 
 logger = logging.getLogger(__name__)
 
+# Ticket.custom_fields key holding precomputed article suggestions
+TICKET_SUGGESTIONS_FIELD = "kb_suggestions"
+
+KB_REVISION_ID = 1
+
+
+def bump_kb_revision(db: Session):
+    """Mark the KB as changed in the caller's transaction (commit afterwards)"""
+    result = db.execute(
+        update(KBRevision).where(KBRevision.id == KB_REVISION_ID).values(revision=KBRevision.revision + 1)
+    )
+    if result.rowcount:
+        return
+    try:
+        with db.begin_nested():
+            db.add(KBRevision(id=KB_REVISION_ID, revision=1))
+    except IntegrityError:
+        # Another worker created the row first
+        db.execute(
+            update(KBRevision).where(KBRevision.id == KB_REVISION_ID).values(revision=KBRevision.revision + 1)
+        )
+
+
+def get_kb_revision(db: Session) -> int:
+    """KB revision as committed by any worker"""
+    return db.query(KBRevision.revision).filter(KBRevision.id == KB_REVISION_ID).scalar() or 0
+
 class KnowledgeBaseService:
     """
     Knowledge Base management and article recommendations
@@ -28,6 +63,11 @@ class KnowledgeBaseService:
         """
         Search knowledge base articles by query and category
         """
+        revision = kb_response_cache.revision(db)
+        cached = kb_response_cache.get_search(revision, query, category, limit)
+        if cached is not None:
+            return cached
+
         # Simple text search - in production, use full-text search
         search_term = f"%{query.lower()}%"
 
@@ -43,24 +83,123 @@ class KnowledgeBaseService:
         if category:
             q = q.filter(KnowledgeArticle.category == category)
 
-        articles = q.order_by(
-            KnowledgeArticle.view_count.desc(),
-            KnowledgeArticle.helpful_count.desc()
-        ).limit(limit).all()
+        articles = q.order_by(KnowledgeArticle.popularity_score.desc().nullslast()).limit(limit).all()
 
-        return [
-            {
-                "id": article.id,
-                "title": article.title,
-                "summary": article.summary,
-                "category": article.category.value if article.category else None,
-                "tags": article.tags,
-                "view_count": article.view_count,
-                "helpful_count": article.helpful_count,
-                "created_at": article.created_at.isoformat() if article.created_at else None
-            }
-            for article in articles
-        ]
+        results = [self._serialize_summary(article) for article in articles]
+
+        # Too few exact hits: the query may be misspelled, add close matches
+        if len(results) < min(limit, settings.KB_FUZZY_MIN_RESULTS):
+            results += self._fuzzy_search(
+                db, query, category, limit - len(results), exclude={result["id"] for result in results}
+            )
+
+        kb_response_cache.set_search(revision, query, category, limit, results)
+        return results
+
+    def _fuzzy_search(
+        self,
+        db: Session,
+        query: str,
+        category: Optional[str],
+        limit: int,
+        exclude: set
+    ) -> List[Dict]:
+        """
+        Typo-tolerant matches: pg_trgm word similarity on PostgreSQL, the
+        in-memory trigram vocabulary everywhere else
+        """
+        article_ids = None
+        if db.bind.dialect.name == "postgresql":
+            try:
+                article_ids = self._trigram_article_ids(db, query, category, limit, exclude)
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"pg_trgm search failed, using in-memory trigram index: {e}")
+
+        if article_ids is None:
+            kb_search_index.ensure_loaded(db)
+            article_ids = [
+                result["id"]
+                for result in kb_search_index.fuzzy_search(query, limit, category, exclude)
+            ]
+
+        if not article_ids:
+            return []
+
+        articles = {
+            article.id: article
+            for article in db.query(KnowledgeArticle).filter(KnowledgeArticle.id.in_(article_ids)).all()
+        }
+        results = []
+        for article_id in article_ids:
+            if article_id in articles:
+                result = self._serialize_summary(articles[article_id])
+                result["match_type"] = "fuzzy"
+                results.append(result)
+        return results
+
+    def _trigram_article_ids(
+        self,
+        db: Session,
+        query: str,
+        category: Optional[str],
+        limit: int,
+        exclude: set
+    ) -> List[int]:
+        """Rank by pg_trgm word_similarity; `<%` is served by the GIN trigram indexes"""
+        db.execute(
+            text("SELECT set_config('pg_trgm.word_similarity_threshold', :threshold, true)"),
+            {"threshold": str(settings.KB_FUZZY_SIMILARITY)}
+        )
+        search_term = literal(query)
+        similarity = func.greatest(
+            func.word_similarity(search_term, KnowledgeArticle.title),
+            func.coalesce(func.word_similarity(search_term, KnowledgeArticle.summary), 0)
+        )
+
+        q = db.query(KnowledgeArticle.id).filter(
+            KnowledgeArticle.is_active == True,
+            or_(
+                search_term.op("<%")(KnowledgeArticle.title),
+                search_term.op("<%")(KnowledgeArticle.summary)
+            )
+        )
+        if category:
+            q = q.filter(KnowledgeArticle.category == category)
+        if exclude:
+            q = q.filter(KnowledgeArticle.id.notin_(exclude))
+
+        return [row.id for row in q.order_by(similarity.desc()).limit(limit).all()]
+
+    def _serialize_summary(self, article: KnowledgeArticle) -> Dict:
+        return {
+            "id": article.id,
+            "title": article.title,
+            "summary": article.summary,
+            "category": article.category.value if article.category else None,
+            "tags": article.tags,
+            "view_count": article.view_count,
+            "helpful_count": article.helpful_count,
+            "popularity_score": article.popularity_score or 0.0,
+            "created_at": article.created_at.isoformat() if article.created_at else None
+        }
+
+    def _on_article_changed(self, article: KnowledgeArticle, deactivated: bool = False):
+        """Update the in-memory indexes and drop cached responses the change can affect"""
+        if deactivated:
+            kb_search_index.remove(article.id)
+            kb_autocomplete_index.remove(article.id)
+            kb_response_cache.invalidate_article(article.id)
+            return
+
+        kb_search_index.upsert(article)
+        kb_autocomplete_index.upsert(article)
+
+        kb_response_cache.invalidate_article(
+            article.id,
+            searchable_text=" ".join(filter(None, [article.title, article.content, article.summary])),
+            rank=article.popularity_score or 0.0
+        )
 
     def get_article_by_id(self, db: Session, article_id: int) -> Optional[Dict]:
         """
@@ -74,9 +213,9 @@ class KnowledgeBaseService:
         if not article:
             return None
 
-        # Increment view count
-        article.view_count += 1
-        db.commit()
+        # Buffer the view; counters are flushed to the DB in batches
+        kb_counter_buffer.record_view(article.id)
+        pending = kb_counter_buffer.pending_for(article.id)
 
         return {
             "id": article.id,
@@ -86,9 +225,9 @@ class KnowledgeBaseService:
             "category": article.category.value if article.category else None,
             "tags": article.tags,
             "keywords": article.keywords,
-            "view_count": article.view_count,
-            "helpful_count": article.helpful_count,
-            "not_helpful_count": article.not_helpful_count,
+            "view_count": (article.view_count or 0) + pending["view_count"],
+            "helpful_count": (article.helpful_count or 0) + pending["helpful_count"],
+            "not_helpful_count": (article.not_helpful_count or 0) + pending["not_helpful_count"],
             "resolution_count": article.resolution_count,
             "created_at": article.created_at.isoformat() if article.created_at else None,
             "updated_at": article.updated_at.isoformat() if article.updated_at else None
@@ -98,19 +237,14 @@ class KnowledgeBaseService:
         """
         Rate article as helpful or not helpful
         """
-        article = db.query(KnowledgeArticle).filter(
+        exists = db.query(KnowledgeArticle.id).filter(
             KnowledgeArticle.id == article_id
         ).first()
 
-        if not article:
+        if not exists:
             return False
 
-        if helpful:
-            article.helpful_count += 1
-        else:
-            article.not_helpful_count += 1
-
-        db.commit()
+        kb_counter_buffer.record_rating(article_id, helpful)
         return True
 
     def suggest_articles_for_ticket(
@@ -156,6 +290,44 @@ class KnowledgeBaseService:
 
         return relevant_articles[:3]  # Return top 3
 
+    def precompute_ticket_suggestions(self, db: Session, ticket: Ticket) -> List[Dict]:
+        """
+        Compute suggestions for a ticket and store them in its custom_fields
+        together with the KB revision they were computed against
+        """
+        kb_search_index.ensure_loaded(db)
+        # Read before searching: a concurrent KB edit then makes these stale, not current
+        revision = get_kb_revision(db)
+
+        suggestions = self.suggest_articles_for_ticket(
+            db,
+            ticket.title,
+            ticket.description or "",
+            ticket.category.value if ticket.category else None
+        )
+
+        custom_fields = dict(ticket.custom_fields or {})
+        custom_fields[TICKET_SUGGESTIONS_FIELD] = {
+            "kb_revision": revision,
+            "computed_at": datetime.utcnow().isoformat(),
+            "articles": suggestions,
+        }
+        ticket.custom_fields = custom_fields
+        db.commit()
+        return suggestions
+
+    def get_ticket_suggestions(self, db: Session, ticket: Ticket) -> List[Dict]:
+        """
+        Stored suggestions for a ticket, recomputed only when the KB changed
+        since they were computed
+        """
+        kb_search_index.ensure_loaded(db)
+        stored = (ticket.custom_fields or {}).get(TICKET_SUGGESTIONS_FIELD)
+        if stored and stored.get("kb_revision") == get_kb_revision(db):
+            return stored["articles"]
+
+        return self.precompute_ticket_suggestions(db, ticket)
+
     def create_article_from_ticket_pattern(
         self,
         db: Session,
@@ -177,35 +349,40 @@ class KnowledgeBaseService:
 
         # Generate content from ticket patterns
         content_parts = []
-        keywords = set()
 
         for ticket in tickets:
             content_parts.append(f"**Issue:** {ticket.title}")
             content_parts.append(f"**Description:** {ticket.description}")
             content_parts.append("")
 
-            # Extract keywords from title and description
-            text = f"{ticket.title} {ticket.description}".lower()
-            # Simple keyword extraction - in production, use NLP
-            words = text.split()
-            keywords.update([word for word in words if len(word) > 3])
-
         content = "\n".join(content_parts)
-        keywords_list = list(keywords)[:10]  # Limit to 10 keywords
+
+        # Rank terms by TF-IDF against the ticket corpus
+        keywords_list = ticket_term_stats.keywords_for(
+            (f"{ticket.title} {ticket.description or ''}" for ticket in tickets),
+            limit=10
+        )
+
+        try:
+            category_enum = TicketCategory(category.lower())
+        except ValueError:
+            category_enum = None
 
         # Create article
         article = KnowledgeArticle(
             title=suggested_title,
             content=content,
             summary=f"Common solutions for {suggested_title.lower()}",
-            category=category,
+            category=category_enum,
             keywords=keywords_list,
             tags=[category.lower(), "auto-generated"]
         )
 
         db.add(article)
+        bump_kb_revision(db)
         db.commit()
         db.refresh(article)
+        self._on_article_changed(article)
 
         logger.info(f"Created KB article '{suggested_title}' from {len(ticket_ids)} tickets")
         return article.id
@@ -213,60 +390,48 @@ class KnowledgeBaseService:
     def analyze_ticket_patterns(self, db: Session) -> List[Dict]:
         """
         Analyze ticket patterns to suggest new KB articles
+
+        Returns the pending KBSuggestion rows the leader records for frequent
+        near-duplicate clusters from the last 30 days (see
+        ticket_clustering_service.start_suggestion_sync).
         """
-        # Find frequent ticket patterns (simplified version)
-        # Group tickets by similar titles/categories
-
-        patterns = db.query(
-            Ticket.category,
-            func.count(Ticket.id).label('count'),
-            func.group_concat(Ticket.title).label('titles')
-        ).filter(
-            Ticket.created_at >= func.date('now', '-30 days'),  # Last 30 days
-            Ticket.category.isnot(None)
-        ).group_by(
-            Ticket.category
-        ).having(
-            func.count(Ticket.id) >= 5  # At least 5 tickets per pattern
-        ).all()
-
-        suggestions = []
-        for category, count, titles in patterns:
-            if count >= 5:  # Only suggest for patterns with 5+ tickets
-                suggestion = {
-                    "category": category.value,
-                    "frequency": count,
-                    "suggested_title": f"Common {category.value} Issues",
-                    "reason": f"{count} tickets in {category.value} category suggest need for KB article"
-                }
-                suggestions.append(suggestion)
+        suggestions = db.query(KBSuggestion).filter(
+            KBSuggestion.status == "pending",
+            KBSuggestion.suggested_by == "system"
+        ).order_by(KBSuggestion.frequency_count.desc()).all()
 
-        return suggestions
+        return [
+            {
+                "suggestion_id": suggestion.id,
+                "category": suggestion.category.value if suggestion.category else None,
+                "frequency": suggestion.frequency_count,
+                "suggested_title": suggestion.suggested_title,
+                "sample_ticket_ids": suggestion.sample_ticket_ids,
+                "keywords": suggestion.keywords,
+                "reason": f"{suggestion.frequency_count} similar tickets in the last 30 days suggest need for KB article"
+            }
+            for suggestion in suggestions
+        ]
 
     def get_popular_articles(self, db: Session, limit: int = 10) -> List[Dict]:
         """
-        Get most popular/viewed KB articles
+        Get the most popular KB articles by time-decayed popularity score
+
+        Scores are maintained by kb_popularity_service; articles it has not
+        scored yet come last.
         """
+        revision = kb_response_cache.revision(db)
+        cached = kb_response_cache.get_popular(revision, limit)
+        if cached is not None:
+            return cached
+
         articles = db.query(KnowledgeArticle).filter(
             KnowledgeArticle.is_active == True
-        ).order_by(
-            KnowledgeArticle.view_count.desc(),
-            KnowledgeArticle.helpful_count.desc()
-        ).limit(limit).all()
+        ).order_by(KnowledgeArticle.popularity_score.desc().nullslast()).limit(limit).all()
 
-        return [
-            {
-                "id": article.id,
-                "title": article.title,
-                "summary": article.summary,
-                "category": article.category.value if article.category else None,
-                "tags": article.tags,
-                "view_count": article.view_count,
-                "helpful_count": article.helpful_count,
-                "created_at": article.created_at.isoformat() if article.created_at else None
-            }
-            for article in articles
-        ]
+        results = [self._serialize_summary(article) for article in articles]
+        kb_response_cache.set_popular(revision, limit, results)
+        return results
 
     def create_article(
         self,
@@ -307,11 +472,74 @@ class KnowledgeBaseService:
         )
 
         db.add(article)
+        bump_kb_revision(db)
         db.commit()
         db.refresh(article)
+        self._on_article_changed(article)
 
         logger.info(f"Created KB article '{title}' manually")
         return article.id
 
+    def update_article(
+        self,
+        db: Session,
+        article_id: int,
+        title: Optional[str] = None,
+        content: Optional[str] = None,
+        summary: Optional[str] = None,
+        category: Optional[str] = None,
+        tags: Optional[List[str]] = None
+    ) -> bool:
+        """
+        Edit an existing knowledge base article
+        """
+        article = db.query(KnowledgeArticle).filter(
+            KnowledgeArticle.id == article_id
+        ).first()
+
+        if not article:
+            return False
+
+        if title is not None:
+            article.title = title
+        if content is not None:
+            article.content = content
+        if summary is not None:
+            article.summary = summary
+        if category is not None:
+            try:
+                article.category = TicketCategory(category)
+            except ValueError:
+                article.category = None
+        if tags is not None:
+            article.tags = tags
+
+        bump_kb_revision(db)
+        db.commit()
+        db.refresh(article)
+        self._on_article_changed(article)
+
+        logger.info(f"Updated KB article {article_id}")
+        return True
+
+    def deactivate_article(self, db: Session, article_id: int) -> bool:
+        """
+        Deactivate an article so it no longer appears in search or popular lists
+        """
+        article = db.query(KnowledgeArticle).filter(
+            KnowledgeArticle.id == article_id
+        ).first()
+
+        if not article:
+            return False
+
+        article.is_active = False
+        bump_kb_revision(db)
+        db.commit()
+        self._on_article_changed(article, deactivated=True)
+
+        logger.info(f"Deactivated KB article {article_id}")
+        return True
+
 # Global instance
 kb_service = KnowledgeBaseService()
\ No newline at end of file
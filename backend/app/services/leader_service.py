@@ -0,0 +1,243 @@
+"""
+Leader election for singleton background jobs
+With several uvicorn / gunicorn workers only one of them runs the schedulers
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, or_, text, update
+from sqlalchemy.exc import IntegrityError
+
+from ..config import settings
+from ..database import SessionLocal, engine
+from ..models.ticket_models import LeaderLease
+
+logger = logging.getLogger(__name__)
+
+JobCallback = Callable[[], Awaitable[None]]
+
+
+def advisory_lock_key(name: str) -> int:
+    """Stable signed 64-bit key for pg_try_advisory_lock"""
+    return int.from_bytes(hashlib.sha1(name.encode()).digest()[:8], "big", signed=True)
+
+
+class LeaderElection:
+    """
+    Elects one process to run the registered background jobs
+
+    PostgreSQL: a session-level advisory lock held on a dedicated
+    connection. The server releases it as soon as that connection drops, so
+    a dead worker's lock is free for the next heartbeat of another worker.
+
+    Other databases: a row in leader_leases holding the leader's id and a
+    lease expiry. The leader renews it every LEADER_HEARTBEAT_INTERVAL;
+    another process takes over once LEADER_LEASE_TTL passes without renewal.
+
+    Jobs are started through their `on_elected` callbacks when this process
+    wins and stopped through `on_demoted` when it loses the lock or lease.
+    """
+
+    def __init__(self, name: str = "background-jobs"):
+        self.name = name
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self.running = False
+        self._jobs: List[Tuple[str, JobCallback, JobCallback]] = []
+        self._task = None
+        self._connection = None  # PostgreSQL connection holding the advisory lock
+        self._lease_expires_at: Optional[datetime] = None
+        self.elected_at: Optional[datetime] = None
+        self.elections = 0
+
+    @property
+    def backend(self) -> str:
+        return "advisory_lock" if engine.dialect.name == "postgresql" else "lease"
+
+    def register(self, name: str, on_elected: JobCallback, on_demoted: JobCallback):
+        self._jobs.append((name, on_elected, on_demoted))
+
+    # PostgreSQL advisory lock ------------------------------------------------
+
+    def _try_advisory_lock(self) -> bool:
+        if self._connection is not None:
+            try:
+                self._connection.execute(text("SELECT 1"))
+                return True
+            except Exception as e:
+                logger.warning(f"Lost leader connection: {e}")
+                self._close_connection()
+                return False
+
+        connection = engine.connect()
+        try:
+            acquired = connection.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": advisory_lock_key(self.name)}
+            ).scalar()
+            connection.commit()
+        except Exception:
+            connection.close()
+            raise
+        if not acquired:
+            connection.close()
+            return False
+        self._connection = connection
+        return True
+
+    def _close_connection(self):
+        if self._connection is None:
+            return
+        try:
+            self._connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": advisory_lock_key(self.name)})
+            self._connection.commit()
+        except Exception:
+            pass
+        try:
+            self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
+
+    # Lease row ---------------------------------------------------------------
+
+    def _try_lease(self) -> bool:
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=settings.LEADER_LEASE_TTL)
+        table = LeaderLease.__table__
+
+        db = SessionLocal()
+        try:
+            # Renew our own lease or take over an expired one in one statement
+            result = db.execute(
+                update(table).where(and_(
+                    table.c.name == self.name,
+                    or_(table.c.holder == self.holder, table.c.expires_at < now)
+                )).values(holder=self.holder, expires_at=expires_at, heartbeat_at=now)
+            )
+            if result.rowcount == 0:
+                if db.get(LeaderLease, self.name) is not None:
+                    db.rollback()
+                    return False
+                db.add(LeaderLease(
+                    name=self.name, holder=self.holder, expires_at=expires_at,
+                    acquired_at=now, heartbeat_at=now
+                ))
+            db.commit()
+        except IntegrityError:
+            # Another process created the lease first
+            db.rollback()
+            return False
+        finally:
+            db.close()
+
+        self._lease_expires_at = expires_at
+        return True
+
+    def _release_lease(self):
+        table = LeaderLease.__table__
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(table).where(and_(table.c.name == self.name, table.c.holder == self.holder))
+                .values(expires_at=datetime.utcnow())
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    # Election loop -----------------------------------------------------------
+
+    def _acquire(self) -> bool:
+        if self.backend == "advisory_lock":
+            return self._try_advisory_lock()
+        return self._try_lease()
+
+    async def start(self):
+        if self.running:
+            return
+
+        self.running = True
+        if not settings.LEADER_ELECTION_ENABLED:
+            # Single-process deployments: always lead
+            await self._elected()
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while self.running:
+            try:
+                holding = await asyncio.to_thread(self._acquire)
+            except Exception as e:
+                logger.error(f"Leader election heartbeat failed: {e}")
+                # Keep leading only while our lease is certainly still ours
+                holding = (
+                    self.is_leader and self.backend == "lease"
+                    and self._lease_expires_at is not None and datetime.utcnow() < self._lease_expires_at
+                )
+
+            if holding and not self.is_leader:
+                await self._elected()
+            elif not holding and self.is_leader:
+                await self._demoted()
+
+            await asyncio.sleep(settings.LEADER_HEARTBEAT_INTERVAL)
+
+    async def _elected(self):
+        self.is_leader = True
+        self.elected_at = datetime.utcnow()
+        self.elections += 1
+        logger.info(f"👑 {self.holder} is now running background jobs ({self.backend})")
+        for name, on_elected, _ in self._jobs:
+            try:
+                await on_elected()
+            except Exception as e:
+                logger.error(f"Failed to start {name}: {e}")
+
+    async def _demoted(self):
+        self.is_leader = False
+        self.elected_at = None
+        logger.warning(f"{self.holder} stopped leading background jobs")
+        for name, _, on_demoted in reversed(self._jobs):
+            try:
+                await on_demoted()
+            except Exception as e:
+                logger.error(f"Failed to stop {name}: {e}")
+
+    async def stop(self):
+        """Stop the jobs and hand leadership over straight away"""
+        self.running = False
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self.is_leader:
+            await self._demoted()
+        if not settings.LEADER_ELECTION_ENABLED:
+            return
+        try:
+            if self.backend == "advisory_lock":
+                await asyncio.to_thread(self._close_connection)
+            else:
+                await asyncio.to_thread(self._release_lease)
+        except Exception as e:
+            logger.warning(f"Failed to release leadership: {e}")
+
+    def stats(self) -> Dict:
+        return {
+            "holder": self.holder,
+            "is_leader": self.is_leader,
+            "backend": self.backend,
+            "enabled": settings.LEADER_ELECTION_ENABLED,
+            "elected_at": self.elected_at.isoformat() if self.elected_at else None,
+            "elections": self.elections,
+            "jobs": [name for name, _, _ in self._jobs],
+        }
+
+
+# Global instance
+leader_election = LeaderElection()
@@ -0,0 +1,136 @@
+"""
+Per-recipient notification coalescing
+During alert storms a team gets one summary email per window instead of one email per ticket
+"""
+import logging
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import and_, func, select, update
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models.ticket_models import OutboxMessage
+from ..services.outbox_service import OUTBOX_PENDING, notification_outbox
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationCoalescer:
+    """
+    Groups team notifications per recipient for NOTIFICATION_COALESCE_WINDOW
+
+    Notifications are outbox rows like any other, added to the caller's
+    transaction, so they are committed with the change (e.g. the SLAAlert
+    ledger) that caused them. Rows for a recipient share a group key and the
+    due time of the first one, which opens the window; when it closes the
+    outbox claims the whole group and sends one summary email listing the
+    affected tickets (see `summary`). A window holding a single notification
+    sends it unchanged.
+
+    Critical notifications skip the window, and a window is made due at
+    once when it holds NOTIFICATION_COALESCE_MAX_ITEMS.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.received = 0
+        self.bypassed = 0
+
+    def add(
+        self,
+        db: Session,
+        recipient: str,
+        label: str,
+        ticket_number: str,
+        title: str,
+        priority: str,
+        kind: str,
+        payload: Dict,
+        critical: bool = False
+    ) -> OutboxMessage:
+        """
+        Queue a notification for `recipient` in the caller's transaction
+
+        `kind` / `payload` describe the standalone email (an email sender
+        method and its arguments), used when the notification is critical or
+        ends up alone in its window. Call `notification_outbox.wake()` after
+        committing.
+        """
+        window = settings.NOTIFICATION_COALESCE_WINDOW
+        message = notification_outbox.enqueue(db, "email", kind, **payload)
+
+        with self._lock:
+            self.received += 1
+            if critical or window <= 0:
+                self.bypassed += 1
+                return message
+
+        now = datetime.utcnow()
+        message.group_key = recipient
+        message.group_item = {
+            "label": label,
+            "ticket_number": ticket_number,
+            "title": title,
+            "priority": priority,
+        }
+        message.next_attempt_at = now + timedelta(seconds=window)
+        db.flush()
+
+        table = OutboxMessage.__table__
+        open_window = and_(table.c.group_key == recipient, table.c.status == OUTBOX_PENDING)
+        closes_at, buffered = db.execute(
+            select(func.min(table.c.next_attempt_at), func.count()).where(open_window)
+        ).one()
+        if buffered >= settings.NOTIFICATION_COALESCE_MAX_ITEMS:
+            closes_at = now
+            db.execute(update(table).where(open_window).values(next_attempt_at=now))
+        message.next_attempt_at = closes_at
+        return message
+
+    @staticmethod
+    def summary(items: List[Dict]):
+        """Subject and body listing every ticket in the window, grouped by notification type"""
+        counts = Counter(item["label"] for item in items)
+        subject = f"🔔 {len(items)} ticket notifications: " + ", ".join(
+            f"{count} {label}" for label, count in counts.most_common()
+        )
+
+        sections = []
+        for label, _ in counts.most_common():
+            lines = [
+                f"• {item['ticket_number']} [{item['priority']}] {item['title']}"
+                for item in items if item["label"] == label
+            ]
+            sections.append(f"{label} ({len(lines)}):\n" + "\n".join(lines))
+
+        body = (
+            "Several notifications for your team were grouped into this email.\n\n"
+            + "\n\n".join(sections)
+            + "\n\nNullTicket Alert System\n"
+        )
+        return subject, body
+
+    def stats(self, db: Session) -> Dict:
+        table = OutboxMessage.__table__
+        open_windows, buffered = db.execute(
+            select(func.count(func.distinct(table.c.group_key)), func.count()).where(
+                and_(table.c.group_key.isnot(None), table.c.status == OUTBOX_PENDING)
+            )
+        ).one()
+        with self._lock:
+            return {
+                "open_windows": open_windows,
+                "buffered": buffered,
+                "received": self.received,
+                "bypassed": self.bypassed,
+                "summaries_sent": notification_outbox.summaries_sent,
+                "emails_saved": notification_outbox.emails_saved,
+                "window_seconds": settings.NOTIFICATION_COALESCE_WINDOW,
+            }
+
+
+# Global instance
+notification_coalescer = NotificationCoalescer()
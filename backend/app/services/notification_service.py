@@ -4,17 +4,27 @@ Notification service for handling alerts and automated notifications
 import asyncio
 import logging
 from datetime import datetime, timedelta
-from typing import List
+from typing import List, Optional, Sequence
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
-
-from ..database import get_db
-from ..models.ticket_models import Ticket, TicketStatus, Team
-from ..services.email_service import email_service
-from ..services.sms_service import sms_service
+from sqlalchemy import and_, or_, case, func
+
+from ..database import SessionLocal
+from ..models.ticket_models import Ticket, TicketStatus, TicketPriority, Team, SLAAlert
+from ..services.outbox_service import notification_outbox
+from ..services.notification_coalescer import notification_coalescer
+from ..services.sla_breach_service import sla_breach_sweeper
+from ..services.sla_scheduler_service import (
+    sla_scheduler,
+    SLA_APPROACHING,
+    SLA_BREACHED,
+    SLA_WARNING_WINDOW,
+)
 
 logger = logging.getLogger(__name__)
 
+# Due tickets checked per query
+SLA_ALERT_BATCH_SIZE = 500
+
 class NotificationService:
     """
     Handles automated notifications for tickets
@@ -22,6 +32,7 @@ class NotificationService:
 
     def __init__(self):
         self.running = False
+        self._digest_task = None
 
     async def start_background_tasks(self):
         """Start background notification tasks"""
@@ -31,81 +42,138 @@ class NotificationService:
         self.running = True
         logger.info("Starting notification background tasks")
 
-        # Start SLA monitoring task
-        asyncio.create_task(self._monitor_sla_alerts())
-
-        # Start daily digest task
-        asyncio.create_task(self._send_daily_digests())
-
-    async def _monitor_sla_alerts(self):
-        """Monitor tickets approaching SLA deadline"""
-        while self.running:
-            try:
-                db = next(get_db())
-                await self._check_sla_alerts(db)
-                db.close()
-            except Exception as e:
-                logger.error(f"Error in SLA monitoring: {e}")
+        # Start SLA deadline scheduler
+        await sla_scheduler.start(self._alert_due_tickets)
 
-            # Check every 15 minutes
-            await asyncio.sleep(900)
+        # Flag overdue tickets as breached and alert on them
+        await sla_breach_sweeper.start(self._alert_due_tickets)
 
-    async def _check_sla_alerts(self, db: Session):
-        """Check for tickets approaching SLA deadline"""
-        # Get tickets within 1 hour of SLA deadline
-        alert_time = datetime.utcnow() + timedelta(hours=1)
+        # Start daily digest task
+        self._digest_task = asyncio.create_task(self._send_daily_digests())
 
-        approaching_tickets = db.query(Ticket).filter(
+    async def stop_background_tasks(self):
+        """Stop the SLA scheduler, breach sweeper and digests (process lost leadership or is exiting)"""
+        self.running = False
+        await sla_scheduler.stop()
+        await sla_breach_sweeper.stop()
+        if self._digest_task:
+            self._digest_task.cancel()
+            self._digest_task = None
+
+    async def _alert_due_tickets(self, ticket_ids: List[int], now: datetime):
+        """Send the alerts the SLA scheduler or breach sweeper found due"""
+        db = SessionLocal()
+        try:
+            for i in range(0, len(ticket_ids), SLA_ALERT_BATCH_SIZE):
+                await self._check_sla_alerts(db, ticket_ids[i:i + SLA_ALERT_BATCH_SIZE], now)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error in SLA alerting: {e}")
+        finally:
+            db.close()
+
+    async def _check_sla_alerts(
+        self,
+        db: Session,
+        ticket_ids: Optional[Sequence[int]] = None,
+        now: Optional[datetime] = None
+    ) -> int:
+        """
+        Alert teams about tickets that approach or breach their SLA deadline
+
+        Each ticket is alerted once per level: the SLAAlert ledger records the
+        level and deadline last alerted, and the query only returns tickets
+        whose state has moved past it (new ticket in the window, approaching
+        -> breached, or a deadline changed by reprioritisation / reopening).
+        `ticket_ids` limits the check to the tickets the scheduler found due.
+        Returns the number of alerts sent.
+        """
+        now = now or datetime.utcnow()
+        alert_time = now + SLA_WARNING_WINDOW
+
+        query = db.query(Ticket, SLAAlert).outerjoin(
+            SLAAlert, SLAAlert.ticket_id == Ticket.id
+        )
+        if ticket_ids is not None:
+            query = query.filter(Ticket.id.in_(ticket_ids))
+        rows = query.filter(
             and_(
                 Ticket.sla_deadline <= alert_time,
-                Ticket.sla_deadline > datetime.utcnow(),
-                Ticket.status.not_in([TicketStatus.RESOLVED, TicketStatus.CLOSED])
+                Ticket.status.not_in([TicketStatus.RESOLVED, TicketStatus.CLOSED]),
+                Ticket.assigned_team_id.isnot(None),
+                or_(
+                    SLAAlert.ticket_id.is_(None),
+                    SLAAlert.sla_deadline != Ticket.sla_deadline,
+                    and_(SLAAlert.level == SLA_APPROACHING, Ticket.sla_deadline <= now)
+                )
             )
         ).all()
-
-        for ticket in approaching_tickets:
-            await self._send_sla_alert(ticket)
-
-        # Get breached tickets
-        breached_tickets = db.query(Ticket).filter(
-            and_(
-                Ticket.sla_deadline <= datetime.utcnow(),
-                Ticket.status.not_in([TicketStatus.RESOLVED, TicketStatus.CLOSED])
+        if not rows:
+            return 0
+
+        team_ids = {ticket.assigned_team_id for ticket, _ in rows}
+        teams = {team.id: team for team in db.query(Team).filter(Team.id.in_(team_ids))}
+
+        sent = 0
+        for ticket, entry in rows:
+            team = teams.get(ticket.assigned_team_id)
+            if not team:
+                continue
+
+            level = SLA_BREACHED if ticket.sla_deadline <= now else SLA_APPROACHING
+            if level == SLA_BREACHED:
+                self._send_sla_breach_alert(db, ticket, team)
+            else:
+                self._send_sla_alert(db, ticket, team)
+            sent += 1
+
+            if entry is None:
+                entry = SLAAlert(ticket_id=ticket.id)
+                db.add(entry)
+            entry.level = level
+            entry.sla_deadline = ticket.sla_deadline
+            entry.sent_at = now
+
+        # Alert emails and SMS are committed with the ledger entries that record them
+        db.commit()
+        notification_outbox.wake()
+        logger.info(f"SLA check sent {sent} alerts")
+        return sent
+
+    def _notify_team(self, db: Session, email: str, ticket: Ticket, label: str, kind: str, **payload):
+        """Team email in the caller's transaction, coalesced per recipient unless the ticket is critical"""
+        notification_coalescer.add(
+            db,
+            email,
+            label=label,
+            ticket_number=ticket.ticket_number,
+            title=ticket.title,
+            priority=ticket.priority.value,
+            kind=kind,
+            payload=payload,
+            critical=ticket.priority == TicketPriority.CRITICAL
+        )
+
+    def _send_sla_alert(self, db: Session, ticket: Ticket, team: Team):
+        """Queue SLA approaching alerts in the caller's transaction"""
+        # Email alert
+        team_email = team.email or "support@nullticket.com"
+        self._notify_team(
+            db, team_email, ticket, "SLA warning", "send_sla_alert",
+            ticket_id=ticket.ticket_number, team_email=team_email
+        )
+
+        # SMS if critical, committed with the alert like the email
+        if ticket.priority.value == "critical" and ticket.requester_phone:
+            notification_outbox.enqueue(
+                db, "sms", "send_sla_breach_alert",
+                to_number=ticket.requester_phone, ticket_id=ticket.ticket_number
             )
-        ).all()
 
-        for ticket in breached_tickets:
-            await self._send_sla_breach_alert(ticket)
-
-    async def _send_sla_alert(self, ticket: Ticket):
-        """Send SLA approaching alert"""
-        # Get team email
-        db_session = next(get_db())
-        team = db_session.query(Team).filter(Team.id == ticket.assigned_team_id).first()
-        db_session.close()
-        
-        if not team:
-            return
-
-        # Send email alert
-        await email_service.send_sla_alert(ticket.ticket_number, team.email or "support@nullticket.com")
-
-        # Send SMS if critical
-        if ticket.priority.value == "critical" and ticket.requester_phone:
-            await sms_service.send_sla_breach_alert(ticket.requester_phone, ticket.ticket_number)
-
-        logger.info(f"SLA alert sent for ticket {ticket.ticket_number}")
-
-    async def _send_sla_breach_alert(self, ticket: Ticket):
-        """Send SLA breach alert"""
-        # Get team email
-        db_session = next(get_db())
-        team = db_session.query(Team).filter(Team.id == ticket.assigned_team_id).first()
-        db_session.close()
-        
-        if not team:
-            return
+        logger.info(f"SLA alert queued for ticket {ticket.ticket_number}")
 
+    def _send_sla_breach_alert(self, db: Session, ticket: Ticket, team: Team):
+        """Queue SLA breach alerts in the caller's transaction"""
         # Send urgent email
         subject = f"🚨 SLA BREACHED: {ticket.ticket_number}"
         body = f"""
@@ -117,13 +185,20 @@ Requester: {ticket.requester_email}
 
 Immediate action required!
 """
-        await email_service.send_email([team.email or "support@nullticket.com"], subject, body)
+        team_email = team.email or "support@nullticket.com"
+        self._notify_team(
+            db, team_email, ticket, "SLA breached", "send_email",
+            to_addresses=[team_email], subject=subject, body=body
+        )
 
-        # Send SMS alert
+        # SMS alert, committed with the alert like the email
         if ticket.requester_phone:
-            await sms_service.send_critical_alert(ticket.requester_phone, ticket.ticket_number)
+            notification_outbox.enqueue(
+                db, "sms", "send_critical_alert",
+                to_number=ticket.requester_phone, ticket_id=ticket.ticket_number
+            )
 
-        logger.warning(f"SLA breach alert sent for ticket {ticket.ticket_number}")
+        logger.warning(f"SLA breach alert queued for ticket {ticket.ticket_number}")
 
     async def _send_daily_digests(self):
         """Send daily team digests"""
@@ -137,61 +212,80 @@ Immediate action required!
             seconds_until_next = (next_run - now).total_seconds()
             await asyncio.sleep(seconds_until_next)
 
+            db = SessionLocal()
             try:
-                db = next(get_db())
-                await self._send_team_digests(db)
-                db.close()
+                self._queue_team_digests(db)
             except Exception as e:
-                logger.error(f"Error sending daily digests: {e}")
-
-    async def _send_team_digests(self, db: Session):
-        """Send daily digest emails to teams"""
-        teams = db.query(Team).all()
-
-        for team in teams:
-            # Get team's tickets from last 24 hours
-            yesterday = datetime.utcnow() - timedelta(days=1)
-
-            new_tickets = db.query(Ticket).filter(
-                and_(
-                    Ticket.assigned_team_id == team.id,
-                    Ticket.created_at >= yesterday
-                )
-            ).count()
-
-            resolved_tickets = db.query(Ticket).filter(
-                and_(
-                    Ticket.assigned_team_id == team.id,
-                    Ticket.status.in_([TicketStatus.RESOLVED, TicketStatus.CLOSED]),
-                    Ticket.resolved_at >= yesterday
-                )
-            ).count()
-
-            pending_tickets = db.query(Ticket).filter(
-                and_(
-                    Ticket.assigned_team_id == team.id,
-                    Ticket.status.not_in([TicketStatus.RESOLVED, TicketStatus.CLOSED])
-                )
-            ).count()
+                db.rollback()
+                logger.error(f"Error queueing daily digests: {e}")
+            finally:
+                db.close()
 
-            if new_tickets > 0 or resolved_tickets > 0:
-                subject = f"Daily Digest - {team.name}"
-                body = f"""
-Daily Team Digest for {team.name}
+    def _team_digest_counts(self, db: Session, since: datetime):
+        """
+        New / resolved / pending counts for every team with an email, in one query
+
+        Only tickets that can count towards one of the three totals are
+        joined, so the scan stays proportional to recent and open work.
+        """
+        closed = Ticket.status.in_([TicketStatus.RESOLVED, TicketStatus.CLOSED])
+        is_new = Ticket.created_at >= since
+        is_resolved = and_(closed, Ticket.resolved_at >= since)
+        is_pending = ~closed
+
+        def count_if(condition):
+            return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+        return db.query(
+            Team.id,
+            Team.name,
+            Team.email,
+            count_if(is_new).label("new_tickets"),
+            count_if(is_resolved).label("resolved_tickets"),
+            count_if(is_pending).label("pending_tickets"),
+        ).join(
+            Ticket, and_(Ticket.assigned_team_id == Team.id, or_(is_new, is_resolved, is_pending))
+        ).filter(
+            Team.email.isnot(None), Team.email != ""
+        ).group_by(Team.id, Team.name, Team.email).all()
+
+    def _queue_team_digests(self, db: Session) -> int:
+        """Queue daily digest emails to teams in the outbox; returns the number queued"""
+        yesterday = datetime.utcnow() - timedelta(days=1)
+        rows = self._team_digest_counts(db, yesterday)
+
+        queued = 0
+        for row in rows:
+            if row.new_tickets == 0 and row.resolved_tickets == 0:
+                continue
+            subject = f"Daily Digest - {row.name}"
+            body = f"""
+Daily Team Digest for {row.name}
 
 📊 Summary (Last 24 hours):
-• New tickets: {new_tickets}
-• Resolved tickets: {resolved_tickets}
-• Pending tickets: {pending_tickets}
+• New tickets: {row.new_tickets}
+• Resolved tickets: {row.resolved_tickets}
+• Pending tickets: {row.pending_tickets}
 
 Keep up the great work!
 NullTicket System
 """
-                if team.email:
-                    await email_service.send_email([team.email], subject, body)
+            notification_outbox.enqueue(
+                db, "email", "send_email", to_addresses=[row.email], subject=subject, body=body
+            )
+            queued += 1
+
+        db.commit()
+        notification_outbox.wake()
+        logger.info(f"Queued {queued} team digests")
+        return queued
+
+    def queue_ticket_assignment(self, db: Session, ticket: Ticket):
+        """Queue the assigned team's notification in the caller's transaction"""
+        team = db.query(Team).filter(Team.id == ticket.assigned_team_id).first()
+        if not team or not team.email:
+            return
 
-    async def notify_ticket_assignment(self, ticket: Ticket, team_name: str):
-        """Send notification when ticket is assigned to team"""
         subject = f"New Ticket Assigned: {ticket.ticket_number}"
         body = f"""
 A new ticket has been assigned to your team.
@@ -204,16 +298,17 @@ Requester: {ticket.requester_email}
 
 Please review and take appropriate action.
 """
-        # Get team email
-        db = next(get_db())
-        team = db.query(Team).filter(Team.id == ticket.assigned_team_id).first()
-        db.close()
+        self._notify_team(
+            db, team.email, ticket, "New ticket assigned", "send_email",
+            to_addresses=[team.email], subject=subject, body=body
+        )
 
-        if team and team.email:
-            await email_service.send_email([team.email], subject, body)
+    def queue_ticket_escalation(self, db: Session, ticket: Ticket, reason: str):
+        """Queue the assigned team's escalation notification in the caller's transaction"""
+        team = db.query(Team).filter(Team.id == ticket.assigned_team_id).first()
+        if not team or not team.email:
+            return
 
-    async def notify_ticket_escalation(self, ticket: Ticket, reason: str):
-        """Send escalation notification"""
         subject = f"🚨 TICKET ESCALATED: {ticket.ticket_number}"
         body = f"""
 TICKET ESCALATION ALERT
@@ -225,32 +320,32 @@ Priority: {ticket.priority.value}
 
 Immediate attention required!
 """
-        # Get team email
-        db = next(get_db())
-        team = db.query(Team).filter(Team.id == ticket.assigned_team_id).first()
-        db.close()
-
-        if team and team.email:
-            await email_service.send_email([team.email], subject, body)
-
-    async def notify_ticket_resolution(self, ticket: Ticket, resolution_message: str):
-        """Send resolution notification to requester"""
-        # Send email notification
+        self._notify_team(
+            db, team.email, ticket, "Escalated", "send_email",
+            to_addresses=[team.email], subject=subject, body=body
+        )
+
+    def queue_ticket_resolution(self, db: Session, ticket: Ticket, resolution_message: str):
+        """Queue resolution notifications to the requester in the caller's transaction"""
+        # Email notification
         if ticket.requester_email:
-            await email_service.send_ticket_resolution(
-                ticket.ticket_number,
-                ticket.requester_email,
-                ticket.title,
-                ticket.category.value if ticket.category else "general",
-                resolution_message
+            notification_outbox.enqueue(
+                db, "email", "send_ticket_resolution",
+                ticket_id=ticket.ticket_number,
+                email=ticket.requester_email,
+                title=ticket.title,
+                category=ticket.category.value if ticket.category else "general",
+                resolution_message=resolution_message
             )
 
-        # Send SMS notification
+        # SMS notification (the sender truncates and formats the message)
         if ticket.requester_phone:
-            sms_message = f"✅ RESOLVED: {ticket.ticket_number} - {resolution_message[:100]}{'...' if len(resolution_message) > 100 else ''}"
-            await sms_service.send_resolution_notification(ticket.requester_phone, ticket.ticket_number, sms_message)
-
-        logger.info(f"Resolution notification sent for ticket {ticket.ticket_number}")
+            notification_outbox.enqueue(
+                db, "sms", "send_resolution_notification",
+                to_number=ticket.requester_phone,
+                ticket_id=ticket.ticket_number,
+                resolution_message=resolution_message
+            )
 
 
 # Global instance
@@ -0,0 +1,358 @@
+"""
+Durable notification outbox
+Emails and SMS are stored with the change that caused them and delivered by a bounded worker pool
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, func, select, update
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.ticket_models import OutboxMessage
+from ..services.email_service import email_service
+from ..services.sms_service import sms_service
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_PENDING = "pending"
+OUTBOX_SENDING = "sending"
+OUTBOX_SENT = "sent"
+OUTBOX_SKIPPED = "skipped"
+OUTBOX_DEAD = "dead"
+
+CHANNELS = {
+    "email": email_service,
+    "sms": sms_service,
+}
+
+# Deliveries remembered for throughput / latency figures
+RECENT_DELIVERIES = 1000
+
+
+class NotificationOutbox:
+    """
+    Transactional outbox for email and SMS notifications
+
+    Request handlers call `enqueue` before committing, so a notification
+    exists exactly when the ticket change does and survives restarts.
+    Workers claim due messages by flipping them to `sending` with a claim
+    token and a claim expiry in `next_attempt_at`; a message whose worker
+    died is claimable again once that expiry passes. Failed deliveries are
+    retried with exponential backoff and jitter, and dead-lettered after
+    OUTBOX_MAX_ATTEMPTS.
+
+    Claiming a message with a group key (see NotificationCoalescer) claims
+    every pending message of its group too, and the group is delivered and
+    recorded as one summary email.
+    """
+
+    def __init__(self):
+        self.running = False
+        self._task = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=RECENT_DELIVERIES)  # (delivered_at, latency_seconds)
+        self.delivered = 0
+        self.failed_attempts = 0
+        self.dead_lettered = 0
+        self.skipped = 0
+        self.summaries_sent = 0
+        self.emails_saved = 0
+
+    # Producers ---------------------------------------------------------------
+
+    def enqueue(self, db: Session, channel: str, kind: str, **payload) -> OutboxMessage:
+        """
+        Add a notification to the caller's transaction
+
+        `kind` names the sender method (e.g. send_ticket_created) and
+        `payload` its keyword arguments. Nothing is sent until the caller
+        commits; call `wake()` afterwards to deliver without waiting for the
+        next poll.
+        """
+        sender = CHANNELS.get(channel)
+        if sender is None or not kind.startswith("send_") or not callable(getattr(sender, kind, None)):
+            raise ValueError(f"Unknown notification {channel}.{kind}")
+
+        message = OutboxMessage(
+            channel=channel,
+            kind=kind,
+            payload=payload,
+            status=OUTBOX_PENDING,
+            next_attempt_at=datetime.utcnow()
+        )
+        db.add(message)
+        return message
+
+    def wake(self):
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    # Claiming and recording --------------------------------------------------
+
+    def _claim(self, limit: int) -> List[Dict]:
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        table = OutboxMessage.__table__
+        due = and_(
+            table.c.status.in_([OUTBOX_PENDING, OUTBOX_SENDING]),
+            table.c.next_attempt_at <= now
+        )
+
+        db = SessionLocal()
+        try:
+            ids = db.execute(
+                select(table.c.id).where(due).order_by(table.c.next_attempt_at).limit(limit)
+            ).scalars().all()
+            if not ids:
+                return []
+
+            # Repeating the due condition makes the claim safe against other workers
+            claim = dict(
+                status=OUTBOX_SENDING,
+                claim_token=token,
+                attempts=table.c.attempts + 1,
+                next_attempt_at=now + timedelta(seconds=settings.OUTBOX_CLAIM_TIMEOUT)
+            )
+            db.execute(update(table).where(and_(table.c.id.in_(ids), due)).values(**claim))
+
+            # The rest of each claimed group, due or not, goes out in the same email
+            group_keys = db.execute(
+                select(table.c.group_key).distinct().where(
+                    and_(table.c.claim_token == token, table.c.group_key.isnot(None))
+                )
+            ).scalars().all()
+            if group_keys:
+                db.execute(update(table).where(and_(
+                    table.c.group_key.in_(group_keys),
+                    table.c.status == OUTBOX_PENDING
+                )).values(**claim))
+            db.commit()
+
+            rows = db.execute(
+                select(
+                    table.c.id, table.c.channel, table.c.kind, table.c.payload,
+                    table.c.attempts, table.c.created_at, table.c.group_key, table.c.group_item
+                ).where(table.c.claim_token == token).order_by(table.c.id)
+            ).all()
+            return self._merge_groups(rows, token)
+        finally:
+            db.close()
+
+    def _merge_groups(self, rows, token: str) -> List[Dict]:
+        """One message per ungrouped row or group; `ids` lists the rows each one stands for"""
+        from ..services.notification_coalescer import notification_coalescer
+
+        messages = []
+        groups: Dict[str, List] = {}
+        for row in rows:
+            if row.group_key is None:
+                messages.append({**row._asdict(), "ids": [row.id], "claim_token": token})
+            else:
+                groups.setdefault(row.group_key, []).append(row)
+
+        for recipient, group in groups.items():
+            message = {**group[0]._asdict(), "ids": [row.id for row in group], "claim_token": token}
+            if len(group) > 1:
+                subject, body = notification_coalescer.summary([row.group_item for row in group])
+                message.update(
+                    kind="send_email",
+                    payload={"to_addresses": [recipient], "subject": subject, "body": body},
+                    attempts=max(row.attempts for row in group),
+                    created_at=min(row.created_at for row in group)
+                )
+                logger.info(f"Coalesced {len(group)} notifications for {recipient} into one email")
+            messages.append(message)
+        return messages
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(settings.OUTBOX_BACKOFF_MAX, settings.OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    def _record(self, message: Dict, status: str, error: Optional[str] = None):
+        now = datetime.utcnow()
+        values = {"status": status, "claim_token": None, "last_error": error}
+        if status == OUTBOX_SENT:
+            values["sent_at"] = now
+        elif status == OUTBOX_PENDING:
+            values["next_attempt_at"] = now + timedelta(seconds=self._backoff(message["attempts"]))
+
+        table = OutboxMessage.__table__
+        db = SessionLocal()
+        try:
+            # The claim token guards against a worker whose claim already expired
+            db.execute(
+                update(table).where(and_(
+                    table.c.id.in_(message["ids"]),
+                    table.c.claim_token == message["claim_token"]
+                )).values(**values)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    # Delivery ----------------------------------------------------------------
+
+    async def _deliver(self, message: Dict):
+        try:
+            await self._send(message)
+        except Exception as e:
+            # Left in `sending`; claimable again once the claim expires
+            logger.error(f"Failed to record outbox message {message['id']}: {e}")
+
+    async def _send(self, message: Dict):
+        sender = CHANNELS.get(message["channel"])
+        if sender is not None and not sender.enabled:
+            # Same as sending directly with the channel unconfigured
+            with self._lock:
+                self.skipped += 1
+            await asyncio.to_thread(self._record, message, OUTBOX_SKIPPED, f"{message['channel']} not configured")
+            return
+
+        error = None
+        try:
+            method = getattr(sender, message["kind"])
+            if await method(**(message["payload"] or {})) is False:
+                error = "sender reported failure"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+
+        if error is None:
+            latency = (datetime.utcnow() - message["created_at"]).total_seconds()
+            with self._lock:
+                self.delivered += 1
+                self._recent.append((time.time(), latency))
+                if len(message["ids"]) > 1:
+                    self.summaries_sent += 1
+                    self.emails_saved += len(message["ids"]) - 1
+            await asyncio.to_thread(self._record, message, OUTBOX_SENT)
+            return
+
+        with self._lock:
+            self.failed_attempts += 1
+        if message["attempts"] >= settings.OUTBOX_MAX_ATTEMPTS:
+            with self._lock:
+                self.dead_lettered += 1
+            logger.error(f"Dead-lettered outbox message {message['id']} after {message['attempts']} attempts: {error}")
+            await asyncio.to_thread(self._record, message, OUTBOX_DEAD, error)
+        else:
+            logger.warning(f"Outbox message {message['id']} attempt {message['attempts']} failed: {error}")
+            await asyncio.to_thread(self._record, message, OUTBOX_PENDING, error)
+
+    async def start(self):
+        if self.running:
+            return
+
+        self.running = True
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        in_flight = set()
+        while self.running:
+            free = settings.OUTBOX_CONCURRENCY - len(in_flight)
+            if free <= 0:
+                _, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                continue
+
+            self._wakeup.clear()
+            try:
+                claimed = await asyncio.to_thread(self._claim, min(free, settings.OUTBOX_BATCH_SIZE))
+            except Exception as e:
+                logger.error(f"Outbox claim failed: {e}")
+                claimed = []
+
+            for message in claimed:
+                in_flight.add(asyncio.create_task(self._deliver(message)))
+
+            if claimed:
+                continue
+
+            # Idle: sleep until woken by an enqueue, a finished delivery or the poll interval
+            waiters = set(in_flight) | {asyncio.ensure_future(self._wakeup.wait())}
+            done, _ = await asyncio.wait(
+                waiters, timeout=settings.OUTBOX_POLL_INTERVAL, return_when=asyncio.FIRST_COMPLETED
+            )
+            for waiter in waiters - in_flight:
+                waiter.cancel()
+            in_flight -= done
+
+    async def stop(self):
+        self.running = False
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    # Dead letters and metrics ------------------------------------------------
+
+    def dead_letters(self, db: Session, limit: int = 50) -> List[Dict]:
+        messages = db.query(OutboxMessage).filter(
+            OutboxMessage.status == OUTBOX_DEAD
+        ).order_by(OutboxMessage.id.desc()).limit(limit).all()
+        return [
+            {
+                "id": message.id,
+                "channel": message.channel,
+                "kind": message.kind,
+                "payload": message.payload,
+                "attempts": message.attempts,
+                "last_error": message.last_error,
+                "created_at": message.created_at.isoformat() if message.created_at else None,
+            }
+            for message in messages
+        ]
+
+    def requeue(self, db: Session, message_ids: Optional[List[int]] = None) -> int:
+        """Give dead-lettered messages (all, or the given ids) a fresh set of attempts"""
+        table = OutboxMessage.__table__
+        condition = table.c.status == OUTBOX_DEAD
+        if message_ids:
+            condition = and_(condition, table.c.id.in_(message_ids))
+        result = db.execute(update(table).where(condition).values(
+            status=OUTBOX_PENDING, attempts=0, next_attempt_at=datetime.utcnow(), last_error=None
+        ))
+        db.commit()
+        self.wake()
+        return result.rowcount
+
+    def stats(self, db: Session) -> Dict:
+        now = datetime.utcnow()
+        counts = dict(
+            db.query(OutboxMessage.status, func.count(OutboxMessage.id)).group_by(OutboxMessage.status).all()
+        )
+        oldest_undelivered = db.query(func.min(OutboxMessage.created_at)).filter(
+            OutboxMessage.status.in_([OUTBOX_PENDING, OUTBOX_SENDING])
+        ).scalar()
+
+        with self._lock:
+            cutoff = time.time() - 60
+            last_minute = [latency for delivered_at, latency in self._recent if delivered_at >= cutoff]
+            latencies = sorted(latency for _, latency in self._recent)
+            return {
+                "counts": {status: counts.get(status, 0) for status in
+                           (OUTBOX_PENDING, OUTBOX_SENDING, OUTBOX_SENT, OUTBOX_SKIPPED, OUTBOX_DEAD)},
+                "lag_seconds": round((now - oldest_undelivered).total_seconds(), 1) if oldest_undelivered else 0.0,
+                "delivered_last_minute": len(last_minute),
+                "delivery_latency_p50_seconds": round(latencies[len(latencies) // 2], 3) if latencies else None,
+                "delivery_latency_p95_seconds": round(latencies[int(len(latencies) * 0.95)], 3) if latencies else None,
+                "delivered": self.delivered,
+                "failed_attempts": self.failed_attempts,
+                "dead_lettered": self.dead_lettered,
+                "skipped": self.skipped,
+                "concurrency": settings.OUTBOX_CONCURRENCY,
+            }
+
+
+# Global instance
+notification_outbox = NotificationOutbox()
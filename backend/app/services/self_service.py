@@ -0,0 +1,85 @@
+"""
+Self-service deflection: offer matching KB articles before a ticket is created
+"""
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..services.kb_index_service import kb_search_index
+
+logger = logging.getLogger(__name__)
+
+# Creating a ticket costs one classification completion
+LLM_CALLS_PER_TICKET = 1
+
+# Confidence is term coverage, not BM25 order, so confident articles can rank
+# below the first `limit` results; rank this many per offered article
+CANDIDATES_PER_RESULT = 5
+
+
+class SelfServiceDeflectionService:
+    """
+    Looks up KB articles for a new issue and tracks how often that avoids a ticket
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.offered = 0
+        self.declined = 0
+
+    def find_articles(
+        self,
+        db: Session,
+        title: str,
+        description: str,
+        category: Optional[str] = None,
+        limit: int = 3
+    ) -> List[Dict]:
+        """
+        Return KB articles whose confidence meets SELF_SERVICE_CONFIDENCE_THRESHOLD
+
+        An empty list means the issue should go straight to ticket creation.
+        """
+        kb_search_index.ensure_loaded(db)
+        results = kb_search_index.search(
+            f"{title} {description}", limit=limit * CANDIDATES_PER_RESULT, category=category
+        )
+        matches = [
+            result for result in results
+            if result["confidence"] >= settings.SELF_SERVICE_CONFIDENCE_THRESHOLD
+        ][:limit]
+
+        with self._lock:
+            self.checks += 1
+            if matches:
+                self.offered += 1
+
+        if matches:
+            logger.info(f"Self-service offered {len(matches)} articles for '{title[:50]}'")
+        return matches
+
+    def record_declined(self):
+        """The user saw suggested articles and still asked for a ticket"""
+        with self._lock:
+            self.declined += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            deflected = max(0, self.offered - self.declined)
+            return {
+                "checks": self.checks,
+                "articles_offered": self.offered,
+                "declined": self.declined,
+                "deflected": deflected,
+                "deflection_rate": round(deflected / self.checks, 4) if self.checks else 0.0,
+                "llm_calls_saved": deflected * LLM_CALLS_PER_TICKET,
+                "confidence_threshold": settings.SELF_SERVICE_CONFIDENCE_THRESHOLD,
+            }
+
+
+# Global instance
+self_service = SelfServiceDeflectionService()
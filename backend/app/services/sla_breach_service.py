@@ -0,0 +1,137 @@
+"""
+SLA breach sweeper
+Flags overdue open tickets as breached with chunked set-based updates
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, select, update
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.ticket_models import Ticket
+from ..services.sla_scheduler_service import CLOSED_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# Callback receiving the ids of tickets that just breached
+BreachHandler = Callable[[List[int], datetime], Awaitable[None]]
+
+
+class SLABreachSweeper:
+    """
+    Periodically sets Ticket.sla_breached for open tickets past their deadline
+
+    Each chunk selects up to SLA_BREACH_SWEEP_CHUNK overdue ids from the
+    (sla_breached, sla_deadline) index and flips them with one UPDATE in its
+    own transaction, so row locks are held briefly however large the
+    backlog. The UPDATE repeats the guard in case another worker got there
+    first; breach alerts go through the SLAAlert ledger, so a ticket reported
+    twice is still alerted once.
+    """
+
+    def __init__(self):
+        self.running = False
+        self._task = None
+        self._on_breach: Optional[BreachHandler] = None
+        self.last_sweep: Optional[datetime] = None
+        self.last_duration_ms = 0.0
+        self.last_marked = 0
+        self.total_marked = 0
+
+    def _overdue(self, now: datetime):
+        return and_(
+            Ticket.sla_breached == False,
+            Ticket.sla_deadline < now,
+            Ticket.status.not_in(CLOSED_STATUSES)
+        )
+
+    def sweep(self, db: Session, now: Optional[datetime] = None) -> List[int]:
+        """Flag every overdue open ticket; returns the ids that were flipped"""
+        started = time.perf_counter()
+        now = now or datetime.utcnow()
+        chunk_size = settings.SLA_BREACH_SWEEP_CHUNK
+
+        marked: List[int] = []
+        while True:
+            ids = db.execute(
+                select(Ticket.id).where(self._overdue(now)).order_by(Ticket.sla_deadline).limit(chunk_size)
+            ).scalars().all()
+            if not ids:
+                break
+
+            result = db.execute(
+                update(Ticket)
+                .where(and_(Ticket.id.in_(ids), self._overdue(now)))
+                .values(sla_breached=True)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            if result.rowcount:
+                marked.extend(ids)
+
+            if len(ids) < chunk_size:
+                break
+
+        self.last_sweep = now
+        self.last_duration_ms = round((time.perf_counter() - started) * 1000, 1)
+        self.last_marked = len(marked)
+        self.total_marked += len(marked)
+        if marked:
+            logger.warning(f"Marked {len(marked)} tickets as SLA breached in {self.last_duration_ms} ms")
+        return marked
+
+    def run_sweep(self, now: Optional[datetime] = None) -> List[int]:
+        """Sweep with a dedicated session (run off the event loop)"""
+        db = SessionLocal()
+        try:
+            return self.sweep(db, now)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"SLA breach sweep failed: {e}")
+            return []
+        finally:
+            db.close()
+
+    async def start(self, on_breach: Optional[BreachHandler] = None):
+        """Sweep now, then every SLA_BREACH_SWEEP_INTERVAL seconds"""
+        if self.running:
+            return
+
+        self.running = True
+        self._on_breach = on_breach
+        self._task = asyncio.create_task(self._sweep_periodically())
+
+    async def _sweep_periodically(self):
+        while self.running:
+            try:
+                now = datetime.utcnow()
+                marked = await asyncio.to_thread(self.run_sweep, now)
+                if marked and self._on_breach:
+                    await self._on_breach(marked, now)
+            except Exception as e:
+                logger.error(f"Error in SLA breach sweep: {e}")
+            await asyncio.sleep(settings.SLA_BREACH_SWEEP_INTERVAL)
+
+    async def stop(self):
+        self.running = False
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            "last_sweep": self.last_sweep.isoformat() if self.last_sweep else None,
+            "last_duration_ms": self.last_duration_ms,
+            "last_marked": self.last_marked,
+            "total_marked": self.total_marked,
+            "interval_seconds": settings.SLA_BREACH_SWEEP_INTERVAL,
+        }
+
+
+# Global instance
+sla_breach_sweeper = SLABreachSweeper()
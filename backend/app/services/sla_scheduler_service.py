@@ -0,0 +1,291 @@
+"""
+Deadline-driven SLA alert scheduler
+Keeps upcoming SLA alert times in a min-heap and sleeps until the next one is due
+"""
+import asyncio
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.ticket_models import SLAAlert, Ticket, TicketStatus
+
+logger = logging.getLogger(__name__)
+
+# Alert levels recorded in the SLAAlert ledger
+SLA_APPROACHING = "approaching"
+SLA_BREACHED = "breached"
+SLA_WARNING_WINDOW = timedelta(hours=1)
+
+CLOSED_STATUSES = [TicketStatus.RESOLVED, TicketStatus.CLOSED]
+
+# Change polls look back this far past the previous poll (commit lag, clock skew between workers)
+CHANGE_POLL_OVERLAP = timedelta(seconds=30)
+
+# Callback receiving the due ticket ids and the time they were found due
+DueHandler = Callable[[List[int], datetime], Awaitable[None]]
+
+
+class SLAScheduler:
+    """
+    Min-heap of (fire_at, ticket_id, deadline) events
+
+    Each open ticket with a deadline has two events: the start of the
+    warning window and the deadline itself. Entries are never removed from
+    the heap; `_deadlines` holds each ticket's current deadline and popped
+    entries for a different (or no) deadline are dropped, so rescheduling
+    and unscheduling are O(log n) / O(1).
+
+    The heap is rebuilt from the DB at startup and every
+    SLA_SCHEDULER_RESYNC_INTERVAL seconds to pick up changes made outside
+    the API (external sync, manual edits). Only the leader process runs the
+    scheduler, so tickets created or changed by other workers are picked up
+    by polling Ticket.updated_at every SLA_SCHEDULER_POLL_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int, datetime]] = []
+        self._deadlines: Dict[int, datetime] = {}
+        self._lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task = None
+        self._on_due: Optional[DueHandler] = None
+        # Changes made while a rebuild query runs, replayed onto its snapshot (None = unscheduled)
+        self._changed_during_rebuild: Optional[Dict[int, Optional[datetime]]] = None
+        self.running = False
+        self.last_rebuild: Optional[datetime] = None
+        self.fired = 0
+
+    # Scheduling --------------------------------------------------------------
+
+    def schedule(self, ticket_id: int, deadline: datetime, warn: bool = True):
+        """Queue the alerts for a deadline; `warn=False` when its warning was already sent"""
+        with self._lock:
+            if self._changed_during_rebuild is not None:
+                self._changed_during_rebuild[ticket_id] = deadline
+            if self._deadlines.get(ticket_id) == deadline:
+                return
+            self._deadlines[ticket_id] = deadline
+            if warn:
+                heapq.heappush(self._heap, (deadline - SLA_WARNING_WINDOW, ticket_id, deadline))
+            heapq.heappush(self._heap, (deadline, ticket_id, deadline))
+            is_next = self._heap[0][1] == ticket_id
+        if is_next:
+            self._wake()
+
+    def unschedule(self, ticket_id: int):
+        with self._lock:
+            if self._changed_during_rebuild is not None:
+                self._changed_during_rebuild[ticket_id] = None
+            self._deadlines.pop(ticket_id, None)
+
+    def track(self, ticket: Ticket):
+        """Schedule or drop a ticket after it was created or changed"""
+        if not self.running:
+            # Not the leader: its change poll picks the ticket up via updated_at
+            return
+        if ticket.sla_deadline is not None and ticket.status not in CLOSED_STATUSES:
+            self.schedule(ticket.id, ticket.sla_deadline)
+        else:
+            self.unschedule(ticket.id)
+
+    def _wake(self):
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _pop_due(self, now: datetime) -> Set[int]:
+        """Remove due events and return their ticket ids"""
+        due: Set[int] = set()
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                fire_at, ticket_id, deadline = heapq.heappop(self._heap)
+                if self._deadlines.get(ticket_id) != deadline:
+                    continue
+                due.add(ticket_id)
+                if fire_at == deadline:
+                    # Breach is the last event for this deadline
+                    del self._deadlines[ticket_id]
+        return due
+
+    def _next_fire_at(self) -> Optional[datetime]:
+        with self._lock:
+            while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][2]:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    # Rebuild -----------------------------------------------------------------
+
+    def rebuild(self, db: Session) -> int:
+        """
+        Load every open ticket that still has an alert to send
+
+        Tickets whose breach was already alerted for their current deadline
+        are skipped, so long-breached backlogs don't sit in the heap, and
+        warnings already sent are not queued again. Tickets scheduled or
+        dropped while the query runs are applied on top of its result.
+        """
+        with self._lock:
+            self._changed_during_rebuild = {}
+        try:
+            rows = self._load_pending(db)
+        except Exception:
+            with self._lock:
+                self._changed_during_rebuild = None
+            raise
+
+        heap = []
+        deadlines = {}
+        for ticket_id, deadline, alerted_level, alerted_deadline in rows:
+            deadlines[ticket_id] = deadline
+            if alerted_level != SLA_APPROACHING or alerted_deadline != deadline:
+                heap.append((deadline - SLA_WARNING_WINDOW, ticket_id, deadline))
+            heap.append((deadline, ticket_id, deadline))
+
+        with self._lock:
+            for ticket_id, deadline in self._changed_during_rebuild.items():
+                if deadline is None:
+                    deadlines.pop(ticket_id, None)
+                elif deadlines.get(ticket_id) != deadline:
+                    deadlines[ticket_id] = deadline
+                    heap.append((deadline - SLA_WARNING_WINDOW, ticket_id, deadline))
+                    heap.append((deadline, ticket_id, deadline))
+            self._changed_during_rebuild = None
+            heapq.heapify(heap)
+            self._heap = heap
+            self._deadlines = deadlines
+        self._wake()
+        self.last_rebuild = datetime.utcnow()
+        logger.info(f"SLA scheduler loaded {len(deadlines)} tickets")
+        return len(deadlines)
+
+    def _load_pending(self, db: Session, changed_since: Optional[datetime] = None):
+        query = db.query(Ticket.id, Ticket.sla_deadline, SLAAlert.level, SLAAlert.sla_deadline).outerjoin(
+            SLAAlert, SLAAlert.ticket_id == Ticket.id
+        )
+        if changed_since is not None:
+            query = query.filter(Ticket.updated_at >= changed_since)
+        return query.filter(
+            and_(
+                Ticket.sla_deadline.isnot(None),
+                Ticket.status.not_in(CLOSED_STATUSES),
+                or_(
+                    SLAAlert.ticket_id.is_(None),
+                    SLAAlert.level != SLA_BREACHED,
+                    SLAAlert.sla_deadline != Ticket.sla_deadline
+                )
+            )
+        ).order_by(Ticket.sla_deadline).all()
+
+    def _rebuild_from_db(self) -> int:
+        db = SessionLocal()
+        try:
+            return self.rebuild(db)
+        finally:
+            db.close()
+
+    def sync_changed(self, db: Session, since: datetime) -> int:
+        """
+        Schedule tickets changed since `since` (e.g. by another worker)
+
+        Closed tickets are not unscheduled here; if their events fire, the
+        alert query skips them.
+        """
+        rows = self._load_pending(db, changed_since=since)
+        for ticket_id, deadline, alerted_level, alerted_deadline in rows:
+            self.schedule(
+                ticket_id, deadline,
+                warn=alerted_level != SLA_APPROACHING or alerted_deadline != deadline
+            )
+        return len(rows)
+
+    def _sync_changed_from_db(self, since: datetime) -> int:
+        db = SessionLocal()
+        try:
+            return self.sync_changed(db, since)
+        finally:
+            db.close()
+
+    # Loop --------------------------------------------------------------------
+
+    async def start(self, on_due: DueHandler):
+        if self.running:
+            return
+
+        self.running = True
+        self._on_due = on_due
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        next_resync = None
+        next_poll = None
+        polled_at = None
+        while self.running:
+            now = datetime.utcnow()
+            if next_resync is None or now >= next_resync:
+                try:
+                    await asyncio.to_thread(self._rebuild_from_db)
+                    polled_at = now
+                except Exception as e:
+                    logger.error(f"SLA scheduler rebuild failed: {e}")
+                next_resync = now + timedelta(seconds=settings.SLA_SCHEDULER_RESYNC_INTERVAL)
+                next_poll = now + timedelta(seconds=settings.SLA_SCHEDULER_POLL_INTERVAL)
+            elif now >= next_poll:
+                if polled_at is not None:
+                    try:
+                        await asyncio.to_thread(self._sync_changed_from_db, polled_at - CHANGE_POLL_OVERLAP)
+                        polled_at = now
+                    except Exception as e:
+                        logger.error(f"SLA scheduler change poll failed: {e}")
+                next_poll = now + timedelta(seconds=settings.SLA_SCHEDULER_POLL_INTERVAL)
+
+            now = datetime.utcnow()
+            due = self._pop_due(now)
+            if due:
+                self.fired += len(due)
+                try:
+                    await self._on_due(sorted(due), now)
+                except Exception as e:
+                    logger.error(f"Error sending due SLA alerts: {e}")
+                continue
+
+            wake_at = self._next_fire_at()
+            if wake_at is None or wake_at > next_resync:
+                wake_at = next_resync
+            wake_at = min(wake_at, next_poll)
+            timeout = max(0.0, (wake_at - datetime.utcnow()).total_seconds())
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self):
+        self.running = False
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict:
+        next_fire_at = self._next_fire_at()
+        with self._lock:
+            return {
+                "scheduled_tickets": len(self._deadlines),
+                "heap_size": len(self._heap),
+                "next_alert_at": next_fire_at.isoformat() if next_fire_at else None,
+                "alerts_due_fired": self.fired,
+                "last_rebuild": self.last_rebuild.isoformat() if self.last_rebuild else None,
+            }
+
+
+# Global instance
+sla_scheduler = SLAScheduler()
@@ -39,12 +39,12 @@ class SMSService:
     async def send_critical_alert(self, to_number: str, ticket_id: str):
         """Send critical ticket alert via SMS."""
         message = f"🚨 CRITICAL TICKET: {ticket_id} requires immediate attention. Login to NullTicket for details."
-        await self.send_sms(to_number, message)
+        return await self.send_sms(to_number, message)
 
     async def send_sla_breach_alert(self, to_number: str, ticket_id: str):
         """Send SLA breach alert via SMS."""
         message = f"⚠️ SLA ALERT: {ticket_id} is approaching deadline. Please review immediately."
-        await self.send_sms(to_number, message)
+        return await self.send_sms(to_number, message)
 
     async def send_resolution_notification(self, to_number: str, ticket_id: str, resolution_message: str):
         """Send ticket resolution notification via SMS."""
@@ -53,7 +53,7 @@ class SMSService:
             resolution_message = resolution_message[:117] + "..."
         
         message = f"✅ RESOLVED: {ticket_id} - {resolution_message}"
-        await self.send_sms(to_number, message)
+        return await self.send_sms(to_number, message)
 
 
 # Global instance
@@ -0,0 +1,237 @@
+"""
+Pooled persistent SMTP connections
+Authenticated connections are reused across messages instead of one TCP + TLS + AUTH handshake per email
+"""
+import asyncio
+import logging
+import socket
+import time
+from collections import deque
+from email.message import Message
+from typing import Deque, Dict, Optional
+
+import aiosmtplib
+
+logger = logging.getLogger(__name__)
+
+# Reply code of a server that is closing the connection (e.g. idle timeout, too many messages)
+SMTP_SERVICE_CLOSING = 421
+
+
+class _PooledConnection:
+    def __init__(self, smtp: aiosmtplib.SMTP):
+        self.smtp = smtp
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.messages_sent = 0
+
+
+class SMTPConnectionPool:
+    """
+    A small pool of long-lived, logged-in SMTP connections
+
+    At most `size` messages are in flight, which also caps the number of open
+    connections: a sender takes the most recently used idle connection or
+    opens one only when none is idle. Each connection carries many messages
+    (MAIL / RCPT / DATA on the same session) and is recycled after
+    `max_messages` or `idle_timeout`, before providers drop it themselves.
+
+    A keep-alive task sends NOOP on connections idle for `keepalive_interval`
+    and discards the ones that don't answer. A send that fails because a
+    reused connection went away is retried once on a fresh connection;
+    SMTP errors from the server (rejected recipient, etc.) are raised as is.
+    """
+
+    def __init__(
+        self,
+        hostname: str,
+        port: int,
+        username: str = "",
+        password: str = "",
+        use_tls: bool = True,
+        size: int = 4,
+        max_messages: int = 100,
+        idle_timeout: float = 240,
+        keepalive_interval: float = 60,
+        timeout: float = 30,
+        local_hostname: Optional[str] = None
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.size = size
+        self.max_messages = max_messages
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.timeout = timeout
+
+        self._idle: Deque[_PooledConnection] = deque()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._keepalive_task = None
+        self._local_hostname = local_hostname
+        self.in_use = 0
+        self.connections_opened = 0
+        self.connections_closed = 0
+        self.messages_sent = 0
+        self.reconnects = 0
+        self.noops = 0
+
+    # Connections -------------------------------------------------------------
+
+    def _bind_loop(self):
+        """Connections belong to the loop that opened them; start over on a new loop"""
+        loop = asyncio.get_running_loop()
+        if loop is self._loop:
+            return
+        for conn in self._idle:
+            conn.smtp.close()
+        self._idle.clear()
+        self._loop = loop
+        self._semaphore = asyncio.Semaphore(self.size)
+        self.in_use = 0
+        self._keepalive_task = loop.create_task(self._keepalive()) if self.keepalive_interval > 0 else None
+
+    async def _connect(self) -> _PooledConnection:
+        if self._local_hostname is None:
+            # getfqdn can block on DNS
+            self._local_hostname = await asyncio.to_thread(socket.getfqdn)
+
+        smtp = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            username=self.username or None,
+            password=self.password or None,
+            use_tls=self.use_tls,
+            local_hostname=self._local_hostname,
+            timeout=self.timeout,
+        )
+        await smtp.connect()  # also logs in when credentials are set
+        self.connections_opened += 1
+        return _PooledConnection(smtp)
+
+    async def _discard(self, conn: _PooledConnection, polite: bool = True):
+        self.connections_closed += 1
+        if polite and conn.smtp.is_connected:
+            try:
+                await conn.smtp.quit()
+                return
+            except Exception:
+                pass
+        conn.smtp.close()
+
+    async def _usable(self, conn: _PooledConnection) -> bool:
+        """Whether an idle connection can carry another message (closes it if not)"""
+        idle = time.monotonic() - conn.last_used
+        if not conn.smtp.is_connected:
+            await self._discard(conn, polite=False)
+            return False
+        if conn.messages_sent >= self.max_messages or idle >= self.idle_timeout:
+            await self._discard(conn)
+            return False
+        if self.keepalive_interval > 0 and idle >= self.keepalive_interval:
+            try:
+                await conn.smtp.noop()
+                self.noops += 1
+                conn.last_used = time.monotonic()
+            except Exception:
+                await self._discard(conn, polite=False)
+                return False
+        return True
+
+    async def _acquire(self) -> _PooledConnection:
+        while self._idle:
+            conn = self._idle.pop()
+            if await self._usable(conn):
+                return conn
+        return await self._connect()
+
+    # Sending -----------------------------------------------------------------
+
+    async def send_message(self, message: Message):
+        """Send one message over a pooled connection"""
+        self._bind_loop()
+        async with self._semaphore:
+            self.in_use += 1
+            try:
+                await self._send(message)
+            finally:
+                self.in_use -= 1
+
+    async def _send(self, message: Message):
+        conn = await self._acquire()
+        reused = conn.messages_sent > 0
+        try:
+            await conn.smtp.send_message(message)
+        except Exception as e:
+            stale = isinstance(e, (ConnectionError, aiosmtplib.SMTPTimeoutError)) or (
+                isinstance(e, aiosmtplib.SMTPResponseException) and e.code == SMTP_SERVICE_CLOSING
+            )
+            if not stale:
+                # Server rejected the message; the session itself is fine (envelope was reset)
+                self._release(conn)
+                raise
+            await self._discard(conn, polite=False)
+            if not reused:
+                raise
+
+            # The server dropped a connection we kept open; one retry on a fresh one
+            self.reconnects += 1
+            logger.info(f"SMTP connection to {self.hostname} was closed ({e}); reconnecting")
+            conn = await self._connect()
+            try:
+                await conn.smtp.send_message(message)
+            except Exception:
+                await self._discard(conn, polite=False)
+                raise
+
+        conn.messages_sent += 1
+        self.messages_sent += 1
+        self._release(conn)
+
+    def _release(self, conn: _PooledConnection):
+        conn.last_used = time.monotonic()
+        self._idle.append(conn)
+
+    # Keep-alive --------------------------------------------------------------
+
+    async def _keepalive(self):
+        while True:
+            await asyncio.sleep(self.keepalive_interval)
+            try:
+                # Each idle connection is checked once, holding a send slot like a sender would
+                for _ in range(len(self._idle)):
+                    async with self._semaphore:
+                        if not self._idle:
+                            break
+                        conn = self._idle.popleft()
+                        if await self._usable(conn):
+                            self._idle.append(conn)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"SMTP keep-alive failed: {e}")
+
+    async def close(self):
+        if self._keepalive_task:
+            self._keepalive_task.cancel()
+            self._keepalive_task = None
+        while self._idle:
+            await self._discard(self._idle.pop())
+        self._loop = None
+
+    def stats(self) -> Dict:
+        return {
+            "size": self.size,
+            "idle": len(self._idle),
+            "in_use": self.in_use,
+            "connections_opened": self.connections_opened,
+            "connections_closed": self.connections_closed,
+            "messages_sent": self.messages_sent,
+            "messages_per_connection": round(self.messages_sent / self.connections_opened, 1)
+            if self.connections_opened else 0.0,
+            "reconnects": self.reconnects,
+            "keepalive_noops": self.noops,
+        }
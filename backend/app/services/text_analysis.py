@@ -0,0 +1,173 @@
+"""
+Shared text analysis: tokenization and an incremental document-frequency table
+Used by ticket clustering, KB keyword extraction and search
+"""
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Set, Tuple
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    "the", "and", "for", "are", "but", "not", "you", "all", "any", "can", "had", "her",
+    "was", "one", "our", "out", "has", "have", "been", "from", "this", "that", "with",
+    "they", "will", "would", "there", "their", "what", "when", "which", "while", "into",
+    "about", "after", "also", "just", "than", "then", "them", "these", "those", "your",
+    "please", "help", "hello", "thanks", "thank", "regards", "hi", "dear", "team",
+    "its", "get", "got", "did", "does", "doing", "unable", "issue", "problem",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords and very short tokens removed"""
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower())
+        if len(token) > 2 and token not in STOPWORDS
+    ]
+
+
+def trigrams(term: str) -> Set[str]:
+    """Character trigrams of a padded word, the way pg_trgm computes them"""
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramVocabulary:
+    """
+    Trigram postings over a set of terms, for finding terms close to a misspelling
+
+    Similarity is the Jaccard overlap of trigram sets (pg_trgm's similarity()).
+    Candidates are pruned before any set is compared: a term reaching the
+    threshold must share at least ceil(threshold * n) of the query's n trigrams,
+    so it is enough to read the postings of the rarest n - ceil(threshold * n) + 1
+    of them, and terms of very different length are skipped outright.
+    """
+
+    def __init__(self, threshold: float = 0.3):
+        self.threshold = threshold
+        self._postings: Dict[str, Set[str]] = {}
+        self._terms: Dict[str, Set[str]] = {}
+
+    def __contains__(self, term: str) -> bool:
+        return term in self._terms
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    @property
+    def trigram_count(self) -> int:
+        return len(self._postings)
+
+    def add(self, term: str):
+        if term in self._terms:
+            return
+        grams = trigrams(term)
+        self._terms[term] = grams
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(term)
+
+    def discard(self, term: str):
+        grams = self._terms.pop(term, None)
+        if grams is None:
+            return
+        for gram in grams:
+            terms = self._postings.get(gram)
+            if terms:
+                terms.discard(term)
+                if not terms:
+                    del self._postings[gram]
+
+    def clear(self):
+        self._postings.clear()
+        self._terms.clear()
+
+    def similar(self, term: str, limit: int = 3) -> List[Tuple[str, float]]:
+        """Closest known terms at or above the threshold, best first"""
+        grams = trigrams(term)
+        size = len(grams)
+        min_shared = max(1, math.ceil(self.threshold * size))
+
+        # Pigeonhole: any qualifying term contains one of these rarest trigrams
+        rarest = sorted(grams, key=lambda gram: len(self._postings.get(gram, ())))
+        candidates: Set[str] = set()
+        for gram in rarest[:size - min_shared + 1]:
+            candidates.update(self._postings.get(gram, ()))
+
+        matches = []
+        for candidate in candidates:
+            other = self._terms[candidate]
+            if not size * self.threshold <= len(other) <= size / self.threshold:
+                continue
+            shared = len(grams & other)
+            similarity = shared / (size + len(other) - shared)
+            if similarity >= self.threshold:
+                matches.append((candidate, similarity))
+
+        matches.sort(key=lambda match: (-match[1], match[0]))
+        return matches[:limit]
+
+
+class DocumentFrequencyTable:
+    """
+    Incrementally maintained document frequencies for TF-IDF weighting
+
+    Documents are added and removed as tickets enter and leave the corpus,
+    so scoring never needs to scan the corpus.
+    """
+
+    def __init__(self):
+        self._df: Counter = Counter()
+        self._documents = 0
+        self._lock = threading.Lock()
+
+    @property
+    def documents(self) -> int:
+        return self._documents
+
+    def add_document(self, tokens: Iterable[str]):
+        terms = set(tokens)
+        with self._lock:
+            self._df.update(terms)
+            self._documents += 1
+
+    def remove_document(self, tokens: Iterable[str]):
+        terms = set(tokens)
+        with self._lock:
+            self._df.subtract(terms)
+            for term in terms:
+                if self._df[term] <= 0:
+                    del self._df[term]
+            self._documents = max(0, self._documents - 1)
+
+    def document_frequency(self, term: str) -> int:
+        return self._df.get(term, 0)
+
+    def idf(self, term: str) -> float:
+        """Smoothed inverse document frequency"""
+        return math.log((1 + self._documents) / (1 + self._df.get(term, 0))) + 1.0
+
+    def tfidf(self, term_counts: Dict[str, int]) -> Dict[str, float]:
+        return {term: count * self.idf(term) for term, count in term_counts.items()}
+
+    def top_terms(self, term_counts: Dict[str, int], limit: int = 10) -> List[str]:
+        """Highest TF-IDF terms, ties broken alphabetically for stable output"""
+        scores = self.tfidf(term_counts)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [term for term, _ in ranked[:limit]]
+
+    def keywords_for(self, texts: Iterable[str], limit: int = 10) -> List[str]:
+        """Top TF-IDF keywords for a group of texts"""
+        counts: Counter = Counter()
+        for text in texts:
+            counts.update(tokenize(text))
+        return self.top_terms(counts, limit)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"documents": self._documents, "terms": len(self._df)}
+
+
+# Global instance, maintained by the ticket clustering index
+ticket_term_stats = DocumentFrequencyTable()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Benchmark pooled SMTP delivery against one connection per message
+Runs a local SMTP sink, so no mail leaves the machine
+
+    python benchmark_smtp_pool.py --messages 500 --latency 0.02
+"""
+import argparse
+import asyncio
+import base64
+import time
+from email.mime.text import MIMEText
+
+import aiosmtplib
+
+from app.services.smtp_pool import SMTPConnectionPool
+
+
+class SMTPSink:
+    """
+    Minimal SMTP server that accepts and discards every message
+
+    `latency` is added before each reply (and twice for the greeting, to
+    account for the TCP handshake) to stand in for the round trips to a real
+    provider.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.connections = 0
+        self.messages = 0
+
+    async def _reply(self, writer, line: str):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        writer.write(f"{line}\r\n".encode())
+        await writer.drain()
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        await self._reply(writer, "220 sink ESMTP ready")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode(errors="replace").strip()
+                verb = command.split(" ", 1)[0].upper()
+
+                if verb == "EHLO":
+                    writer.write(b"250-sink\r\n250-8BITMIME\r\n250-SIZE 10485760\r\n")
+                    await self._reply(writer, "250 AUTH PLAIN LOGIN")
+                elif verb == "HELO":
+                    await self._reply(writer, "250 sink")
+                elif verb == "AUTH":
+                    parts = command.split(" ")
+                    if len(parts) > 2 and parts[1].upper() == "PLAIN":
+                        base64.b64decode(parts[2])
+                        await self._reply(writer, "235 2.7.0 Authentication successful")
+                    elif parts[1].upper() == "LOGIN":
+                        await self._reply(writer, "334 VXNlcm5hbWU6")
+                        await reader.readline()
+                        await self._reply(writer, "334 UGFzc3dvcmQ6")
+                        await reader.readline()
+                        await self._reply(writer, "235 2.7.0 Authentication successful")
+                    else:
+                        await self._reply(writer, "504 Unrecognized authentication type")
+                elif verb == "DATA":
+                    await self._reply(writer, "354 End data with <CR><LF>.<CR><LF>")
+                    while (await reader.readline()) not in (b".\r\n", b""):
+                        pass
+                    self.messages += 1
+                    await self._reply(writer, "250 OK queued")
+                elif verb == "QUIT":
+                    await self._reply(writer, "221 Bye")
+                    break
+                else:
+                    # MAIL, RCPT, RSET, NOOP
+                    await self._reply(writer, "250 OK")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def build_message(i: int) -> MIMEText:
+    message = MIMEText(f"Benchmark message {i}\n")
+    message["From"] = "bench@nullticket.local"
+    message["To"] = "team@nullticket.local"
+    message["Subject"] = f"Benchmark {i}"
+    return message
+
+
+async def send_unpooled(port: int, count: int, concurrency: int):
+    """The previous behaviour: aiosmtplib.send opens, authenticates and closes per message"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(i: int):
+        async with semaphore:
+            await aiosmtplib.send(
+                build_message(i), hostname="127.0.0.1", port=port,
+                username="bench", password="bench", use_tls=False, start_tls=False,
+                local_hostname="bench"
+            )
+
+    await asyncio.gather(*(send(i) for i in range(count)))
+
+
+async def send_pooled(port: int, count: int, concurrency: int) -> dict:
+    pool = SMTPConnectionPool(
+        hostname="127.0.0.1", port=port, username="bench", password="bench",
+        use_tls=False, size=concurrency, keepalive_interval=0, local_hostname="bench"
+    )
+    await asyncio.gather(*(pool.send_message(build_message(i)) for i in range(count)))
+    stats = pool.stats()
+    await pool.close()
+    return stats
+
+
+async def run(args):
+    results = []
+    for name, runner in (("one connection per message", send_unpooled), ("pooled connections", send_pooled)):
+        sink = SMTPSink(latency=args.latency)
+        server = await asyncio.start_server(sink.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+
+        started = time.perf_counter()
+        extra = await runner(port, args.messages, args.concurrency)
+        elapsed = time.perf_counter() - started
+
+        server.close()
+        await server.wait_closed()
+        results.append((name, elapsed, sink))
+        print(f"{name:<28} {elapsed:7.2f} s  {args.messages / elapsed:8.1f} msg/s  "
+              f"{sink.connections:5d} connections  {sink.messages:5d} received")
+        if extra:
+            print(f"{'':<28} pool stats: {extra}")
+
+    baseline, pooled = results[0][1], results[1][1]
+    print(f"\n⚡ Pooled delivery is {baseline / pooled:.1f}x faster "
+          f"({args.messages} messages, concurrency {args.concurrency}, {args.latency * 1000:.0f} ms per reply)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=4, help="sends in flight (pool size)")
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds added before each sink reply")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
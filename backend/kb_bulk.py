@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Bulk import / export of knowledge base articles as NDJSON
+
+Usage:
+    python kb_bulk.py import articles.ndjson
+    python kb_bulk.py export kb_articles.ndjson
+    python kb_bulk.py export - > kb_articles.ndjson
+"""
+import argparse
+import sys
+
+from app.database import SessionLocal, init_db
+from app.services import kb_bulk_service
+
+
+def run_import(path: str, batch_size: int) -> int:
+    db = SessionLocal()
+    try:
+        with (sys.stdin if path == "-" else open(path, encoding="utf-8")) as lines:
+            summary = kb_bulk_service.import_lines(db, lines, batch_size)
+    finally:
+        db.close()
+
+    print(f"✅ Imported {summary['imported']} articles, {summary['failed']} failed", file=sys.stderr)
+    for error in summary["errors"]:
+        print(f"  line {error['line']}: {error['error']}", file=sys.stderr)
+    return 0 if summary["failed"] == 0 else 1
+
+
+def run_export(path: str, batch_size: int) -> int:
+    count = 0
+    with (sys.stdout if path == "-" else open(path, "w", encoding="utf-8")) as out:
+        for line in kb_bulk_service.export_lines(batch_size=batch_size):
+            out.write(line)
+            count += 1
+
+    print(f"✅ Exported {count} articles", file=sys.stderr)
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Bulk import/export KB articles as NDJSON")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("path", help="NDJSON file, or - for stdin/stdout")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    init_db()
+    if args.command == "import":
+        return run_import(args.path, args.batch_size)
+    return run_export(args.path, args.batch_size)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Exercise the mailbox ingestion worker against a local IMAP stand-in server
+Uses a throwaway SQLite database unless DATABASE_URL is set
+
+    python test_imap_ingestion.py
+"""
+import asyncio
+import os
+import re
+import tempfile
+from email.message import EmailMessage
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/imap_ingestion.db")
+
+from app.config import settings
+from app.database import SessionLocal, init_db
+from app.models.ticket_models import MailboxCursor, Ticket, TicketSource
+from app.routes import ingestion
+from app.services.imap_ingestion_service import MailboxIngestionWorker
+
+
+class IMAPStandIn:
+    """
+    In-memory IMAP server with one mailbox: enough of IMAP4rev1 for the worker
+
+    `deliver` appends a message and notifies clients waiting in IDLE;
+    `supports_idle=False` makes the worker fall back to polling.
+    """
+
+    def __init__(self, supports_idle: bool = True, uid_validity: int = 1):
+        self.supports_idle = supports_idle
+        self.uid_validity = uid_validity
+        self.messages = []  # (uid, raw bytes)
+        self.next_uid = 1
+        self.sessions = 0
+        self._idlers = set()
+
+    def deliver(self, raw: bytes):
+        self.messages.append((self.next_uid, raw))
+        self.next_uid += 1
+        for queue in self._idlers:
+            queue.put_nowait(len(self.messages))
+
+    async def handle(self, reader, writer):
+        self.sessions += 1
+        writer.write(b"* OK IMAP stand-in ready\r\n")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                tag, _, rest = line.decode().strip().partition(" ")
+                command, _, args = rest.partition(" ")
+                command = command.upper()
+
+                if command == "UID":
+                    sub, _, args = args.partition(" ")
+                    command = f"UID {sub.upper()}"
+
+                if command == "CAPABILITY":
+                    writer.write(f"* CAPABILITY IMAP4rev1{' IDLE' if self.supports_idle else ''}\r\n".encode())
+                elif command in ("SELECT", "EXAMINE"):
+                    writer.write(f"* {len(self.messages)} EXISTS\r\n".encode())
+                    writer.write(f"* OK [UIDVALIDITY {self.uid_validity}] UIDs valid\r\n".encode())
+                    writer.write(f"* OK [UIDNEXT {self.next_uid}] Predicted next UID\r\n".encode())
+                elif command == "UID SEARCH":
+                    low = int(re.search(r"UID (\d+):\*", args).group(1))
+                    uids = [uid for uid, _ in self.messages if uid >= low]
+                    if not uids and self.messages:
+                        uids = [self.messages[-1][0]]  # "n:*" matches the newest message
+                    writer.write(("* SEARCH " + " ".join(map(str, uids))).rstrip().encode() + b"\r\n")
+                elif command == "UID FETCH":
+                    wanted = {int(uid) for uid in args.split(" ", 1)[0].split(",")}
+                    limit = int(re.search(r"<0\.(\d+)>", args).group(1))
+                    for seq, (uid, raw) in enumerate(self.messages, start=1):
+                        if uid in wanted:
+                            body = raw[:limit]
+                            writer.write(f"* {seq} FETCH (UID {uid} BODY[]<0> {{{len(body)}}}\r\n".encode())
+                            writer.write(body + b")\r\n")
+                elif command == "IDLE":
+                    if not self.supports_idle:
+                        writer.write(f"{tag} BAD IDLE not supported\r\n".encode())
+                        continue
+                    await self._idle(tag, reader, writer)
+                    continue
+                elif command == "LOGOUT":
+                    writer.write(b"* BYE logging out\r\n")
+                    writer.write(f"{tag} OK LOGOUT completed\r\n".encode())
+                    await writer.drain()
+                    break
+                # LOGIN and NOOP need nothing but the tagged OK
+                writer.write(f"{tag} OK {command} completed\r\n".encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            # Client went away, or the loop is shutting down with the session open
+            pass
+        finally:
+            writer.close()
+
+    async def _idle(self, tag, reader, writer):
+        queue = asyncio.Queue()
+        self._idlers.add(queue)
+        writer.write(b"+ idling\r\n")
+        await writer.drain()
+        done = asyncio.ensure_future(reader.readline())
+        try:
+            while True:
+                notified = asyncio.ensure_future(queue.get())
+                finished, _ = await asyncio.wait({done, notified}, return_when=asyncio.FIRST_COMPLETED)
+                if notified in finished:
+                    writer.write(f"* {notified.result()} EXISTS\r\n".encode())
+                    await writer.drain()
+                else:
+                    notified.cancel()
+                if done in finished:
+                    break
+        finally:
+            self._idlers.discard(queue)
+        writer.write(f"{tag} OK IDLE terminated\r\n".encode())
+        await writer.drain()
+
+
+def build_email(i: int, scenario: str, multipart: bool = False, subject: str = None) -> bytes:
+    message = EmailMessage()
+    message["From"] = f"User {i} <user{i}@example.com>"
+    message["To"] = "support@example.com"
+    message["Subject"] = subject or f"Printer on floor {i} is offline"
+    message["Message-ID"] = f"<standin-{scenario}-{i}@example.com>"
+    message.set_content(f"The printer on floor {i} stopped responding this morning.")
+    if multipart:
+        message.add_alternative(f"<p>The printer on floor <b>{i}</b> stopped responding.</p>", subtype="html")
+        message.add_attachment(b"\x00" * 50_000, maintype="application", subtype="octet-stream", filename="log.bin")
+    return message.as_bytes()
+
+
+def email_tickets():
+    db = SessionLocal()
+    try:
+        return db.query(Ticket).filter(Ticket.source == TicketSource.EMAIL).order_by(Ticket.id).all()
+    finally:
+        db.close()
+
+
+async def wait_for(condition, timeout: float = 5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        if loop.time() > deadline:
+            raise AssertionError("timed out waiting for the worker")
+        await asyncio.sleep(0.05)
+
+
+async def run_scenario(supports_idle: bool):
+    mode = "IDLE" if supports_idle else "polling"
+    print(f"\n📬 Worker against a stand-in server with {mode}")
+    server = IMAPStandIn(supports_idle=supports_idle)
+    server.deliver(build_email(0, mode))  # already in the mailbox: history is not imported
+    listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+
+    settings.EMAIL_HOST = "127.0.0.1"
+    settings.EMAIL_PORT = listener.sockets[0].getsockname()[1]
+    settings.EMAIL_USER = f"support-{mode}"
+    settings.EMAIL_PASSWORD = "secret"
+    settings.EMAIL_USE_SSL = False
+    settings.EMAIL_CHECK_INTERVAL = 1
+    settings.EMAIL_FETCH_BATCH = 2
+
+    before = len(email_tickets())
+    worker = MailboxIngestionWorker()
+    await worker.start()
+    await wait_for(lambda: worker.last_check is not None)
+
+    for i in range(1, 6):
+        server.deliver(build_email(i, mode, multipart=(i == 3)))
+    await wait_for(lambda: len(email_tickets()) - before == 5)
+    print(f"✅ 5 new messages became tickets; stats: {worker.stats()}")
+
+    # Restart: the cursor prevents re-ingesting, and mail sent meanwhile is picked up
+    await worker.stop()
+    server.deliver(build_email(6, mode))
+    worker = MailboxIngestionWorker()
+    await worker.start()
+    await wait_for(lambda: len(email_tickets()) - before == 6)
+    await asyncio.sleep(0.3)
+    assert len(email_tickets()) - before == 6, "messages were ingested twice"
+    print("✅ Restart resumed from the stored UID without duplicates")
+
+    # Lost cursor update: the Message-ID check stops a second ticket
+    db = SessionLocal()
+    db.get(MailboxCursor, worker.mailbox_key).last_uid = 4
+    db.commit()
+    db.close()
+    await worker.stop()
+    worker = MailboxIngestionWorker()
+    await worker.start()
+    await wait_for(lambda: worker.skipped == 3)
+    assert len(email_tickets()) - before == 6
+    print("✅ Messages replayed after a lost cursor update were skipped by Message-ID")
+
+    tickets = email_tickets()[-6:]
+    html_ticket = next(ticket for ticket in tickets if "floor 3" in ticket.title)
+    print(f"   e.g. {html_ticket.ticket_number}: {html_ticket.title!r} from {html_ticket.requester_email} "
+          f"-> {html_ticket.description!r}")
+
+    await worker.stop()
+    listener.close()
+    await listener.wait_closed()
+
+
+async def run_poison_scenario():
+    print("\n☠️  A message that always fails to ingest")
+    server = IMAPStandIn()
+    listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+    settings.EMAIL_PORT = listener.sockets[0].getsockname()[1]
+    settings.EMAIL_USER = "support-poison"
+    settings.EMAIL_MAX_INGEST_ATTEMPTS = 3
+
+    create_email_ticket = ingestion.create_email_ticket
+
+    def failing_create(db, subject, *args, **kwargs):
+        if "poison" in subject:
+            raise ValueError("cannot store this message")
+        return create_email_ticket(db, subject, *args, **kwargs)
+
+    ingestion.create_email_ticket = failing_create
+    before = len(email_tickets())
+    worker = MailboxIngestionWorker()
+    await worker.start()
+    await wait_for(lambda: worker.last_check is not None)
+
+    server.deliver(build_email(1, "poison", subject="poison pill"))
+    server.deliver(build_email(2, "poison"))
+    await wait_for(lambda: len(email_tickets()) - before == 1, timeout=15)
+    assert worker.failed == 3 and worker.dead_lettered == 1, worker.stats()
+    print(f"✅ Skipped after {worker.failed} attempts and ingested the next message; stats: {worker.stats()}")
+
+    # A cursor row deleted meanwhile is recreated instead of failing every message
+    db = SessionLocal()
+    db.delete(db.get(MailboxCursor, worker.mailbox_key))
+    db.commit()
+    db.close()
+    server.deliver(build_email(3, "poison"))
+    await wait_for(lambda: len(email_tickets()) - before == 2)
+    db = SessionLocal()
+    assert db.get(MailboxCursor, worker.mailbox_key).last_uid == 3
+    db.close()
+    print("✅ Missing cursor row was recreated")
+
+    ingestion.create_email_ticket = create_email_ticket
+    await worker.stop()
+    listener.close()
+    await listener.wait_closed()
+
+
+async def main():
+    init_db()
+    await run_scenario(supports_idle=True)
+    await run_scenario(supports_idle=False)
+    await run_poison_scenario()
+    print("\n🎉 Mailbox ingestion works against the stand-in server")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
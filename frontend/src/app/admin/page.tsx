@@ -37,7 +37,7 @@ export default function Admin() {
       const pattern = patterns.find((p: any) => p.category === category);
       if (!pattern) return;
 
-      const sampleTicketIds = [1, 2, 3];
+      const sampleTicketIds = (pattern as any).sample_ticket_ids || [];
 
       await fetcher('/api/kb/articles/create-from-pattern', {
         method: 'POST',
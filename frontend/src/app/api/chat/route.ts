@@ -15,9 +15,16 @@ export async function POST(request: NextRequest) {
     });
 
     if (!response.ok) {
+      // Pass through "busy, try again" details (503 / 429 with Retry-After)
+      const errorData = await response.json().catch(() => ({}));
       return NextResponse.json(
-        { error: 'Failed to get AI response' },
-        { status: response.status }
+        { ...errorData, error: errorData.error || 'Failed to get AI response' },
+        {
+          status: response.status,
+          headers: response.headers.get('Retry-After')
+            ? { 'Retry-After': response.headers.get('Retry-After') as string }
+            : undefined,
+        }
       );
     }
 
@@ -17,6 +17,7 @@ export default function ChatWidget() {
   ]);
   const [input, setInput] = useState('');
   const [loading, setLoading] = useState(false);
+  const [sessionId, setSessionId] = useState<string | null>(null);
 
   const handleSend = async () => {
     if (!input.trim()) return;
@@ -46,16 +47,25 @@ export default function ChatWidget() {
           headers: { 'Content-Type': 'application/json' },
           body: JSON.stringify({
             message: userMessage,
-            context: messages.slice(-6).map(m => ({ role: m.role, content: m.content })) // Send last 6 messages for context
+            // /api/chat proxies to the backend, which keeps the history for this session
+            session_id: sessionId
           }),
         });
 
         if (aiResponse.ok) {
           const aiData = await aiResponse.json();
+          if (aiData.session_id) setSessionId(aiData.session_id);
           if (aiData.response) {
+            // KB articles the answer was grounded on
+            const articleLinks = (aiData.articles || [])
+              .map((article: any) => `• [${article.title}](/kb/article/${article.id})`)
+              .join('\n');
+            const content = articleLinks
+              ? `${aiData.response}\n\n📚 **Related Knowledge Base Articles:**\n${articleLinks}`
+              : aiData.response;
             setMessages(prev => [
               ...prev,
-              { role: 'assistant', content: aiData.response }
+              { role: 'assistant', content }
             ]);
             setLoading(false);
             return;
@@ -108,12 +118,12 @@ export default function ChatWidget() {
   // Self-service response logic with knowledge base integration
   const getSelfServiceResponse = async (message: string): Promise<string | null> => {
     try {
-      // Search knowledge base for relevant articles
-      const kbResponse = await fetch(`/api/kb/search?q=${encodeURIComponent(message)}&limit=3`);
-      let kbResults = null;
-      if (kbResponse.ok) {
-        kbResults = await kbResponse.json();
-      }
+      // Related KB articles are only needed for the canned answers below;
+      // AI answers get theirs from /api/chat in the same round trip
+      const loadKbResults = async (): Promise<any[] | null> => {
+        const kbResponse = await fetch(`/api/kb/search?q=${encodeURIComponent(message)}&limit=3`);
+        return kbResponse.ok ? kbResponse.json() : null;
+      };
 
       // Password reset
       if (message.includes('password') && (message.includes('reset') || message.includes('forgot') || message.includes('change'))) {
@@ -130,6 +140,7 @@ If you don't have access to your registered email, please contact your manager o
 Would you like me to create a ticket for additional assistance?`;
 
         // Add relevant KB articles
+        const kbResults = await loadKbResults();
         if (kbResults && kbResults.length > 0) {
           const passwordArticles = kbResults.filter((article: any) =>
             article.category === 'password_reset' || article.tags?.includes('password')
@@ -168,6 +179,7 @@ Would you like me to create a ticket for additional assistance?`;
 Need help with VPN setup? I can create a support ticket for you.`;
 
         // Add relevant KB articles
+        const kbResults = await loadKbResults();
         if (kbResults && kbResults.length > 0) {
           const vpnArticles = kbResults.filter((article: any) =>
             article.category === 'vpn' || article.tags?.includes('vpn')
@@ -210,6 +222,7 @@ Need help with VPN setup? I can create a support ticket for you.`;
 Would you like me to escalate this to IT support?`;
 
         // Add relevant KB articles
+        const kbResults = await loadKbResults();
         if (kbResults && kbResults.length > 0) {
           const emailArticles = kbResults.filter((article: any) =>
             article.category === 'email' || article.tags?.includes('email')
@@ -255,6 +268,7 @@ Would you like me to escalate this to IT support?`;
 Shall I create a support ticket for network assistance?`;
 
         // Add relevant KB articles
+        const kbResults = await loadKbResults();
         if (kbResults && kbResults.length > 0) {
           const networkArticles = kbResults.filter((article: any) =>
             article.category === 'network' || article.tags?.includes('network')
@@ -298,6 +312,7 @@ Some software can be installed from: \\\\software.powergrid.in
 Would you like me to help you submit a software installation request?`;
 
         // Add relevant KB articles
+        const kbResults = await loadKbResults();
         if (kbResults && kbResults.length > 0) {
           const softwareArticles = kbResults.filter((article: any) =>
             article.category === 'software' || article.tags?.includes('software')
@@ -341,6 +356,7 @@ Would you like me to help you submit a software installation request?`;
 Need immediate hardware assistance? I can create an urgent support ticket.`;
 
         // Add relevant KB articles
+        const kbResults = await loadKbResults();
         if (kbResults && kbResults.length > 0) {
           const hardwareArticles = kbResults.filter((article: any) =>
             article.category === 'hardware' || article.tags?.includes('hardware')
@@ -356,23 +372,6 @@ Need immediate hardware assistance? I can create an urgent support ticket.`;
         return response;
       }
 
-      // If no specific self-service response but we have relevant KB articles, suggest them
-      if (kbResults && kbResults.length > 0) {
-        let response = `I found some relevant articles in our knowledge base that might help with your question:\n\n`;
-
-        kbResults.slice(0, 3).forEach((article: any) => {
-          response += `📄 **${article.title}**\n`;
-          if (article.summary) {
-            response += `${article.summary}\n`;
-          }
-          response += `[Read full article](/kb/article/${article.id})\n\n`;
-        });
-
-        response += `If these don't solve your issue, I can create a support ticket for you. Would you like me to do that?`;
-
-        return response;
-      }
-
       // Return null if no self-service response matches
       return null;
     } catch (error) {
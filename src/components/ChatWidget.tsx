@@ -47,7 +47,8 @@ export default function ChatWidget() {
           headers: { 'Content-Type': 'application/json' },
           body: JSON.stringify({
             message: userMessage,
-            context: messages.slice(-6).map(m => ({ role: m.role, content: m.content })) // Send last 6 messages for context
+            // This app's /api/chat calls Groq directly and keeps no session, so history travels with the request
+            context: messages.slice(-6).map(m => ({ role: m.role, content: m.content }))
           }),
         });
 